@@ -0,0 +1,154 @@
+"""
+Controle de admissão das mensagens
+
+Em picos (ex.: uma campanha de marketing) é melhor recusar cedo do que
+enfileirar tudo na conexão do SQLite e deixar a latência subir para todos até
+o gateway desistir e reenviar. Antes de processar uma mensagem, o app pede
+admissão ao ControleAdmissao:
+
+- limite de requisições em andamento por worker (ADMISSAO["max_em_andamento"]):
+  acima dele a resposta é 503 com Retry-After;
+- balde de tokens por user_id (ADMISSAO["mensagens_por_segundo"] e
+  ADMISSAO["rajada"]): quem manda mensagens demais recebe 429 com Retry-After,
+  sem tirar a vez dos outros clientes. Um lote gasta um token por mensagem de
+  cada cliente e é recusado inteiro se algum deles passar do limite.
+
+Zero em max_em_andamento ou mensagens_por_segundo desativa o respectivo
+limite. Os contadores ficam em /metrics (chatbot_admissao_*). Os limites são
+por processo: com vários workers, cada um aplica os seus.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Optional
+
+from config import ADMISSAO
+from metricas import registro
+
+
+class RequisicaoRecusada(Exception):
+    """Requisição recusada pelo controle de admissão (status 429 ou 503)"""
+
+    def __init__(self, status: int, retry_after: int, detalhe: str):
+        super().__init__(detalhe)
+        self.status = status
+        self.retry_after = retry_after
+        self.detalhe = detalhe
+
+
+class LimitadorPorUsuario:
+    """Balde de tokens por chave, com no máximo max_chaves baldes (LRU)
+
+    Um balde descartado equivale a um balde cheio, então o limite de chaves só
+    afrouxa o controle de clientes inativos há muito tempo.
+    """
+
+    def __init__(self, taxa: float, rajada: int, max_chaves: int):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.max_chaves = max_chaves
+        self._baldes: "OrderedDict[Hashable, list]" = OrderedDict()  # chave -> [tokens, atualizado_em]
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: Hashable) -> float:
+        """Consome um token da chave; retorna 0 se conseguiu ou os segundos até o próximo token"""
+        return self.consumir_varios({chave: 1})
+
+    def consumir_varios(self, tokens_por_chave: Dict[Hashable, int]) -> float:
+        """Consome os tokens de todas as chaves ou de nenhuma
+
+        Retorna 0 se conseguiu ou os segundos até todas terem tokens suficientes
+        (mais tokens do que a rajada nunca são concedidos de uma vez).
+        """
+        agora = time.monotonic()
+        with self._lock:
+            baldes = [(self._balde(chave, agora), tokens) for chave, tokens in tokens_por_chave.items()]
+            espera = max(((tokens - balde[0]) / self.taxa for balde, tokens in baldes if balde[0] < tokens),
+                         default=0.0)
+            if espera:
+                return espera
+            for balde, tokens in baldes:
+                balde[0] -= tokens
+            return 0.0
+
+    def _balde(self, chave: Hashable, agora: float) -> list:
+        """Balde da chave com os tokens repostos até agora (chamado com o lock)"""
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = [float(self.rajada), agora]
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        else:
+            self._baldes.move_to_end(chave)
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+        return balde
+
+    def __len__(self) -> int:
+        return len(self._baldes)
+
+
+class ControleAdmissao:
+    """Limite de requisições em andamento mais o balde de tokens por usuário"""
+
+    def __init__(self, max_em_andamento: int, retry_after_segundos: int,
+                 mensagens_por_segundo: float, rajada: int, max_usuarios: int):
+        self.max_em_andamento = max_em_andamento
+        self.retry_after_segundos = retry_after_segundos
+        self.limitador = (LimitadorPorUsuario(mensagens_por_segundo, rajada, max_usuarios)
+                          if mensagens_por_segundo > 0 else None)
+        # Alterado só pelo event loop (endpoints async), por isso sem lock
+        self.em_andamento = 0
+
+    @contextmanager
+    def admitir(self, usuario: Optional[Hashable] = None,
+                mensagens_por_usuario: Optional[Dict[Hashable, int]] = None):
+        """Ocupa uma vaga enquanto o bloco roda ou levanta RequisicaoRecusada
+
+        usuario gasta um token do seu balde; mensagens_por_usuario (lotes) gasta
+        um token por mensagem de cada usuário, tudo ou nada.
+        """
+        if self.max_em_andamento and self.em_andamento >= self.max_em_andamento:
+            recusadas_total.inc(motivo="saturado")
+            raise RequisicaoRecusada(503, self.retry_after_segundos,
+                                     "Servidor ocupado, tente novamente em instantes")
+
+        tokens = dict(mensagens_por_usuario or {})
+        if usuario is not None:
+            tokens[usuario] = tokens.get(usuario, 0) + 1
+        if tokens and self.limitador is not None:
+            espera = self.limitador.consumir_varios(tokens)
+            if espera:
+                recusadas_total.inc(motivo="limite_usuario")
+                raise RequisicaoRecusada(429, max(1, math.ceil(espera)),
+                                         "Muitas mensagens em sequência, aguarde um momento")
+
+        admitidas_total.inc()
+        self.em_andamento += 1
+        try:
+            yield
+        finally:
+            self.em_andamento -= 1
+
+
+admissao = ControleAdmissao(
+    ADMISSAO["max_em_andamento"],
+    ADMISSAO["retry_after_segundos"],
+    ADMISSAO["mensagens_por_segundo"],
+    ADMISSAO["rajada"],
+    ADMISSAO["max_usuarios"]
+)
+
+admitidas_total = registro.contador(
+    "chatbot_admissao_admitidas_total", "Requisições admitidas pelo controle de admissão")
+recusadas_total = registro.contador(
+    "chatbot_admissao_recusadas_total", "Requisições recusadas, por motivo (saturado=503, limite_usuario=429)")
+registro.gauge(
+    "chatbot_admissao_em_andamento", "Requisições admitidas em andamento neste worker",
+    lambda: admissao.em_andamento)
+registro.gauge(
+    "chatbot_admissao_usuarios_rastreados", "Usuários com balde de tokens em memória",
+    lambda: len(admissao.limitador) if admissao.limitador is not None else 0)
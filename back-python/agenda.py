@@ -1,90 +1,206 @@
 #!/usr/bin/env python3
 """
 Script para visualizar agendamentos da barbearia
+
+Uso:
+    python agenda.py                      # menu interativo
+    python agenda.py agendamentos [--barbeiro NOME] [--desde AAAA-MM-DD] [--ate AAAA-MM-DD]
+                                  [--formato texto|csv|json]
+    python agenda.py clientes [--barbeiro NOME] [--desde AAAA-MM-DD] [--ate AAAA-MM-DD]
+                              [--formato texto|csv|json]
+
+As listagens usam uma única consulta (JOIN / GROUP BY) e são lidas do banco
+em blocos, escrevendo cada linha assim que chega.
 """
 
+import argparse
+import csv
+import json
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func, and_
+
 from database import SessionLocal
 from models import Agendamento, Cliente
 
-def listar_agendamentos():
-    """Lista todos os agendamentos cadastrados"""
-    
+# Quantidade de linhas lidas do banco por vez
+BLOCO = 1000
+
+FORMATOS = ("texto", "csv", "json")
+
+
+def _filtros_agendamento(barbeiro: Optional[str], desde: Optional[date], ate: Optional[date]):
+    """Monta as condições de barbeiro e período (datas inclusivas) sobre Agendamento"""
+    condicoes = []
+    if barbeiro:
+        condicoes.append(Agendamento.barbeiro == barbeiro)
+    if desde:
+        condicoes.append(Agendamento.inicio >= datetime.combine(desde, time()))
+    if ate:
+        condicoes.append(Agendamento.inicio < datetime.combine(ate + timedelta(days=1), time()))
+    return condicoes
+
+
+def _valor(valor):
+    """Converte datas para texto ISO na saída CSV/JSON"""
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def _escrever(linhas, colunas, formato, imprimir_texto, saida=sys.stdout) -> int:
+    """Escreve as linhas no formato escolhido, uma a uma; retorna a quantidade escrita"""
+    total = 0
+
+    if formato == "csv":
+        escritor = csv.writer(saida)
+        escritor.writerow(colunas)
+        for linha in linhas:
+            escritor.writerow([_valor(v) for v in linha])
+            total += 1
+
+    elif formato == "json":
+        saida.write("[")
+        for linha in linhas:
+            registro = {coluna: _valor(v) for coluna, v in zip(colunas, linha)}
+            saida.write(("," if total else "") + "\n" + json.dumps(registro, ensure_ascii=False))
+            total += 1
+        saida.write("\n]\n")
+
+    else:
+        for linha in linhas:
+            imprimir_texto(linha)
+            total += 1
+
+    return total
+
+
+def listar_agendamentos(barbeiro: Optional[str] = None, desde: Optional[date] = None,
+                        ate: Optional[date] = None, formato: str = "texto"):
+    """Lista os agendamentos cadastrados, com o nome do cliente"""
+
     # Cria uma instância da sessão com o banco de dados
     db = SessionLocal()
-    
+
     try:
-        # Busca todos os agendamentos cadastrados no banco
-        agendamentos = db.query(Agendamento).all()
-        
-        if not agendamentos:
-            print("📋 Nenhum agendamento encontrado.")
-            return
-        
-        print(f"📋 Listando {len(agendamentos)} agendamento(s):\n")
-        
-        # Para cada agendamento encontrado, busca o cliente associado e exibe os dados
-        for agendamento in agendamentos:
-            # Busca o cliente usando o ID armazenado no agendamento
-            cliente = db.query(Cliente).filter(Cliente.id == agendamento.cliente_id).first()
-            
-            # Exibe os dados do agendamento
-            print(f"🆔 ID: {agendamento.id}")
-            print(f"👤 Cliente: {cliente.nome if cliente and cliente.nome else 'Nome não informado'}")
-            print(f"📱 Contato: {agendamento.contato}")
-            print(f"📅 Horário: {agendamento.horario}")
-            print(f"👨‍💼 Barbeiro: {agendamento.barbeiro}")
-            print(f"📝 Criado em: {agendamento.criado_em}")
+        # Uma única consulta: agendamentos + nome do cliente (LEFT JOIN)
+        consulta = (
+            select(
+                Agendamento.id, Cliente.nome, Agendamento.contato, Agendamento.horario,
+                Agendamento.inicio, Agendamento.barbeiro, Agendamento.criado_em
+            )
+            .outerjoin(Cliente, Cliente.id == Agendamento.cliente_id)
+            .where(*_filtros_agendamento(barbeiro, desde, ate))
+            .order_by(Agendamento.id)
+        )
+        linhas = db.execute(consulta).yield_per(BLOCO)
+        colunas = ["id", "cliente", "contato", "horario", "inicio", "barbeiro", "criado_em"]
+
+        def imprimir(linha):
+            id_, nome, contato, horario, _, barbeiro_, criado_em = linha
+            print(f"🆔 ID: {id_}")
+            print(f"👤 Cliente: {nome or 'Nome não informado'}")
+            print(f"📱 Contato: {contato}")
+            print(f"📅 Horário: {horario}")
+            print(f"👨‍💼 Barbeiro: {barbeiro_}")
+            print(f"📝 Criado em: {criado_em}")
             print("-" * 50)
-    
+
+        if formato == "texto":
+            print("📋 Agendamentos:\n")
+
+        total = _escrever(linhas, colunas, formato, imprimir)
+
+        if formato == "texto":
+            print(f"📋 {total} agendamento(s) listado(s)." if total else "📋 Nenhum agendamento encontrado.")
+
     except Exception as e:
-        print(f"❌ Erro ao listar agendamentos: {e}")
-    
+        print(f"❌ Erro ao listar agendamentos: {e}", file=sys.stderr)
+
     finally:
         # Fecha a sessão do banco
         db.close()
 
-def listar_clientes():
-    """Lista todos os clientes cadastrados"""
-    
+def listar_clientes(barbeiro: Optional[str] = None, desde: Optional[date] = None,
+                    ate: Optional[date] = None, formato: str = "texto"):
+    """Lista os clientes cadastrados com a quantidade de agendamentos (filtrados)"""
+
     db = SessionLocal()
-    
+
     try:
-        clientes = db.query(Cliente).all()
-        
-        if not clientes:
-            print("👥 Nenhum cliente encontrado.")
-            return
-        
-        print(f"👥 Listando {len(clientes)} cliente(s):\n")
-        
-        for cliente in clientes:
-            # Busca agendamentos do cliente
-            agendamentos = db.query(Agendamento).filter_by(cliente_id=cliente.id).all()
-            
-            print(f"🆔 ID: {cliente.id}")
-            print(f"👤 Nome: {cliente.nome}")
-            print(f"📱 Número: {cliente.numero}")
-            print(f"📅 Criado em: {cliente.criado_em}")
-            print(f"📋 Agendamentos: {len(agendamentos)}")
+        # Uma única consulta: clientes + contagem de agendamentos (GROUP BY);
+        # os filtros ficam no JOIN para manter clientes sem agendamentos no período
+        consulta = (
+            select(Cliente.id, Cliente.nome, Cliente.numero, Cliente.criado_em, func.count(Agendamento.id))
+            .outerjoin(Agendamento, and_(
+                Agendamento.cliente_id == Cliente.id,
+                *_filtros_agendamento(barbeiro, desde, ate)
+            ))
+            .group_by(Cliente.id)
+            .order_by(Cliente.id)
+        )
+        linhas = db.execute(consulta).yield_per(BLOCO)
+        colunas = ["id", "nome", "numero", "criado_em", "agendamentos"]
+
+        def imprimir(linha):
+            id_, nome, numero, criado_em, quantidade = linha
+            print(f"🆔 ID: {id_}")
+            print(f"👤 Nome: {nome}")
+            print(f"📱 Número: {numero}")
+            print(f"📅 Criado em: {criado_em}")
+            print(f"📋 Agendamentos: {quantidade}")
             print("-" * 50)
-    
+
+        if formato == "texto":
+            print("👥 Clientes:\n")
+
+        total = _escrever(linhas, colunas, formato, imprimir)
+
+        if formato == "texto":
+            print(f"👥 {total} cliente(s) listado(s)." if total else "👥 Nenhum cliente encontrado.")
+
     except Exception as e:
-        print(f"❌ Erro ao listar clientes: {e}")
-    
+        print(f"❌ Erro ao listar clientes: {e}", file=sys.stderr)
+
     finally:
         db.close()
 
-if __name__ == "__main__":
+def menu_interativo():
+    """Menu interativo (quando o script é executado sem argumentos)"""
     print("🏪 Sistema de Agendamentos - Barbearia\n")
-    
+
     print("1️⃣ - Listar agendamentos")
     print("2️⃣ - Listar clientes")
-    
+
     opcao = input("\nEscolha uma opção (1 ou 2): ").strip()
-    
+
     if opcao == "1":
         listar_agendamentos()
     elif opcao == "2":
         listar_clientes()
     else:
-        print("❌ Opção inválida!")
\ No newline at end of file
+        print("❌ Opção inválida!")
+
+def main(argv=None):
+    """Função principal (linha de comando)"""
+    parser = argparse.ArgumentParser(description="Relatórios de agendamentos e clientes da barbearia")
+    subparsers = parser.add_subparsers(dest="comando")
+
+    for comando, ajuda in (("agendamentos", "Lista os agendamentos"), ("clientes", "Lista os clientes")):
+        sub = subparsers.add_parser(comando, help=ajuda)
+        sub.add_argument("--barbeiro", help="Filtra pelo nome do barbeiro")
+        sub.add_argument("--desde", type=date.fromisoformat, help="Data inicial (AAAA-MM-DD, inclusiva)")
+        sub.add_argument("--ate", type=date.fromisoformat, help="Data final (AAAA-MM-DD, inclusiva)")
+        sub.add_argument("--formato", choices=FORMATOS, default="texto", help="Formato de saída")
+
+    args = parser.parse_args(argv)
+
+    if args.comando is None:
+        menu_interativo()
+        return
+
+    listar = listar_agendamentos if args.comando == "agendamentos" else listar_clientes
+    listar(barbeiro=args.barbeiro, desde=args.desde, ate=args.ate, formato=args.formato)
+
+if __name__ == "__main__":
+    main()
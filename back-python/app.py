@@ -1,39 +1,153 @@
-from fastapi import FastAPI, Depends, Request, HTTPException
+from fastapi import FastAPI, Depends, Request, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse, PlainTextResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from collections import Counter
+from datetime import date, datetime
+import os
+import time
 
-# Importa a sessão do banco e o engine
-from database import SessionLocal, engine
+# Importa o engine, a dependência de sessão (síncrona ou assíncrona) e o executor
+from database import engine, async_engine, SessionLocal, obter_sessao, executar
 
-# Importa os modelos para criar tabelas
-from models import Base, Agendamento, Cliente
+# Importa os modelos usados nas consultas
+from models import Agendamento, Cliente
+
+# Migrações do esquema (cria tabelas e atualiza as existentes)
+from migracoes import aplicar_migracoes
 
 # Importa a função que processa as mensagens do chatbot
-from chatbot import processar_mensagem
+from chatbot import processar_mensagem_async, processar_lote_async, resposta_ja_dada, limpar_numero
+
+# Fila de escrita com group commit (opcional, config.GRUPO_COMMIT)
+from fila_escrita import iniciar_fila_escrita, parar_fila_escrita
+
+# Limite dos agendamentos ativos e histórico (tabela principal + arquivo)
+from arquivamento import inicio_de_hoje, buscar_historico, data_do_item
+
+# Grade de horários livres em memória
+from disponibilidade import grade
+
+# Controle de admissão (limite de requisições em andamento e por usuário)
+from admissao import admissao, RequisicaoRecusada
+
+# Respostas já dadas (reenvios não gastam o limite por usuário)
+from deduplicacao import respostas_processadas
 
-# Cria as tabelas no banco de dados (caso ainda não existam)
-Base.metadata.create_all(bind=engine)
+# Ingestão assíncrona do webhook (fila + workers + enviador de respostas)
+from ingestao import ingestao
+
+# Métricas (latência por endpoint/estado, consultas SQL por requisição)
+from metricas import MiddlewareMetricas, registro as registro_metricas
+
+# Limites da ingestão em lote e da paginação
+from config import LOTE, PAGINACAO, MIGRAR_NO_STARTUP, CACHE_RESPOSTAS_CLIENTE
+
+# Cache LRU das respostas de GET /cliente/{numero}
+from cache import LRUCache
+
+# Resposta JSON rápida (orjson, se instalado) e NDJSON em blocos
+from serializacao import RespostaJSON, linhas_ndjson
 
 # Instancia o app FastAPI
 app = FastAPI(title="Chatbot Barbearia", version="1.0.0")
 
+# Mede latência, consultas SQL e tempo de banco de cada requisição
+app.add_middleware(MiddlewareMetricas)
+
+# Tempo do lançamento (start.py) até o worker ficar pronto, exposto em /metrics
+tempo_inicializacao = 0.0
+registro_metricas.gauge(
+    "chatbot_inicializacao_segundos", "Tempo do lançamento até o worker ficar pronto",
+    lambda: tempo_inicializacao)
+
+@app.on_event("startup")
+async def inicializar_worker():
+    global tempo_inicializacao
+    
+    # Em produção o start.py aplica as migrações uma única vez, antes de subir os workers
+    if MIGRAR_NO_STARTUP:
+        aplicar_migracoes(engine)
+    
+    # Inicia a thread escritora do group commit, se ativado
+    iniciar_fila_escrita()
+    
+    # Workers que processam as mensagens recebidas pelo webhook
+    await ingestao.iniciar()
+    
+    lancamento = os.getenv("CHATBOT_INICIO_LANCAMENTO")
+    if lancamento:
+        tempo_inicializacao = time.time() - float(lancamento)
+        print(f"⏱️ Worker {os.getpid()} pronto em {tempo_inicializacao:.2f}s desde o lançamento")
+
+# Confirma as escritas pendentes e fecha as conexões dos pools ao encerrar o worker
+@app.on_event("shutdown")
+async def encerrar_conexoes():
+    await ingestao.parar()
+    parar_fila_escrita()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+# Requisição recusada pelo controle de admissão: 429/503 com Retry-After
+@app.exception_handler(RequisicaoRecusada)
+async def recusar_requisicao(request: Request, erro: RequisicaoRecusada):
+    return JSONResponse(
+        status_code=erro.status,
+        content={"detail": erro.detalhe},
+        headers={"Retry-After": str(erro.retry_after)}
+    )
+
 # Modelo Pydantic para validação de entrada
 class MensagemRequest(BaseModel):
     mensagem: str
     user_id: str
+    mensagem_id: Optional[str] = None  # id do provedor: reenvios recebem a resposta já dada
 
-# Função para obter a sessão com o banco
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Modelos das respostas administrativas: só documentação (/docs). Os endpoints montam os
+# dicionários direto das linhas do banco e retornam RespostaJSON, então o FastAPI NÃO valida
+# nem serializa a resposta por eles; os testes conferem que a saída segue estes modelos
+class AgendamentoCliente(BaseModel):
+    id: int
+    horario: str
+    inicio: Optional[datetime]
+    duracao_minutos: int
+    barbeiro: str
+    criado_em: Optional[datetime]
+
+class AgendamentoAdmin(AgendamentoCliente):
+    cliente_id: int
+    contato: Optional[str]
+
+class PaginaAgendamentos(BaseModel):
+    agendamentos: List[AgendamentoAdmin]
+    proximo_after_id: Optional[int]  # envie como 'after_id' para buscar a próxima página
+
+class DadosCliente(BaseModel):
+    id: int
+    nome: Optional[str]
+    numero: str
+    criado_em: Optional[datetime]
+
+class ClienteResposta(BaseModel):
+    cliente: DadosCliente
+    agendamentos: List[AgendamentoCliente]
 
 # Endpoint para receber mensagens do cliente (via POST)
 @app.post("/mensagem")
-async def responder_mensagem(request: MensagemRequest, db: Session = Depends(get_db)):
+async def responder_mensagem(request: MensagemRequest, db=Depends(obter_sessao)):
+    # Reenvio de mensagem já respondida: devolve a mesma resposta sem gastar o limite do cliente
+    resposta = await resposta_ja_dada(request.user_id, request.mensagem_id)
+    if resposta is not None:
+        return {"resposta": resposta, "status": "success"}
+    
+    # Recusa cedo (antes de tocar no banco) quando o worker está saturado ou o cliente excede o limite
+    with admissao.admitir(limpar_numero(request.user_id) or request.user_id):
+        return await _responder_mensagem(request, db)
+
+async def _responder_mensagem(request: MensagemRequest, db):
     try:
         # Valida se a mensagem não está vazia
         if not request.mensagem.strip():
@@ -44,7 +158,7 @@ async def responder_mensagem(request: MensagemRequest, db: Session = Depends(get
             raise HTTPException(status_code=400, detail="User ID não pode estar vazio")
         
         # Processa a mensagem usando a lógica do chatbot
-        resposta = processar_mensagem(request.mensagem, db, request.user_id)
+        resposta = await processar_mensagem_async(request.mensagem, db, request.user_id, request.mensagem_id)
         
         # Retorna a resposta gerada
         return {"resposta": resposta, "status": "success"}
@@ -54,43 +168,160 @@ async def responder_mensagem(request: MensagemRequest, db: Session = Depends(get
         print(f"Erro ao processar mensagem: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
+# Webhook do provedor de mensagens: só enfileira e confirma; a resposta vai pelo enviador configurado
+@app.post("/webhook/mensagem", status_code=202)
+async def receber_webhook(request: MensagemRequest):
+    if not request.mensagem.strip() or not request.user_id.strip():
+        raise HTTPException(status_code=400, detail="Mensagem e User ID não podem estar vazios")
+    
+    # Reenvio de mensagem já respondida: confirmado sem entrar na fila nem gastar o limite do cliente
+    if await ingestao.duplicada(request.user_id, request.mensagem_id):
+        return {"status": "accepted"}
+    
+    with admissao.admitir(limpar_numero(request.user_id) or request.user_id):
+        if not await ingestao.publicar(request.mensagem, request.user_id, request.mensagem_id):
+            raise RequisicaoRecusada(503, admissao.retry_after_segundos, "Fila de mensagens cheia")
+    
+    return {"status": "accepted"}
+
+# Mensagens novas de cada cliente do lote (reenvios já respondidos não contam, como em /mensagem)
+async def mensagens_por_cliente(mensagens: List[MensagemRequest]) -> Counter:
+    ja_dadas = iter(await respostas_processadas.get_varias_async(
+        [(limpar_numero(m.user_id), m.mensagem_id) for m in mensagens if m.mensagem_id]))
+    contagem = Counter()
+    for m in mensagens:
+        if m.mensagem_id and next(ja_dadas) is not None:
+            continue
+        contagem[limpar_numero(m.user_id) or m.user_id] += 1
+    return contagem
+
+# Endpoint para receber um lote de mensagens (rajadas do gateway) em uma única requisição
+@app.post("/mensagens/lote")
+async def responder_lote(mensagens: List[MensagemRequest], db=Depends(obter_sessao)):
+    if len(mensagens) > LOTE["max_mensagens"]:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote excede o limite de {LOTE['max_mensagens']} mensagens"
+        )
+    
+    # Mensagens vazias são rejeitadas individualmente, sem derrubar o lote
+    validas = [m for m in mensagens if m.mensagem.strip() and m.user_id.strip()]
+    
+    # O lote ocupa uma vaga do limite de requisições em andamento e gasta um token por
+    # mensagem de cada cliente: se algum passar do limite, o lote inteiro recebe 429
+    with admissao.admitir(mensagens_por_usuario=await mensagens_por_cliente(validas)):
+        try:
+            # Processa na ordem recebida, com uma sessão e commits agrupados
+            respostas = iter(await processar_lote_async(
+                [(m.mensagem, m.user_id) for m in validas], db, [m.mensagem_id for m in validas]
+            ))
+        except Exception as e:
+            print(f"Erro ao processar lote de mensagens: {str(e)}")
+            raise HTTPException(status_code=500, detail="Erro interno do servidor")
+    
+    # Monta os resultados na ordem de entrada
+    resultados = []
+    for m in mensagens:
+        if not (m.mensagem.strip() and m.user_id.strip()):
+            resultados.append({"user_id": m.user_id, "resposta": None, "status": "error",
+                               "detail": "Mensagem e User ID não podem estar vazios"})
+            continue
+        
+        resposta = next(respostas)
+        if resposta is None:
+            resultados.append({"user_id": m.user_id, "resposta": None, "status": "error",
+                               "detail": "Erro interno do servidor"})
+        else:
+            resultados.append({"user_id": m.user_id, "resposta": resposta, "status": "success"})
+    
+    return {"respostas": resultados, "status": "success"}
+
 # Endpoint para verificar status da API
 @app.get("/")
 async def root():
     return {"message": "Chatbot Barbearia API está funcionando!", "status": "online"}
 
-# Endpoint para obter informações de um cliente
-@app.get("/cliente/{numero}")
-async def obter_cliente(numero: str, db: Session = Depends(get_db)):
+# Endpoint de métricas no formato texto do Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metricas():
+    return PlainTextResponse(registro_metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+# Consulta os dados do cliente, inclusive a versão (só a tabela clientes)
+def buscar_cliente(db: Session, numero_limpo: str):
+    return db.query(
+        Cliente.id, Cliente.nome, Cliente.numero, Cliente.criado_em, Cliente.versao
+    ).filter_by(numero=numero_limpo).first()
+
+# Busca os próximos agendamentos do cliente (passados: GET /cliente/{numero}/historico)
+def buscar_agendamentos_cliente(db: Session, cliente_id: int):
+    # Só as colunas da resposta, como tuplas (sem montar objetos do ORM)
+    linhas = db.execute(
+        select(
+            Agendamento.id, Agendamento.horario, Agendamento.inicio,
+            Agendamento.duracao_minutos, Agendamento.barbeiro, Agendamento.criado_em
+        )
+        .where(Agendamento.cliente_id == cliente_id, Agendamento.inicio >= inicio_de_hoje())
+        .order_by(Agendamento.inicio, Agendamento.id)
+    )
+    
+    return [
+        {
+            "id": id_,
+            "horario": horario,
+            "inicio": inicio.isoformat() if inicio else None,
+            "duracao_minutos": duracao_minutos,
+            "barbeiro": barbeiro,
+            "criado_em": criado_em.isoformat() if criado_em else None
+        }
+        for id_, horario, inicio, duracao_minutos, barbeiro, criado_em in linhas
+    ]
+
+# Respostas de GET /cliente/{numero} já montadas: numero -> (etag, dados)
+respostas_cliente = LRUCache(CACHE_RESPOSTAS_CLIENTE["max_itens"]) if CACHE_RESPOSTAS_CLIENTE["max_itens"] else None
+
+def etag_cliente(cliente) -> str:
+    # A data entra no ETag porque a lista de próximos agendamentos muda à meia-noite
+    return f'"{cliente.id}-{cliente.versao}-{inicio_de_hoje():%Y%m%d}"'
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    recebidos = {valor.strip().removeprefix("W/") for valor in if_none_match.split(",")}
+    return "*" in recebidos or etag in recebidos
+
+# Endpoint para obter informações de um cliente (com ETag: 304 se nada mudou)
+@app.get("/cliente/{numero}", response_class=RespostaJSON, responses={200: {"model": ClienteResposta}})
+async def obter_cliente(numero: str, request: Request, db=Depends(obter_sessao)):
     try:
-        from chatbot import limpar_numero
         numero_limpo = limpar_numero(numero)
         
-        cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
+        cliente = await executar(db, buscar_cliente, numero_limpo)
         
         if not cliente:
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
-        # Busca agendamentos do cliente
-        agendamentos = db.query(Agendamento).filter_by(cliente_id=cliente.id).all()
+        # A versão muda a cada alteração de nome, agendamento ou cancelamento
+        etag = etag_cliente(cliente)
+        if etag_confere(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        return {
-            "cliente": {
-                "id": cliente.id,
-                "nome": cliente.nome,
-                "numero": cliente.numero,
-                "criado_em": cliente.criado_em.isoformat() if cliente.criado_em else None
-            },
-            "agendamentos": [
-                {
-                    "id": a.id,
-                    "horario": a.horario,
-                    "barbeiro": a.barbeiro,
-                    "criado_em": a.criado_em.isoformat() if a.criado_em else None
-                }
-                for a in agendamentos
-            ]
-        }
+        em_cache = respostas_cliente.get(numero_limpo) if respostas_cliente is not None else None
+        if em_cache is not None and em_cache[0] == etag:
+            dados = em_cache[1]
+        else:
+            dados = {
+                "cliente": {
+                    "id": cliente.id,
+                    "nome": cliente.nome,
+                    "numero": cliente.numero,
+                    "criado_em": cliente.criado_em.isoformat() if cliente.criado_em else None
+                },
+                "agendamentos": await executar(db, buscar_agendamentos_cliente, cliente.id)
+            }
+            if respostas_cliente is not None:
+                respostas_cliente.set(numero_limpo, (etag, dados))
+        
+        return RespostaJSON(dados, headers={"ETag": etag})
     
     except HTTPException:
         raise
@@ -98,26 +329,176 @@ async def obter_cliente(numero: str, db: Session = Depends(get_db)):
         print(f"Erro ao buscar cliente: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
-# Endpoint para listar todos os agendamentos (para administração)
-@app.get("/agendamentos")
-async def listar_agendamentos(db: Session = Depends(get_db)):
+# Busca o histórico (agendamentos passados) de um cliente
+def buscar_historico_cliente(db: Session, numero_limpo: str, limite: int, antes_de: Optional[datetime],
+                             antes_de_id: Optional[int]):
+    cliente_id = db.query(Cliente.id).filter_by(numero=numero_limpo).scalar()
+    if cliente_id is None:
+        return None
+    
+    historico = buscar_historico(db, cliente_id, limite, antes_de, antes_de_id)
+    proxima_pagina = len(historico) == limite
+    return {
+        "agendamentos": historico,
+        # Envie como 'antes_de' e 'antes_de_id' para buscar a próxima página
+        "proximo_antes_de": data_do_item(historico[-1]) if proxima_pagina else None,
+        "proximo_antes_de_id": historico[-1]["id"] if proxima_pagina else None
+    }
+
+# Endpoint com os agendamentos passados de um cliente, inclusive os arquivados
+@app.get("/cliente/{numero}/historico")
+async def obter_historico_cliente(
+    numero: str,
+    limit: Optional[int] = Query(None, ge=1),
+    antes_de: Optional[datetime] = None,
+    antes_de_id: Optional[int] = None,
+    db=Depends(obter_sessao)
+):
     try:
-        agendamentos = db.query(Agendamento).all()
+        limite = min(limit or PAGINACAO["limite_padrao"], PAGINACAO["limite_maximo"])
+        dados = await executar(db, buscar_historico_cliente, limpar_numero(numero), limite, antes_de, antes_de_id)
         
-        return {
-            "agendamentos": [
-                {
-                    "id": a.id,
-                    "cliente_id": a.cliente_id,
-                    "contato": a.contato,
-                    "horario": a.horario,
-                    "barbeiro": a.barbeiro,
-                    "criado_em": a.criado_em.isoformat() if a.criado_em else None
-                }
-                for a in agendamentos
-            ]
-        }
+        if dados is None:
+            raise HTTPException(status_code=404, detail="Cliente não encontrado")
+        
+        return dados
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao buscar histórico: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro interno do servidor")
+
+# Colunas da listagem administrativa, lidas como tuplas (sem objetos do ORM)
+COLUNAS_AGENDAMENTO = (
+    Agendamento.id, Agendamento.cliente_id, Agendamento.contato, Agendamento.horario,
+    Agendamento.inicio, Agendamento.duracao_minutos, Agendamento.barbeiro, Agendamento.criado_em
+)
+
+# Converte uma linha de COLUNAS_AGENDAMENTO para o formato da listagem administrativa
+def serializar_agendamento(linha) -> dict:
+    id_, cliente_id, contato, horario, inicio, duracao_minutos, barbeiro, criado_em = linha
+    return {
+        "id": id_,
+        "cliente_id": cliente_id,
+        "contato": contato,
+        "horario": horario,
+        "inicio": inicio.isoformat() if inicio else None,
+        "duracao_minutos": duracao_minutos,
+        "barbeiro": barbeiro,
+        "criado_em": criado_em.isoformat() if criado_em else None
+    }
+
+# Monta a consulta de agendamentos com os filtros e a chave de paginação (id)
+def consultar_agendamentos(after_id: Optional[int] = None, barbeiro: Optional[str] = None,
+                           de: Optional[datetime] = None, ate: Optional[datetime] = None,
+                           sem_inicio: bool = False):
+    consulta = select(*COLUNAS_AGENDAMENTO)
+    
+    if after_id is not None:
+        consulta = consulta.where(Agendamento.id > after_id)
+    if barbeiro:
+        consulta = consulta.where(Agendamento.barbeiro == barbeiro)
+    if sem_inicio:
+        # Registros antigos que a migração não conseguiu datar (ficam fora dos filtros por data)
+        consulta = consulta.where(Agendamento.inicio.is_(None))
+    if de:
+        consulta = consulta.where(Agendamento.inicio >= de)
+    if ate:
+        consulta = consulta.where(Agendamento.inicio < ate)
+    
+    return consulta.order_by(Agendamento.id)
+
+# Busca uma página de agendamentos (executada via executar)
+def buscar_agendamentos(db: Session, limit: int, **filtros):
+    # Busca um item a mais para saber se existe próxima página
+    linhas = db.execute(consultar_agendamentos(**filtros).limit(limit + 1)).all()
+    proxima = len(linhas) > limit
+    linhas = linhas[:limit]
+    
+    return {
+        "agendamentos": [serializar_agendamento(linha) for linha in linhas],
+        "proximo_after_id": linhas[-1].id if proxima else None
+    }
+
+# Gera os agendamentos em NDJSON lendo o banco em blocos (um pedaço da resposta por bloco)
+def gerar_ndjson_agendamentos(limit: Optional[int], **filtros):
+    db = SessionLocal()
+    try:
+        consulta = consultar_agendamentos(**filtros)
+        if limit:
+            consulta = consulta.limit(limit)
+        
+        # yield_per: cursor do servidor, só um bloco de linhas em memória por vez
+        resultado = db.execute(consulta.execution_options(yield_per=PAGINACAO["bloco_streaming"]))
+        for linhas in resultado.partitions():
+            yield linhas_ndjson(serializar_agendamento(linha) for linha in linhas)
+    finally:
+        db.close()
+
+# Endpoint para listar os agendamentos (para administração)
+# Paginação por chave: envie o 'proximo_after_id' da resposta como 'after_id' da próxima página.
+# Com formato=ndjson a listagem inteira é transmitida em streaming, sem paginação.
+@app.get("/agendamentos", response_class=RespostaJSON, responses={200: {"model": PaginaAgendamentos}})
+async def listar_agendamentos(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    barbeiro: Optional[str] = None,
+    de: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+    sem_inicio: bool = False,
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+    db=Depends(obter_sessao)
+):
+    if sem_inicio:
+        # Agendamentos antigos sem data (horário ilegível ou duplicado na migração); 'de' e 'ate' não se aplicam
+        filtros = {"after_id": after_id, "barbeiro": barbeiro, "sem_inicio": True}
+    else:
+        # Sem 'de', lista só os agendamentos a partir de hoje (histórico: GET /cliente/{numero}/historico)
+        filtros = {"after_id": after_id, "barbeiro": barbeiro, "de": de or inicio_de_hoje(), "ate": ate}
+    
+    if formato == "ndjson":
+        return StreamingResponse(gerar_ndjson_agendamentos(limit, **filtros), media_type="application/x-ndjson")
+    
+    try:
+        limit = min(limit or PAGINACAO["limite_padrao"], PAGINACAO["limite_maximo"])
+        return RespostaJSON(await executar(db, buscar_agendamentos, limit, **filtros))
     
     except Exception as e:
         print(f"Erro ao listar agendamentos: {str(e)}")
-        raise HTTPException(status_code=500, detail="Erro interno do servidor")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Erro interno do servidor")
+
+# Monta a disponibilidade a partir da grade em memória (o banco só é lido se ela precisar ser remontada)
+def buscar_disponibilidade(db: Session, barbeiros: List[str], de: Optional[date], ate: Optional[date]):
+    return {
+        "disponibilidade": [
+            {
+                "barbeiro": barbeiro,
+                "dias": [
+                    {"dia": dia.isoformat(), "horarios": [hora.strftime("%H:%M") for hora in horas]}
+                    for dia, horas in sorted(grade.livres(db, barbeiro, de, ate).items())
+                ]
+            }
+            for barbeiro in barbeiros
+        ]
+    }
+
+# Endpoint com os horários livres por barbeiro e dia (para o site e integrações)
+# 'de' e 'ate' são datas inclusivas dentro da janela de agendamento (hoje + dias_futuros)
+@app.get("/disponibilidade")
+async def obter_disponibilidade(
+    barbeiro: Optional[str] = None,
+    de: Optional[date] = None,
+    ate: Optional[date] = None,
+    db=Depends(obter_sessao)
+):
+    if barbeiro and barbeiro not in grade.barbeiros:
+        raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
+    
+    try:
+        barbeiros = [barbeiro] if barbeiro else grade.barbeiros
+        return await executar(db, buscar_disponibilidade, barbeiros, de, ate)
+    
+    except Exception as e:
+        print(f"Erro ao buscar disponibilidade: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro interno do servidor")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Arquivamento de agendamentos antigos
+
+A tabela agendamentos guarda só o que é útil no dia a dia: as consultas do
+chatbot e da API olham apenas os agendamentos a partir de hoje
+(inicio_de_hoje). Os que começaram há mais de ARQUIVAMENTO["dias_retencao"]
+dias são movidos para agendamentos_arquivados por este job, em blocos (um
+INSERT ... SELECT e um DELETE por transação), sem travar o banco por muito
+tempo. Registros antigos que a migração deixou sem 'inicio' (horário ilegível
+ou duplicado) são arquivados pela data de criação. O histórico completo de um
+cliente continua disponível em GET /cliente/{numero}/historico
+(buscar_historico), inclusive esses registros sem 'inicio', pela data de criação.
+
+Uso:
+    python arquivamento.py [--dias-retencao 30] [--antes-de AAAA-MM-DD] [--bloco 5000]
+
+Para rodar periodicamente, agende no cron, por exemplo diariamente:
+    15 3 * * * cd /caminho/back-python && python arquivamento.py
+"""
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, desc, func, insert, literal, or_, select, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from database import engine as engine_padrao
+from models import Agendamento, AgendamentoArquivado
+from config import ARQUIVAMENTO, VALIDACAO
+
+# Colunas copiadas da tabela principal; no arquivo o id vai para agendamento_id
+COLUNAS = ["id", "cliente_id", "contato", "horario", "inicio", "duracao_minutos", "barbeiro", "criado_em"]
+COLUNAS_ARQUIVO = ["agendamento_id"] + COLUNAS[1:]
+
+
+def inicio_de_hoje() -> datetime:
+    """Meia-noite de hoje: limite inferior das consultas de agendamentos ativos"""
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+def arquivar(antes_de: datetime, engine: Engine = engine_padrao, bloco: Optional[int] = None) -> int:
+    """Move os agendamentos com inicio < antes_de para o arquivo; retorna quantos foram movidos"""
+    if antes_de > inicio_de_hoje():
+        raise ValueError("Só agendamentos anteriores a hoje podem ser arquivados")
+
+    bloco = bloco or ARQUIVAMENTO["bloco"]
+    principal = Agendamento.__table__
+    arquivo = AgendamentoArquivado.__table__
+    colunas = [principal.c[nome] for nome in COLUNAS]
+    # Sem 'inicio' o atendimento foi no máximo dias_futuros depois da criação do registro
+    sem_inicio = and_(
+        principal.c.inicio.is_(None),
+        principal.c.criado_em < antes_de - timedelta(days=VALIDACAO["dias_futuros"])
+    )
+
+    movidos = 0
+    while True:
+        with engine.begin() as conn:
+            # Um bloco por transação: copia para o arquivo e remove da tabela principal
+            ids = conn.execute(
+                select(principal.c.id)
+                .where(or_(principal.c.inicio < antes_de, sem_inicio))
+                .order_by(principal.c.id)
+                .limit(bloco)
+            ).scalars().all()
+            if not ids:
+                return movidos
+
+            conn.execute(
+                insert(arquivo).from_select(
+                    COLUNAS_ARQUIVO + ["arquivado_em"],
+                    select(*colunas, literal(datetime.utcnow())).where(principal.c.id.in_(ids))
+                )
+            )
+            conn.execute(delete(principal).where(principal.c.id.in_(ids)))
+
+        movidos += len(ids)
+        print(f"   {movidos} agendamento(s) arquivado(s)...")
+
+
+def buscar_historico(db: Session, cliente_id: int, limite: int, antes_de: Optional[datetime] = None,
+                     antes_de_id: Optional[int] = None) -> List[dict]:
+    """Agendamentos passados do cliente (tabela principal + arquivo), do mais recente ao mais antigo
+
+    Os registros sem inicio entram pela data de criação. Paginação por
+    (data, id), em que data é o inicio ou, sem ele, o criado_em: envie a data
+    e o id do último item (data_do_item) como antes_de e antes_de_id. Só com
+    antes_de, os itens com a mesma data do último são pulados.
+    """
+    hoje = inicio_de_hoje()
+
+    def passados(tabela, id_, arquivado: bool):
+        data = func.coalesce(tabela.c.inicio, tabela.c.criado_em)
+        filtros = [tabela.c.cliente_id == cliente_id, data < hoje]
+        if antes_de is not None:
+            if antes_de_id is None:
+                filtros.append(data < antes_de)
+            else:
+                filtros.append(or_(data < antes_de, and_(data == antes_de, id_ < antes_de_id)))
+        return select(
+            id_.label("id"), tabela.c.horario, tabela.c.inicio, tabela.c.duracao_minutos,
+            tabela.c.barbeiro, tabela.c.criado_em, literal(arquivado).label("arquivado"), data.label("data")
+        ).where(*filtros)
+
+    principal, arquivo = Agendamento.__table__, AgendamentoArquivado.__table__
+    consulta = union_all(
+        passados(principal, principal.c.id, False),
+        passados(arquivo, arquivo.c.agendamento_id, True)
+    ).order_by(desc("data"), desc("id")).limit(limite)
+
+    linhas = db.execute(consulta).all()
+
+    return [
+        {
+            "id": linha.id,
+            "horario": linha.horario,
+            "inicio": linha.inicio.isoformat() if linha.inicio else None,
+            "duracao_minutos": linha.duracao_minutos,
+            "barbeiro": linha.barbeiro,
+            "criado_em": linha.criado_em.isoformat() if linha.criado_em else None,
+            "arquivado": bool(linha.arquivado),
+        }
+        for linha in linhas
+    ]
+
+
+def data_do_item(item: dict) -> Optional[str]:
+    """Data de um item de buscar_historico na paginação: o inicio ou, sem ele, o criado_em"""
+    return item["inicio"] or item["criado_em"]
+
+
+def main(argv=None):
+    """Função principal (linha de comando)"""
+    parser = argparse.ArgumentParser(description="Arquiva agendamentos antigos")
+    parser.add_argument("--dias-retencao", type=int, default=ARQUIVAMENTO["dias_retencao"],
+                        help="Mantém na tabela principal os agendamentos dos últimos N dias")
+    parser.add_argument("--antes-de", type=date.fromisoformat,
+                        help="Arquiva os agendamentos anteriores a esta data (ignora --dias-retencao)")
+    parser.add_argument("--bloco", type=int, default=ARQUIVAMENTO["bloco"], help="Agendamentos por transação")
+    args = parser.parse_args(argv)
+
+    limite = (datetime.combine(args.antes_de, datetime.min.time()) if args.antes_de
+              else inicio_de_hoje() - timedelta(days=args.dias_retencao))
+    if limite > inicio_de_hoje():
+        parser.error("só agendamentos anteriores a hoje podem ser arquivados")
+
+    print(f"🗄️ Arquivando agendamentos anteriores a {limite:%d/%m/%Y}...")
+    inicio = time.perf_counter()
+    movidos = arquivar(limite, bloco=args.bloco)
+    print(f"✅ {movidos} agendamento(s) arquivado(s) em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Chatbot Barbearia (em processo)
+
+Simula N clientes sintéticos simultâneos percorrendo o fluxo completo da
+conversa (nome → barbeiro → horário → listar → cancelar) contra um banco
+SQLite temporário, em dois modos:
+
+- direto: chama chatbot.processar_mensagem em threads, uma sessão por cliente;
+- asgi:   envia POST /mensagem ao app FastAPI por um cliente ASGI em processo
+          (sem servidor e sem rede).
+
+Relata mensagens/s, latências p50/p95/p99 por estado da conversa e consultas
+SQL por mensagem. Com --salvar-baseline grava os resultados em um arquivo
+JSON; nas execuções seguintes compara com ele e sai com código 1 se houver
+regressão acima da tolerância.
+
+Uso:
+    python benchmark.py [--clientes 50] [--modo direto|asgi|ambos]
+                        [--baseline benchmark_baseline.json] [--salvar-baseline]
+                        [--tolerancia 0.2] [--tolerancia-consultas 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# O banco temporário precisa ser configurado antes de importar os módulos do app
+# (o diretório é removido ao final da execução)
+_DIRETORIO_TEMP = tempfile.TemporaryDirectory(prefix="benchmark-barbearia-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIRETORIO_TEMP.name, 'benchmark.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("CONVERSAS_SQLITE", os.path.join(_DIRETORIO_TEMP.name, "conversas.db"))
+# Os clientes sintéticos mandam mensagens sem pausa: mede a vazão sem o controle de admissão
+os.environ.setdefault("ADMISSAO_MAX_EM_ANDAMENTO", "0")
+os.environ.setdefault("ADMISSAO_MENSAGENS_POR_SEGUNDO", "0")
+
+import chatbot  # noqa: E402
+import database  # noqa: E402
+import fila_escrita  # noqa: E402
+from app import app  # noqa: E402
+from database import engine, SessionLocal  # noqa: E402
+from metricas import consultas_total, medir  # noqa: E402
+from config import get_barbeiros  # noqa: E402
+from migracoes import aplicar_migracoes  # noqa: E402
+
+# O modo direto não passa pelo startup da API, que é onde as migrações rodam
+aplicar_migracoes(engine)
+
+BASELINE_PADRAO = "benchmark_baseline.json"
+
+# As consultas são contadas pelos eventos que database.instrumentar registra nos
+# engines (síncrono e aiosqlite): o total vem de metricas.consultas_total e a
+# contagem por mensagem da MedicaoRequisicao (metricas.medir no modo direto, a
+# do MiddlewareMetricas no modo ASGI).
+
+
+# ---------------------------------------------------------------------------
+# Roteiro da conversa
+# ---------------------------------------------------------------------------
+
+_RE_ID_AGENDAMENTO = re.compile(r"ID do agendamento: (\d+)")
+
+
+class Roteiro:
+    """Gera as mensagens de um cliente sintético conforme as respostas do bot"""
+
+    def __init__(self, indice: int):
+        self.indice = indice
+        self.passos = [
+            "oi",
+            f"Cliente {indice}",
+            str(indice % len(get_barbeiros()) + 1),
+            "1",
+            "2",
+        ]
+        self.agendamento_id: Optional[str] = None
+
+    def proxima(self, ultima_resposta: Optional[str]) -> Optional[str]:
+        if ultima_resposta:
+            encontrado = _RE_ID_AGENDAMENTO.search(ultima_resposta)
+            if encontrado:
+                self.agendamento_id = encontrado.group(1)
+                # Só cancela quando o agendamento foi confirmado
+                self.passos += ["3", self.agendamento_id]
+        return self.passos.pop(0) if self.passos else None
+
+
+def _estado_atual(numero: str) -> str:
+    conversa = chatbot.conversas.get(numero)
+    return conversa['estado'] if conversa else 'nova_conversa'
+
+
+# ---------------------------------------------------------------------------
+# Medições
+# ---------------------------------------------------------------------------
+
+class Medicoes:
+    """Acumula latências por estado e consultas por mensagem (seguro para threads)"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.consultas: Dict[str, List[int]] = defaultdict(list)
+        self.erros = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, estado: str, segundos: float, consultas: Optional[int] = None):
+        with self._lock:
+            self.latencias[estado].append(segundos)
+            if consultas is not None:
+                self.consultas[estado].append(consultas)
+
+    def erro(self):
+        with self._lock:
+            self.erros += 1
+
+    @property
+    def mensagens(self) -> int:
+        return sum(len(v) for v in self.latencias.values())
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    posto = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[posto]
+
+
+def resumir(medicoes: Medicoes, duracao: float, consultas_totais: int) -> dict:
+    """Converte as medições no relatório (latências em milissegundos)"""
+    mensagens = medicoes.mensagens
+    por_estado = {}
+    for estado, valores in sorted(medicoes.latencias.items()):
+        consultas = medicoes.consultas.get(estado)
+        por_estado[estado] = {
+            "mensagens": len(valores),
+            "p50_ms": round(percentil(valores, 50) * 1000, 3),
+            "p95_ms": round(percentil(valores, 95) * 1000, 3),
+            "p99_ms": round(percentil(valores, 99) * 1000, 3),
+            "consultas_por_mensagem": round(sum(consultas) / len(consultas), 2) if consultas else None,
+        }
+
+    return {
+        "mensagens": mensagens,
+        "erros": medicoes.erros,
+        "duracao_s": round(duracao, 3),
+        "mensagens_por_segundo": round(mensagens / duracao, 1) if duracao else 0.0,
+        "consultas_por_mensagem": round(consultas_totais / mensagens, 2) if mensagens else 0.0,
+        "estados": por_estado,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Modo direto: processar_mensagem em threads
+# ---------------------------------------------------------------------------
+
+def _cliente_direto(indice: int, prefixo: str, medicoes: Medicoes):
+    numero = f"{prefixo}{indice:06d}"
+    roteiro = Roteiro(indice)
+    db = SessionLocal()
+    try:
+        resposta = None
+        while (mensagem := roteiro.proxima(resposta)) is not None:
+            estado = _estado_atual(numero)
+            inicio = time.perf_counter()
+            try:
+                with medir() as medicao:
+                    resposta = chatbot.processar_mensagem(mensagem, db, numero)
+            except Exception as e:
+                print(f"❌ Erro no cliente {numero}: {e}", file=sys.stderr)
+                db.rollback()
+                medicoes.erro()
+                resposta = None
+                continue
+            medicoes.registrar(estado, time.perf_counter() - inicio, medicao.consultas)
+    finally:
+        db.close()
+
+
+def rodar_direto(clientes: int) -> dict:
+    medicoes = Medicoes()
+    consultas_antes = consultas_total.valor()
+    inicio = time.perf_counter()
+    # Sem a API não há startup: a fila do group commit (se ativada) é iniciada aqui
+    fila_escrita.iniciar_fila_escrita()
+    try:
+        with ThreadPoolExecutor(max_workers=clientes) as executor:
+            for futuro in [executor.submit(_cliente_direto, i, "5501", medicoes) for i in range(clientes)]:
+                futuro.result()
+    finally:
+        fila_escrita.parar_fila_escrita()
+    return resumir(medicoes, time.perf_counter() - inicio, consultas_total.valor() - consultas_antes)
+
+
+# ---------------------------------------------------------------------------
+# Modo ASGI: POST /mensagem por um cliente ASGI em processo
+# ---------------------------------------------------------------------------
+
+class ClienteASGI:
+    """Cliente HTTP mínimo que chama o app ASGI diretamente (executa o lifespan)"""
+
+    def __init__(self, aplicacao):
+        self.app = aplicacao
+        self._fila_lifespan: Optional[asyncio.Queue] = None
+        self._tarefa_lifespan: Optional[asyncio.Task] = None
+        self._respostas_lifespan: Optional[asyncio.Queue] = None
+
+    async def __aenter__(self):
+        self._fila_lifespan = asyncio.Queue()
+        self._respostas_lifespan = asyncio.Queue()
+        escopo = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._tarefa_lifespan = asyncio.create_task(
+            self.app(escopo, self._fila_lifespan.get, self._respostas_lifespan.put)
+        )
+        await self._fila_lifespan.put({"type": "lifespan.startup"})
+        await self._respostas_lifespan.get()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._fila_lifespan.put({"type": "lifespan.shutdown"})
+        await self._respostas_lifespan.get()
+        await self._tarefa_lifespan
+
+    async def request(self, metodo: str, caminho: str, corpo: Optional[dict] = None):
+        """Envia uma requisição e retorna (status, json da resposta, state do escopo)"""
+        dados = json.dumps(corpo).encode() if corpo is not None else b""
+        escopo = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": metodo,
+            "scheme": "http",
+            "path": caminho,
+            "raw_path": caminho.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(dados)).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("benchmark", 80),
+            "state": {},
+        }
+        enviado = False
+        status = 0
+        partes: List[bytes] = []
+
+        async def receive():
+            nonlocal enviado
+            if not enviado:
+                enviado = True
+                return {"type": "http.request", "body": dados, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def send(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                partes.append(mensagem.get("body", b""))
+
+        await self.app(escopo, receive, send)
+        corpo_resposta = b"".join(partes)
+        return status, json.loads(corpo_resposta) if corpo_resposta else None, escopo["state"]
+
+
+async def _cliente_asgi(cliente: ClienteASGI, indice: int, prefixo: str, medicoes: Medicoes):
+    numero = f"{prefixo}{indice:06d}"
+    roteiro = Roteiro(indice)
+    resposta = None
+    while (mensagem := roteiro.proxima(resposta)) is not None:
+        estado = _estado_atual(numero)
+        inicio = time.perf_counter()
+        status, corpo, state = await cliente.request("POST", "/mensagem", {"mensagem": mensagem, "user_id": numero})
+        if status != 200:
+            medicoes.erro()
+            resposta = None
+            continue
+        # Consultas contadas pelo MiddlewareMetricas durante a requisição
+        medicoes.registrar(estado, time.perf_counter() - inicio, state["medicao_requisicao"].consultas)
+        resposta = corpo["resposta"]
+
+
+async def _rodar_asgi(clientes: int) -> dict:
+    medicoes = Medicoes()
+    async with ClienteASGI(app) as cliente:
+        consultas_antes = consultas_total.valor()
+        inicio = time.perf_counter()
+        await asyncio.gather(*(_cliente_asgi(cliente, i, "5502", medicoes) for i in range(clientes)))
+        duracao = time.perf_counter() - inicio
+    return resumir(medicoes, duracao, consultas_total.valor() - consultas_antes)
+
+
+def rodar_asgi(clientes: int) -> dict:
+    return asyncio.run(_rodar_asgi(clientes))
+
+
+# ---------------------------------------------------------------------------
+# Relatório e baseline
+# ---------------------------------------------------------------------------
+
+def imprimir_relatorio(modo: str, resultado: dict):
+    print(f"\n📊 Modo {modo}: {resultado['mensagens']} mensagens em {resultado['duracao_s']}s "
+          f"({resultado['mensagens_por_segundo']} msg/s), "
+          f"{resultado['consultas_por_mensagem']} consultas/mensagem, {resultado['erros']} erro(s)")
+    print(f"   {'estado':<26}{'msgs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'consultas':>11}")
+    for estado, dados in resultado["estados"].items():
+        consultas = dados["consultas_por_mensagem"]
+        print(f"   {estado:<26}{dados['mensagens']:>6}{dados['p50_ms']:>10}{dados['p95_ms']:>10}"
+              f"{dados['p99_ms']:>10}{'' if consultas is None else consultas:>11}")
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float, tolerancia_consultas: float) -> List[str]:
+    """Lista as regressões do resultado atual em relação à baseline"""
+    regressoes = []
+    for modo, resultado in atual.items():
+        base = baseline.get(modo)
+        if not base:
+            continue
+
+        if resultado["mensagens_por_segundo"] < base["mensagens_por_segundo"] * (1 - tolerancia):
+            regressoes.append(f"{modo}: vazão {resultado['mensagens_por_segundo']} msg/s "
+                              f"(baseline {base['mensagens_por_segundo']})")
+        if resultado["consultas_por_mensagem"] > base["consultas_por_mensagem"] * (1 + tolerancia_consultas):
+            regressoes.append(f"{modo}: {resultado['consultas_por_mensagem']} consultas/mensagem "
+                              f"(baseline {base['consultas_por_mensagem']})")
+
+        for estado, dados in resultado["estados"].items():
+            base_estado = base["estados"].get(estado)
+            if base_estado and dados["p95_ms"] > base_estado["p95_ms"] * (1 + tolerancia):
+                regressoes.append(f"{modo}/{estado}: p95 {dados['p95_ms']} ms (baseline {base_estado['p95_ms']} ms)")
+            if (base_estado and dados["consultas_por_mensagem"] is not None
+                    and base_estado["consultas_por_mensagem"] is not None
+                    and dados["consultas_por_mensagem"] > base_estado["consultas_por_mensagem"] * (1 + tolerancia_consultas)):
+                regressoes.append(f"{modo}/{estado}: {dados['consultas_por_mensagem']} consultas/mensagem "
+                                  f"(baseline {base_estado['consultas_por_mensagem']})")
+    return regressoes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark em processo do Chatbot Barbearia")
+    parser.add_argument("--clientes", type=int, default=50, help="Clientes sintéticos simultâneos")
+    parser.add_argument("--modo", choices=("direto", "asgi", "ambos"), default="ambos")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO, help="Arquivo JSON da baseline")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava o resultado como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Piora relativa aceita em vazão e latência (0.2 = 20%%)")
+    parser.add_argument("--tolerancia-consultas", type=float, default=0.05,
+                        help="Aumento relativo aceito em consultas por mensagem")
+    args = parser.parse_args(argv)
+
+    print(f"🧪 Benchmark com {args.clientes} cliente(s) simultâneo(s) — banco temporário em {_DIRETORIO_TEMP.name}")
+
+    resultados = {}
+    if args.modo in ("direto", "ambos"):
+        resultados["direto"] = rodar_direto(args.clientes)
+        imprimir_relatorio("direto", resultados["direto"])
+    if args.modo in ("asgi", "ambos"):
+        resultados["asgi"] = rodar_asgi(args.clientes)
+        imprimir_relatorio("asgi", resultados["asgi"])
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Baseline salva em {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia, args.tolerancia_consultas)
+        if regressoes:
+            print("\n❌ Regressões em relação à baseline:")
+            for regressao in regressoes:
+                print(f"   - {regressao}")
+            return 1
+        print("\n✅ Sem regressões em relação à baseline.")
+
+    return 0
+
+
+def _remover_banco_temporario():
+    """Fecha as conexões e apaga o diretório do banco temporário"""
+    engine.dispose()
+    if database.async_engine is not None:
+        asyncio.run(database.async_engine.dispose())
+    _DIRETORIO_TEMP.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        codigo = main()
+    finally:
+        _remover_banco_temporario()
+    sys.exit(codigo)
@@ -0,0 +1,60 @@
+"""
+Cache em memória com política LRU e expiração por tempo (TTL)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Cache LRU limitado em número de itens, com TTL opcional e seguro para threads"""
+
+    def __init__(self, max_itens: int, ttl_segundos: Optional[float] = None):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave: Hashable, padrao: Any = None) -> Any:
+        """Retorna o valor da chave (ou 'padrao' se ausente/expirado) e o marca como recente"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+
+            valor, expira_em = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave: Hashable, valor: Any) -> None:
+        """Grava o valor, descartando os itens menos usados acima do limite"""
+        expira_em = time.monotonic() + self.ttl_segundos if self.ttl_segundos else None
+
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def pop(self, chave: Hashable, padrao: Any = None) -> Any:
+        """Remove a chave e retorna seu valor"""
+        with self._lock:
+            item = self._itens.pop(chave, None)
+        return item[0] if item is not None else padrao
+
+    def clear(self) -> None:
+        """Remove todos os itens"""
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def __contains__(self, chave: Hashable) -> bool:
+        return self.get(chave) is not None
@@ -1,13 +1,41 @@
 from models import Agendamento, Cliente
+from database import executar, iniciar_transacao_escrita
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
 import re
 
-# Dicionário para armazenar o estado das conversas
-conversas = {}
-
 # Importa configurações
-from config import get_barbeiros, get_horarios_disponiveis, get_mensagem, VALIDACAO
+from config import get_barbeiros, get_mensagem, VALIDACAO, CACHE_CLIENTES, LOTE
+from disponibilidade import grade, formatar_horario, agora
+from estado_conversas import criar_conversation_store, ConversationStore, ConversasCarregadas, ConversasPendentes
+from cache import LRUCache
+from arquivamento import inicio_de_hoje
+from metricas import registrar_estado, registro as registro_metricas
+from execucao_por_chave import ExecutorPorChave
+from deduplicacao import respostas_processadas, mensagens_duplicadas
+import fila_escrita
+
+# Armazenamento do estado das conversas (backend definido em config.CONVERSAS)
+conversas = criar_conversation_store()
+
+class ClienteInfo(NamedTuple):
+    """Dados do cliente usados pelos handlers (resolvidos uma vez por mensagem)"""
+    id: int
+    numero: str
+    nome: str
+
+# Cache de identidade do processo: numero -> ClienteInfo
+clientes_cache = LRUCache(CACHE_CLIENTES["max_itens"], CACHE_CLIENTES["ttl_segundos"])
+
+# Mensagens de um mesmo cliente são processadas uma de cada vez, na ordem de chegada
+executor_clientes = ExecutorPorChave()
+registro_metricas.gauge(
+    "chatbot_clientes_em_processamento", "Clientes com mensagens em processamento ou na fila",
+    lambda: len(executor_clientes))
 
 # Lista de barbeiros disponíveis
 barbeiros = get_barbeiros()
@@ -16,43 +44,127 @@ def limpar_numero(numero: str) -> str:
     """Remove caracteres não numéricos do número de telefone"""
     return re.sub(r'\D', '', numero)
 
-def get_or_create_cliente(db: Session, numero: str) -> Cliente:
-    """Busca ou cria um cliente pelo número de telefone"""
+def confirmar(db: Session):
+    """Confirma as alterações da mensagem atual
+
+    Fora de lote faz commit imediatamente; dentro de processar_lote apenas
+    envia as alterações ao banco (flush) e o commit é feito em grupo.
+    """
+    if db.info.get("commit_adiado"):
+        db.flush()
+    else:
+        db.commit()
+
+def gravar(db: Session, funcao, *args):
+    """Executa a escrita funcao(sessao, *args), confirma e retorna o resultado de funcao
+
+    Com o group commit ativo (config.GRUPO_COMMIT) a escrita vai para a fila de
+    escrita e é confirmada junto com as de outras requisições; exceções de
+    funcao (ex.: IntegrityError) chegam a quem chamou do mesmo jeito.
+    """
+    fila = fila_escrita.fila
+    if fila is not None and not db.info.get("commit_adiado"):
+        return fila_escrita.aguardar(fila.enviar(funcao, *args))
+    
+    resultado = funcao(db, *args)
+    confirmar(db)
+    return resultado
+
+def _inserir_cliente(db: Session, numero: str) -> int:
+    novo = Cliente(numero=numero, nome="Nome não informado")
+    # Savepoint: um conflito desfaz só este INSERT (inclusive dentro de um lote)
+    with db.begin_nested():
+        db.add(novo)
+    return novo.id
+
+def _incrementar_versao(db: Session, cliente_id: int):
+    # Muda o ETag de GET /cliente/{numero}
+    db.execute(
+        update(Cliente)
+        .where(Cliente.id == cliente_id)
+        .values(versao=Cliente.versao + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def _atualizar_nome(db: Session, cliente_id: int, nome: str):
+    db.query(Cliente).filter_by(id=cliente_id).update({"nome": nome, "versao": Cliente.versao + 1})
+
+def _inserir_agendamento(db: Session, cliente: ClienteInfo, horario: str, inicio: datetime, barbeiro: str) -> int:
+    novo = Agendamento(
+        cliente_id=cliente.id,
+        contato=cliente.numero,
+        horario=horario,
+        inicio=inicio,
+        barbeiro=barbeiro
+    )
+    # O índice único (barbeiro, inicio) rejeita o INSERT se o horário já foi reservado
+    with db.begin_nested():
+        db.add(novo)
+        _incrementar_versao(db, cliente.id)
+    return novo.id
+
+def _cancelar_agendamento(db: Session, agendamento_id: int, cliente_id: int) -> Optional[Tuple[str, datetime]]:
+    # Retorna (barbeiro, inicio) do agendamento removido, para devolver o horário à grade
+    linha = db.execute(
+        delete(Agendamento)
+        .where(Agendamento.id == agendamento_id, Agendamento.cliente_id == cliente_id)
+        .returning(Agendamento.barbeiro, Agendamento.inicio)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if linha is None:
+        return None
+    _incrementar_versao(db, cliente_id)
+    return tuple(linha)
+
+def get_or_create_cliente(db: Session, numero: str) -> ClienteInfo:
+    """Busca ou cria um cliente pelo número de telefone
+
+    Consulta o cache de identidade antes do banco: conversas ativas não fazem
+    nenhuma busca de cliente.
+    """
     numero_limpo = limpar_numero(numero)
     
+    cliente = clientes_cache.get(numero_limpo)
+    if cliente is not None:
+        return cliente
+    
     # Busca cliente existente
-    cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
+    linha = db.query(Cliente.id, Cliente.nome).filter_by(numero=numero_limpo).first()
     
-    if not cliente:
+    if linha:
+        cliente = ClienteInfo(linha.id, numero_limpo, linha.nome)
+    else:
         # Cria novo cliente automaticamente
-        cliente = Cliente(numero=numero_limpo, nome="Nome não informado")
-        db.add(cliente)
-        db.commit()
-        db.refresh(cliente)
-        print(f"Novo cliente criado: {numero_limpo}")
+        try:
+            cliente_id = gravar(db, _inserir_cliente, numero_limpo)
+        except IntegrityError:
+            # Outro worker criou o mesmo número ao mesmo tempo
+            linha = db.query(Cliente.id, Cliente.nome).filter_by(numero=numero_limpo).one()
+            cliente = ClienteInfo(linha.id, numero_limpo, linha.nome)
+        else:
+            cliente = ClienteInfo(cliente_id, numero_limpo, "Nome não informado")
+            print(f"Novo cliente criado: {numero_limpo}")
     
+    clientes_cache.set(numero_limpo, cliente)
     return cliente
 
+def atualizar_nome_cliente(db: Session, cliente: ClienteInfo, nome: str) -> ClienteInfo:
+    """Grava o novo nome do cliente e atualiza o cache de identidade"""
+    gravar(db, _atualizar_nome, cliente.id, nome)
+    
+    atualizado = cliente._replace(nome=nome)
+    clientes_cache.set(cliente.numero, atualizado)
+    return atualizado
+
 def gerar_horarios_disponiveis(db: Session, barbeiro: str):
     """Gera lista de horários disponíveis para um barbeiro"""
-    horarios = []
-    hoje = datetime.now()
-    horarios_disponiveis = get_horarios_disponiveis()
-    max_horarios = VALIDACAO["max_horarios_exibidos"]
-    dias_futuros = VALIDACAO["dias_futuros"]
-    
-    for i in range(dias_futuros):  # Próximos dias
-        dia = hoje + timedelta(days=i)
-        for hora in horarios_disponiveis:
-            dt_str = f"{dia.strftime('%d/%m')} {hora}"
-            agendado = db.query(Agendamento).filter_by(horario=dt_str, barbeiro=barbeiro).first()
-            if not agendado:
-                horarios.append(dt_str)
-    
-    return horarios[:max_horarios]  # Retorna os primeiros horários disponíveis
-
-def processar_mensagem(mensagem: str, db: Session, user_id: str):
+    # Lidos da grade em memória; o banco só é consultado quando ela é remontada
+    return grade.proximos(db, barbeiro, limite=VALIDACAO["max_horarios_exibidos"])
+
+def processar_mensagem(mensagem: str, db: Session, user_id: str, estado_conversas: Optional[ConversationStore] = None):
     """Função principal que processa as mensagens do chatbot"""
+    if estado_conversas is None:
+        estado_conversas = conversas
     
     # Limpa o número do usuário
     numero_limpo = limpar_numero(user_id)
@@ -60,9 +172,13 @@ def processar_mensagem(mensagem: str, db: Session, user_id: str):
     # Busca ou cria o cliente automaticamente
     cliente = get_or_create_cliente(db, numero_limpo)
     
+    # Carrega o estado da conversa; os handlers alteram 'conversa' e ela é gravada no final
+    conversa = estado_conversas.get(numero_limpo)
+    
     # Se o usuário não tem conversa ativa, inicializa
-    if numero_limpo not in conversas:
-        conversas[numero_limpo] = {
+    if conversa is None:
+        registrar_estado('nova_conversa')
+        conversa = {
             'estado': 'menu_principal',
             'dados': {},
             'cliente_id': cliente.id
@@ -70,47 +186,211 @@ def processar_mensagem(mensagem: str, db: Session, user_id: str):
         
         # Se o cliente já tem nome, mostra menu personalizado
         if cliente.nome and cliente.nome != "Nome não informado":
-            return get_mensagem("boas_vindas_retorno", nome=cliente.nome)
+            resposta = get_mensagem("boas_vindas_retorno", nome=cliente.nome)
         else:
             # Cliente novo, pede o nome
-            conversas[numero_limpo]['estado'] = 'aguardando_nome'
-            return get_mensagem("boas_vindas")
+            conversa['estado'] = 'aguardando_nome'
+            resposta = get_mensagem("boas_vindas")
+        
+        estado_conversas.set(numero_limpo, conversa)
+        return resposta
     
     # Obtém o estado atual da conversa
-    estado = conversas[numero_limpo]['estado']
+    estado = conversa['estado']
+    registrar_estado(estado)
     
     # Processa mensagem baseado no estado
     if estado == 'menu_principal':
-        return processar_menu_principal(mensagem, numero_limpo, db)
+        resposta = processar_menu_principal(mensagem, cliente, db, conversa)
     
     elif estado == 'aguardando_nome':
-        return processar_nome_cliente(mensagem, numero_limpo, db)
+        resposta = processar_nome_cliente(mensagem, cliente, db, conversa)
     
     elif estado == 'escolher_barbeiro':
-        return processar_escolha_barbeiro(mensagem, numero_limpo, db)
+        resposta = processar_escolha_barbeiro(mensagem, cliente, db, conversa)
     
     elif estado == 'escolher_horario':
-        return processar_escolha_horario(mensagem, numero_limpo, db)
+        resposta = processar_escolha_horario(mensagem, cliente, db, conversa)
     
     elif estado == 'aguardando_cancelamento':
-        return processar_cancelamento(mensagem, numero_limpo, db)
+        resposta = processar_cancelamento(mensagem, cliente, db, conversa)
     
     else:
         # Estado inválido, volta ao menu
-        conversas[numero_limpo] = {'estado': 'menu_principal', 'dados': {}, 'cliente_id': cliente.id}
-        return get_menu_principal(cliente.nome)
+        resetar_conversa(conversa, cliente.id)
+        resposta = get_menu_principal(cliente.nome)
+    
+    estado_conversas.set(numero_limpo, conversa)
+    return resposta
+
+def resetar_conversa(conversa: dict, cliente_id: int):
+    """Volta a conversa para o menu principal, descartando os dados do fluxo"""
+    conversa.update({'estado': 'menu_principal', 'dados': {}, 'cliente_id': cliente_id})
 
-def processar_menu_principal(mensagem: str, numero_limpo: str, db: Session):
+def processar_lote(mensagens: List[Tuple[str, str]], db: Session,
+                   estado_conversas: Optional[ConversationStore] = None) -> List[Optional[str]]:
+    """Processa um lote de mensagens (mensagem, user_id) com uma única sessão
+
+    As mensagens são processadas na ordem recebida (o que preserva a ordem por
+    usuário) e confirmadas em transações de até LOTE["mensagens_por_transacao"]
+    mensagens. Cada mensagem roda em um savepoint: se falhar, só ela é desfeita
+    e sua resposta é None. O estado das conversas só é gravado depois do commit
+    de cada transação. Retorna as respostas na ordem de entrada.
+    """
+    respostas: List[Optional[str]] = []
+    numeros_pendentes = set()
+    pendentes = 0
+    conversas_pendentes = ConversasPendentes(estado_conversas if estado_conversas is not None else conversas)
+    
+    db.info["commit_adiado"] = True
+    try:
+        for mensagem, user_id in mensagens:
+            numero_limpo = limpar_numero(user_id)
+            if pendentes == 0:
+                # Transação explícita: sem ela o pysqlite não abre transação antes do
+                # savepoint e o RELEASE de cada mensagem já faria o commit dela
+                iniciar_transacao_escrita(db)
+            try:
+                with db.begin_nested():
+                    respostas.append(processar_mensagem(mensagem, db, user_id, conversas_pendentes))
+            except Exception as e:
+                print(f"Erro ao processar mensagem do lote ({numero_limpo}): {str(e)}")
+                # O cliente pode ter sido criado (e o horário reservado) no savepoint desfeito
+                clientes_cache.pop(numero_limpo)
+                grade.invalidar()
+                respostas.append(None)
+            
+            numeros_pendentes.add(numero_limpo)
+            pendentes += 1
+            if pendentes >= LOTE["mensagens_por_transacao"]:
+                db.commit()
+                conversas_pendentes.confirmar()
+                numeros_pendentes.clear()
+                pendentes = 0
+        
+        db.commit()
+        conversas_pendentes.confirmar()
+    except Exception:
+        db.rollback()
+        # As conversas não podem avançar (ex.: "confirmado") sem as linhas desfeitas
+        conversas_pendentes.descartar()
+        for numero_limpo in numeros_pendentes:
+            clientes_cache.pop(numero_limpo)
+        grade.invalidar()
+        raise
+    finally:
+        db.info.pop("commit_adiado", None)
+    
+    return respostas
+
+async def executar_com_conversas(db, numeros: List[str], funcao):
+    """Executa funcao(sessao, estado_conversas) com executar, sem I/O de conversas no event loop
+
+    Com AsyncSession os handlers rodam no event loop (run_sync); se o store
+    de conversas for bloqueante, as conversas dos números são lidas antes e
+    gravadas depois no threadpool. Os números devem estar reservados em
+    executor_clientes.
+    """
+    if isinstance(db, Session) or not conversas.bloqueante:
+        return await executar(db, funcao, conversas)
+    
+    carregadas = ConversasCarregadas(await run_in_threadpool(conversas.carregar, numeros))
+    try:
+        return await executar(db, funcao, carregadas)
+    finally:
+        if carregadas.alteradas:
+            await run_in_threadpool(conversas.atualizar, carregadas.alteradas)
+
+async def resposta_ja_dada(user_id: str, mensagem_id: Optional[str]) -> Optional[str]:
+    """Resposta já dada a um reenvio de mensagem_id (contado como duplicado), ou None"""
+    if not mensagem_id:
+        return None
+    resposta = await respostas_processadas.get_async(limpar_numero(user_id), mensagem_id)
+    if resposta is not None:
+        mensagens_duplicadas.inc()
+    return resposta
+
+async def processar_mensagem_async(mensagem: str, db, user_id: str, mensagem_id: Optional[str] = None):
+    """Versão assíncrona de processar_mensagem
+
+    Aceita uma AsyncSession (modo ASYNC_DB) ou uma Session síncrona; em ambos
+    os casos os handlers processar_* rodam sem bloquear o event loop. Mensagens
+    do mesmo cliente esperam as anteriores (estado da conversa consistente);
+    clientes diferentes rodam em paralelo. Um reenvio de mensagem_id já
+    respondido recebe a mesma resposta, sem processar de novo.
+    """
+    async with executor_clientes.reservar(limpar_numero(user_id)):
+        return await processar_mensagem_reservada(mensagem, db, user_id, mensagem_id)
+
+async def processar_mensagem_reservada(mensagem: str, db, user_id: str, mensagem_id: Optional[str] = None):
+    """processar_mensagem_async para quem já reservou o cliente em executor_clientes"""
+    # Dentro da reserva: a primeira cópia pode ter terminado enquanto esta esperava
+    resposta = await resposta_ja_dada(user_id, mensagem_id)
+    if resposta is not None:
+        return resposta
+    
+    resposta = await executar_com_conversas(
+        db, [limpar_numero(user_id)],
+        lambda sessao, estado_conversas: processar_mensagem(mensagem, sessao, user_id, estado_conversas))
+    
+    if mensagem_id:
+        await respostas_processadas.set_async(limpar_numero(user_id), mensagem_id, resposta)
+    return resposta
+
+async def processar_lote_async(mensagens: List[Tuple[str, str]], db,
+                               mensagem_ids: Optional[List[Optional[str]]] = None) -> List[Optional[str]]:
+    """Versão assíncrona de processar_lote, com os clientes do lote reservados no executor
+
+    Mensagens com mensagem_id já respondido (antes ou no próprio lote) recebem
+    a mesma resposta, sem processar de novo.
+    """
+    chaves = [(limpar_numero(user_id), mensagem_id)
+              for (_, user_id), mensagem_id in zip(mensagens, mensagem_ids or [None] * len(mensagens))]
+    
+    async with executor_clientes.reservar(*(numero for numero, _ in chaves)):
+        respostas: List[Optional[str]] = [None] * len(mensagens)
+        ja_dadas = iter(await respostas_processadas.get_varias_async([chave for chave in chaves if chave[1]]))
+        primeira_ocorrencia = {}  # (numero, mensagem_id) -> índice no lote
+        processar = []
+        for indice, chave in enumerate(chaves):
+            if chave[1]:
+                respostas[indice] = next(ja_dadas)
+                if respostas[indice] is not None or chave in primeira_ocorrencia:
+                    continue
+                primeira_ocorrencia[chave] = indice
+            processar.append(indice)
+        
+        processadas = await executar_com_conversas(
+            db, [chaves[i][0] for i in processar],
+            lambda sessao, estado_conversas: processar_lote([mensagens[i] for i in processar], sessao, estado_conversas))
+        
+        for indice, resposta in zip(processar, processadas):
+            respostas[indice] = resposta
+        await respostas_processadas.set_varias_async([
+            (*chaves[indice], respostas[indice]) for indice in processar
+            if chaves[indice][1] and respostas[indice] is not None
+        ])
+        
+        for indice, chave in enumerate(chaves):
+            if chave[1] and primeira_ocorrencia.get(chave, indice) != indice:
+                respostas[indice] = respostas[primeira_ocorrencia[chave]]
+        mensagens_duplicadas.inc(len(mensagens) - len(processar))
+        return respostas
+
+def processar_menu_principal(mensagem: str, cliente: ClienteInfo, db: Session, conversa: dict):
     """Processa escolhas do menu principal"""
     if mensagem == '1':
-        conversas[numero_limpo]['estado'] = 'escolher_barbeiro'
-        barbeiros_str = '\n'.join(f"{i+1}️⃣ - {nome}" for i, nome in enumerate(barbeiros))
-        return f"Escolha um barbeiro:\n{barbeiros_str}"
+        conversa['estado'] = 'escolher_barbeiro'
+        return f"Escolha um barbeiro:\n{listar_barbeiros()}"
     
     elif mensagem == '2':
-        # Mostra agendamentos do cliente
-        cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
-        agendamentos = db.query(Agendamento).filter_by(cliente_id=cliente.id).all()
+        # Mostra os próximos agendamentos do cliente (o histórico fica fora do caminho quente)
+        agendamentos = (
+            db.query(Agendamento)
+            .filter(Agendamento.cliente_id == cliente.id, Agendamento.inicio >= inicio_de_hoje())
+            .order_by(Agendamento.inicio, Agendamento.id)
+            .all()
+        )
         
         if not agendamentos:
             return (
@@ -135,121 +415,148 @@ def processar_menu_principal(mensagem: str, numero_limpo: str, db: Session):
         )
     
     elif mensagem == '3':
-        conversas[numero_limpo]['estado'] = 'aguardando_cancelamento'
+        conversa['estado'] = 'aguardando_cancelamento'
         return "Digite o ID do agendamento que deseja cancelar:"
     
     elif mensagem == '4':
         return "Um atendente irá entrar em contato em breve. Obrigado!"
     
     else:
-        cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
         return get_menu_principal(cliente.nome)
 
-def processar_nome_cliente(mensagem: str, numero_limpo: str, db: Session):
+def processar_nome_cliente(mensagem: str, cliente: ClienteInfo, db: Session, conversa: dict):
     """Processa o nome do cliente"""
     nome = mensagem.strip().title()
     if not nome or len(nome) < VALIDACAO["nome_min_length"]:
         return get_mensagem("nome_invalido")
     
-    # Atualiza o nome do cliente no banco
-    cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
-    cliente.nome = nome
-    db.commit()
+    # Atualiza o nome do cliente no banco (e no cache de identidade)
+    atualizar_nome_cliente(db, cliente, nome)
     
     # Vai para escolha de barbeiro
-    conversas[numero_limpo]['estado'] = 'escolher_barbeiro'
-    barbeiros_str = '\n'.join(f"{i+1}️⃣ - {nome}" for i, nome in enumerate(barbeiros))
-    return f"Perfeito, {nome}! Escolha um barbeiro:\n{barbeiros_str}"
+    conversa['estado'] = 'escolher_barbeiro'
+    return f"Perfeito, {nome}! Escolha um barbeiro:\n{listar_barbeiros()}"
 
-def processar_escolha_barbeiro(mensagem: str, numero_limpo: str, db: Session):
+def listar_barbeiros() -> str:
+    """Opções numeradas de barbeiro; a última é qualquer barbeiro"""
+    opcoes = barbeiros + ["Qualquer barbeiro (primeiro horário livre)"]
+    return '\n'.join(f"{i+1}️⃣ - {nome}" for i, nome in enumerate(opcoes))
+
+def processar_escolha_barbeiro(mensagem: str, cliente: ClienteInfo, db: Session, conversa: dict):
     """Processa a escolha do barbeiro"""
     numero = re.sub(r"\D", "", mensagem)
     if not numero:
         return "Digite apenas o número correspondente ao barbeiro."
     
     idx = int(numero) - 1
-    if idx < 0 or idx >= len(barbeiros):
+    if idx < 0 or idx > len(barbeiros):
         return "Escolha inválida. Digite o número correspondente ao barbeiro."
     
-    barbeiro = barbeiros[idx]
-    conversas[numero_limpo]['dados']['barbeiro'] = barbeiro
-    horarios = gerar_horarios_disponiveis(db, barbeiro)
+    # A opção depois dos barbeiros é "qualquer barbeiro" (barbeiro None)
+    barbeiro = barbeiros[idx] if idx < len(barbeiros) else None
+    conversa['dados']['barbeiro'] = barbeiro
+    horarios_str = oferecer_horarios(db, conversa, barbeiro)
     
-    if not horarios:
-        conversas[numero_limpo]['estado'] = 'menu_principal'
+    if horarios_str is None:
+        conversa['estado'] = 'menu_principal'
+        if barbeiro is None:
+            return "Nenhum horário disponível esta semana. Voltando ao menu principal."
         return "Nenhum horário disponível para esse barbeiro esta semana. Voltando ao menu principal."
     
-    conversas[numero_limpo]['dados']['horarios_disponiveis'] = horarios
-    conversas[numero_limpo]['estado'] = 'escolher_horario'
-    
-    horarios_str = '\n'.join(f"{i+1}️⃣ - {h}" for i, h in enumerate(horarios))
     return f"Escolha um dos horários disponíveis:\n{horarios_str}"
 
-def processar_escolha_horario(mensagem: str, numero_limpo: str, db: Session):
+def oferecer_horarios(db: Session, conversa: dict, barbeiro: Optional[str]) -> Optional[str]:
+    """Busca os horários livres do barbeiro (None = qualquer barbeiro), guarda-os na conversa e retorna a lista numerada (None se não houver)"""
+    if barbeiro is None:
+        # Primeiros horários da equipe inteira, em uma única passada pela grade
+        opcoes = grade.proximos_qualquer(db, limite=VALIDACAO["max_horarios_exibidos"])
+    else:
+        opcoes = [(h, barbeiro) for h in gerar_horarios_disponiveis(db, barbeiro)]
+    if not opcoes:
+        return None
+    
+    # Guarda os horários em ISO 8601 (com ano) para identificar o slot na escolha
+    conversa['dados']['horarios_disponiveis'] = [h.isoformat() for h, _ in opcoes]
+    if barbeiro is None:
+        conversa['dados']['barbeiros_horarios'] = [b for _, b in opcoes]
+    else:
+        conversa['dados'].pop('barbeiros_horarios', None)
+    conversa['estado'] = 'escolher_horario'
+    
+    if barbeiro is None:
+        return '\n'.join(f"{i+1}️⃣ - {formatar_horario(h)} com {b}" for i, (h, b) in enumerate(opcoes))
+    return '\n'.join(f"{i+1}️⃣ - {formatar_horario(h)}" for i, (h, _) in enumerate(opcoes))
+
+def processar_escolha_horario(mensagem: str, cliente: ClienteInfo, db: Session, conversa: dict):
     """Processa a escolha do horário"""
     numero = re.sub(r"\D", "", mensagem)
     if not numero:
         return "Digite apenas o número do horário."
     
     idx = int(numero) - 1
-    horarios = conversas[numero_limpo]['dados']['horarios_disponiveis']
+    horarios = conversa['dados']['horarios_disponiveis']
     
     if idx < 0 or idx >= len(horarios):
         return "Escolha inválida. Digite o número do horário disponível:"
     
-    horario = horarios[idx]
-    barbeiro = conversas[numero_limpo]['dados']['barbeiro']
-    cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
-    
-    # Verifica se o horário ainda está disponível
-    existente = db.query(Agendamento).filter_by(horario=horario, barbeiro=barbeiro).first()
-    if existente:
-        conversas[numero_limpo]['estado'] = 'menu_principal'
-        return "Esse horário acabou de ser agendado. Por favor, tente novamente.\nVoltando ao menu."
-    
-    # Cria o agendamento
-    novo = Agendamento(
-        cliente_id=cliente.id,
-        contato=cliente.numero,
-        horario=horario,
-        barbeiro=barbeiro
-    )
-    db.add(novo)
-    db.commit()
+    inicio = datetime.fromisoformat(horarios[idx])
+    horario = formatar_horario(inicio)
+    escolhido = conversa['dados']['barbeiro']
+    # Com "qualquer barbeiro" cada horário oferecido tem o seu barbeiro
+    barbeiros_horarios = conversa['dados'].get('barbeiros_horarios')
+    barbeiro = barbeiros_horarios[idx] if barbeiros_horarios else escolhido
+    
+    # O horário foi oferecido há algum tempo e pode já ter passado
+    if inicio <= agora():
+        horarios_str = oferecer_horarios(db, conversa, escolhido)
+        if horarios_str is None:
+            conversa['estado'] = 'menu_principal'
+            return "Esse horário já passou e não há outros horários livres esta semana.\nVoltando ao menu."
+        return f"Esse horário já passou. Escolha outro horário disponível:\n{horarios_str}"
+    
+    # Cria o agendamento; o índice único (barbeiro, inicio) impede reservas duplicadas
+    try:
+        agendamento_id = gravar(db, _inserir_agendamento, cliente, horario, inicio, barbeiro)
+    except IntegrityError:
+        # Outro cliente (talvez em outro worker) reservou o mesmo horário: oferece os horários ainda livres
+        grade.ocupar(barbeiro, inicio)
+        horarios_str = oferecer_horarios(db, conversa, escolhido)
+        if horarios_str is None:
+            conversa['estado'] = 'menu_principal'
+            return "Esse horário acabou de ser agendado e não há outros horários livres esta semana.\nVoltando ao menu."
+        return f"Esse horário acabou de ser agendado. Escolha outro horário disponível:\n{horarios_str}"
+    
+    grade.ocupar(barbeiro, inicio)
     
     # Reseta a conversa para o menu principal
-    conversas[numero_limpo] = {'estado': 'menu_principal', 'dados': {}, 'cliente_id': cliente.id}
+    resetar_conversa(conversa, cliente.id)
     
     return (
         f"✅ Agendamento confirmado!\n\n"
         f"📅 Data/Hora: {horario}\n"
         f"👨‍💼 Barbeiro: {barbeiro}\n"
-        f"🆔 ID do agendamento: {novo.id}\n\n"
+        f"🆔 ID do agendamento: {agendamento_id}\n\n"
         f"1️⃣ - Agendar outro horário\n"
         f"2️⃣ - Ver meus agendamentos\n"
         f"3️⃣ - Cancelar agendamento\n"
         f"4️⃣ - Falar com atendente"
     )
 
-def processar_cancelamento(mensagem: str, numero_limpo: str, db: Session):
+def processar_cancelamento(mensagem: str, cliente: ClienteInfo, db: Session, conversa: dict):
     """Processa o cancelamento de agendamento"""
     try:
         agendamento_id = int(mensagem)
-        cliente = db.query(Cliente).filter_by(numero=numero_limpo).first()
         
-        # Busca o agendamento do cliente
-        agendamento = db.query(Agendamento).filter(
-            Agendamento.id == agendamento_id,
-            Agendamento.cliente_id == cliente.id
-        ).first()
-        
-        if not agendamento:
+        # Remove o agendamento só se pertencer ao cliente (um único DELETE)
+        removido = gravar(db, _cancelar_agendamento, agendamento_id, cliente.id)
+        if not removido:
             return "Agendamento não encontrado ou não pertence a você. Tente novamente:"
         
-        db.delete(agendamento)
-        db.commit()
+        barbeiro, inicio = removido
+        if inicio is not None:
+            grade.liberar(barbeiro, inicio)
         
-        conversas[numero_limpo] = {'estado': 'menu_principal', 'dados': {}, 'cliente_id': cliente.id}
+        resetar_conversa(conversa, cliente.id)
         return (
             f"✅ Agendamento ID {agendamento_id} cancelado com sucesso!\n\n"
             f"1️⃣ - Agendar horário\n"
@@ -7,7 +7,40 @@ import os
 from typing import List
 
 # Configurações do Banco de Dados
-DATABASE_URL = "sqlite:///./barbearia.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./barbearia.db")
+
+# Modo assíncrono: as rotas usam um engine aiosqlite e não bloqueiam o event loop
+ASYNC_DB = os.getenv("ASYNC_DB", "False").lower() == "true"
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+
+# Perfil do engine SQLite: "dev" (padrões do SQLite) ou "producao" (WAL e pragmas ajustados)
+DB_PERFIL = os.getenv("DB_PERFIL", "dev")
+
+PERFIS_DB = {
+    "dev": {
+        "journal_mode": None,        # mantém o modo do arquivo (rollback journal)
+        "synchronous": None,
+        "busy_timeout_ms": 5000,
+        "mmap_size": None,
+        "cache_size_kib": None,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+    },
+    "producao": {
+        "journal_mode": "WAL",       # leitores não bloqueiam escritores (e vice-versa)
+        "synchronous": "NORMAL",     # seguro com WAL, sem fsync a cada commit
+        "busy_timeout_ms": 10000,    # espera o lock em vez de "database is locked"
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size_kib": 64 * 1024,
+        # Por processo: cobre as threads do threadpool que acessam o banco ao mesmo tempo
+        "pool_size": 20,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+    },
+}
 
 # Configurações da API
 API_HOST = "0.0.0.0"
@@ -15,6 +48,14 @@ API_PORT = 8000
 API_TITLE = "Chatbot Barbearia"
 API_VERSION = "1.0.0"
 
+# Servidor de produção (python start.py --producao)
+WORKERS = int(os.getenv("WEB_WORKERS", "0")) or (os.cpu_count() or 1)  # padrão: um por CPU
+TIMEOUT_GRACEFUL_SEGUNDOS = int(os.getenv("TIMEOUT_GRACEFUL_SEGUNDOS", "30"))
+
+# Aplica as migrações no startup de cada worker (desenvolvimento); o start.py --producao
+# as aplica uma única vez antes de subir os workers e desliga esta opção
+MIGRAR_NO_STARTUP = os.getenv("MIGRAR_NO_STARTUP", "True").lower() == "true"
+
 # Configurações do Chatbot
 BARBEIROS = ['João', 'Carlos', 'Marcos']
 
@@ -26,6 +67,9 @@ HORARIOS_DISPONIVEIS = [
     "19:00", "19:30"
 ]
 
+# Duração padrão de cada atendimento (em minutos)
+DURACAO_PADRAO_MINUTOS = 30
+
 # Configurações de mensagens
 MENSAGENS = {
     "boas_vindas": "👋 Olá! Bem-vindo à barbearia!\n\nPara começar, qual é o seu nome?",
@@ -38,7 +82,7 @@ MENSAGENS = {
     "agendamento_cancelado": "✅ Agendamento ID {id} cancelado com sucesso!\n\n1️⃣ - Agendar horário\n2️⃣ - Ver meus agendamentos\n3️⃣ - Cancelar agendamento\n4️⃣ - Falar com atendente",
     "sem_agendamentos": "Você não possui agendamentos ativos.\n\n1️⃣ - Agendar horário\n2️⃣ - Ver meus agendamentos\n3️⃣ - Cancelar agendamento\n4️⃣ - Falar com atendente",
     "agendamento_nao_encontrado": "Agendamento não encontrado ou não pertence a você. Tente novamente:",
-    "horario_indisponivel": "Esse horário acabou de ser agendado. Por favor, tente novamente.\nVoltando ao menu.",
+    "horario_indisponivel": "Esse horário acabou de ser agendado. Escolha outro horário disponível:\n{horarios}",
     "sem_horarios": "Nenhum horário disponível para esse barbeiro esta semana. Voltando ao menu principal.",
     "atendente": "Um atendente irá entrar em contato em breve. Obrigado!",
     "erro_generico": "Algo deu errado. Voltando ao menu.\n1️⃣ - Agendar horário\n2️⃣ - Ver meus agendamentos\n3️⃣ - Cancelar agendamento\n4️⃣ - Falar com atendente"
@@ -51,6 +95,92 @@ VALIDACAO = {
     "dias_futuros": 7
 }
 
+# Grade de horários livres em memória (disponibilidade.py); o TTL faz a grade refletir
+# agendamentos feitos por outros workers
+DISPONIBILIDADE = {
+    "ttl_segundos": int(os.getenv("DISPONIBILIDADE_TTL_SEGUNDOS", "60"))
+}
+
+# Armazenamento do estado das conversas
+# backend: "memoria" (um único processo) ou "sqlite" (compartilhado entre workers)
+CONVERSAS = {
+    "backend": os.getenv("CONVERSAS_BACKEND", "memoria"),
+    "max_conversas": int(os.getenv("CONVERSAS_MAX", "10000")),
+    "ttl_segundos": int(os.getenv("CONVERSAS_TTL_SEGUNDOS", str(24 * 60 * 60))),
+    "sqlite_caminho": os.getenv("CONVERSAS_SQLITE", "./conversas.db")
+}
+
+# Cache de identidade dos clientes (numero -> id/nome), por processo
+CACHE_CLIENTES = {
+    "max_itens": int(os.getenv("CACHE_CLIENTES_MAX", "50000")),
+    "ttl_segundos": int(os.getenv("CACHE_CLIENTES_TTL_SEGUNDOS", "600"))
+}
+
+# Respostas já dadas por mensagem_id, para responder reenvios sem reprocessar (deduplicacao.py)
+DEDUPLICACAO = {
+    "max_itens": int(os.getenv("DEDUPLICACAO_MAX", "50000")),
+    "ttl_segundos": int(os.getenv("DEDUPLICACAO_TTL_SEGUNDOS", str(24 * 60 * 60))),
+    "persistir": os.getenv("DEDUPLICACAO_PERSISTIR", "False").lower() == "true",
+    "sqlite_caminho": os.getenv("DEDUPLICACAO_SQLITE", "./mensagens_processadas.db")
+}
+
+# Cache das respostas de GET /cliente/{numero}, por processo, validado pela versão do cliente (0 desativa)
+CACHE_RESPOSTAS_CLIENTE = {
+    "max_itens": int(os.getenv("CACHE_RESPOSTAS_CLIENTE_MAX", "10000"))
+}
+
+# Ingestão de mensagens em lote (POST /mensagens/lote)
+LOTE = {
+    "max_mensagens": int(os.getenv("LOTE_MAX_MENSAGENS", "500")),
+    "mensagens_por_transacao": int(os.getenv("LOTE_MENSAGENS_POR_TRANSACAO", "50"))
+}
+
+# Controle de admissão de POST /mensagem (admissao.py); zero desativa o limite
+ADMISSAO = {
+    "max_em_andamento": int(os.getenv("ADMISSAO_MAX_EM_ANDAMENTO", "64")),  # por worker; acima: 503
+    "retry_after_segundos": int(os.getenv("ADMISSAO_RETRY_AFTER_SEGUNDOS", "1")),
+    "mensagens_por_segundo": float(os.getenv("ADMISSAO_MENSAGENS_POR_SEGUNDO", "1")),  # por user_id; acima: 429
+    "rajada": int(os.getenv("ADMISSAO_RAJADA", "5")),
+    "max_usuarios": int(os.getenv("ADMISSAO_MAX_USUARIOS", "100000"))
+}
+
+# Ingestão assíncrona do webhook (POST /webhook/mensagem, ingestao.py)
+# backend: "memoria" ou "sqlite" (pendentes sobrevivem a uma queda do processo)
+# enviador: "local" (guarda as respostas em memória) ou "modulo:Classe"
+INGESTAO = {
+    "backend": os.getenv("INGESTAO_BACKEND", "memoria"),
+    "workers": int(os.getenv("INGESTAO_WORKERS", "4")),  # mensagens em processamento ao mesmo tempo
+    "max_pendentes": int(os.getenv("INGESTAO_MAX_PENDENTES", "10000")),  # acima: 503
+    "sqlite_caminho": os.getenv("INGESTAO_SQLITE", "./fila_mensagens.db"),
+    # Prazo das mensagens de um worker no SQLite: renovado a cada terço; vencido, outro worker as retoma
+    "lease_segundos": float(os.getenv("INGESTAO_LEASE_SEGUNDOS", "30")),
+    "enviador": os.getenv("INGESTAO_ENVIADOR", "local")
+}
+
+# Group commit: escritas de requisições concorrentes confirmadas juntas por uma thread escritora
+# durabilidade: "perfil" (PRAGMA synchronous do perfil do banco), "total" (FULL),
+# "normal" (NORMAL: com WAL, uma queda de energia pode perder os últimos commits) ou "desligada" (OFF)
+GRUPO_COMMIT = {
+    "ativo": os.getenv("GRUPO_COMMIT", "False").lower() == "true",
+    "intervalo_ms": float(os.getenv("GRUPO_COMMIT_INTERVALO_MS", "5")),
+    "max_itens": int(os.getenv("GRUPO_COMMIT_MAX_ITENS", "64")),
+    "durabilidade": os.getenv("GRUPO_COMMIT_DURABILIDADE", "perfil")
+}
+
+# Arquivamento (arquivamento.py): agendamentos que começaram há mais de dias_retencao dias saem
+# da tabela principal para agendamentos_arquivados, em blocos
+ARQUIVAMENTO = {
+    "dias_retencao": int(os.getenv("ARQUIVAMENTO_DIAS_RETENCAO", "30")),
+    "bloco": int(os.getenv("ARQUIVAMENTO_BLOCO", "5000"))
+}
+
+# Listagem administrativa de agendamentos (GET /agendamentos)
+PAGINACAO = {
+    "limite_padrao": 100,
+    "limite_maximo": 1000,
+    "bloco_streaming": 500  # linhas lidas do banco por vez no modo NDJSON
+}
+
 # Configurações de desenvolvimento
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
@@ -70,4 +200,17 @@ def get_horarios_disponiveis() -> List[str]:
 def get_mensagem(chave: str, **kwargs) -> str:
     """Retorna uma mensagem formatada"""
     mensagem = MENSAGENS.get(chave, "Mensagem não encontrada")
-    return mensagem.format(**kwargs) if kwargs else mensagem 
\ No newline at end of file
+    return mensagem.format(**kwargs) if kwargs else mensagem 
+
+def get_perfil_db(nome: str = None) -> dict:
+    """Retorna o perfil do engine, com sobrescritas por variáveis de ambiente (DB_<CHAVE>)"""
+    nome = nome or DB_PERFIL
+    if nome not in PERFIS_DB:
+        raise ValueError(f"Perfil de banco desconhecido: {nome}")
+
+    perfil = dict(PERFIS_DB[nome])
+    for chave, valor in perfil.items():
+        sobrescrita = os.getenv(f"DB_{chave.upper()}")
+        if sobrescrita is not None:
+            perfil[chave] = int(sobrescrita) if sobrescrita.isdigit() else sobrescrita
+    return perfil
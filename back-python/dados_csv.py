@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Importação e exportação de clientes e agendamentos em CSV
+
+Uso:
+    python dados_csv.py importar clientes ARQUIVO.csv
+    python dados_csv.py importar agendamentos ARQUIVO.csv
+    python dados_csv.py exportar clientes [ARQUIVO.csv]        # sem arquivo: saída padrão
+    python dados_csv.py exportar agendamentos [ARQUIVO.csv]
+
+Colunas (cabeçalho obrigatório; as exportações geram o mesmo formato):
+    clientes:     numero, nome, criado_em (opcional)
+    agendamentos: numero, barbeiro, inicio (ISO 8601), duracao_minutos, contato, criado_em
+                  (só numero, barbeiro e inicio são obrigatórias)
+
+A importação lê o arquivo em streaming e grava em blocos de BLOCO linhas, um
+INSERT em lote e um commit por bloco:
+- clientes: número normalizado com limpar_numero e upsert pelo número (o nome
+  é atualizado se vier preenchido);
+- agendamentos: o cliente é resolvido pelo número (criado se não existir) e
+  horários já ocupados do barbeiro (índice único barbeiro + inicio) são ignorados.
+
+A exportação lê o banco em blocos (yield_per) e escreve cada linha assim que chega.
+"""
+
+import argparse
+import csv
+import sys
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from database import engine, SessionLocal
+from models import Agendamento, Cliente
+from migracoes import aplicar_migracoes
+from chatbot import limpar_numero
+from disponibilidade import formatar_horario
+from config import DURACAO_PADRAO_MINUTOS
+
+# Linhas gravadas (ou lidas do banco) por vez
+BLOCO = 5000
+
+NOME_PADRAO = "Nome não informado"
+
+COLUNAS_CLIENTES = ["numero", "nome", "criado_em"]
+COLUNAS_AGENDAMENTOS = ["numero", "barbeiro", "inicio", "duracao_minutos", "contato", "criado_em"]
+
+
+def _em_blocos(itens: Iterable, tamanho: int = BLOCO) -> Iterator[list]:
+    iterador = iter(itens)
+    while bloco := list(islice(iterador, tamanho)):
+        yield bloco
+
+
+def _data(valor: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def _linhas_validas(leitor: csv.DictReader, converter, erros: List[str]) -> Iterator[dict]:
+    """Converte cada linha do CSV; linhas inválidas são contadas e ignoradas"""
+    for linha in leitor:
+        try:
+            convertida = converter(linha)
+        except (KeyError, TypeError, ValueError) as e:
+            erros.append(f"linha {leitor.line_num}: {e}")
+            continue
+        if convertida is not None:
+            yield convertida
+
+
+def _cliente(linha: dict) -> Optional[dict]:
+    numero = limpar_numero(linha["numero"] or "")
+    if not numero:
+        raise ValueError("número vazio")
+
+    cliente = {"numero": numero, "nome": (linha.get("nome") or "").strip() or NOME_PADRAO}
+    if linha.get("criado_em"):
+        cliente["criado_em"] = _data(linha["criado_em"])
+    return cliente
+
+
+def importar_clientes(arquivo) -> int:
+    """Importa clientes do CSV com upsert pelo número; retorna as linhas gravadas"""
+    tabela = Cliente.__table__
+    comando = insert(tabela)
+    comando = comando.on_conflict_do_update(
+        index_elements=[tabela.c.numero],
+        # Não troca um nome já cadastrado pelo nome padrão; só um nome novo muda a versão (ETag)
+        set_={
+            "nome": case((comando.excluded.nome == NOME_PADRAO, tabela.c.nome), else_=comando.excluded.nome),
+            "versao": case(
+                (or_(comando.excluded.nome == NOME_PADRAO, comando.excluded.nome == tabela.c.nome), tabela.c.versao),
+                else_=tabela.c.versao + 1
+            )
+        }
+    )
+
+    erros: List[str] = []
+    total = 0
+    for bloco in _em_blocos(_linhas_validas(csv.DictReader(arquivo), _cliente, erros)):
+        # A coluna criado_em é opcional: separa as linhas com e sem ela (executemany exige as mesmas chaves)
+        with engine.begin() as conn:
+            for chaves in {tuple(sorted(c)) for c in bloco}:
+                conn.execute(comando, [c for c in bloco if tuple(sorted(c)) == chaves])
+        total += len(bloco)
+        print(f"   {total} cliente(s) gravado(s)...", file=sys.stderr)
+
+    _relatar_erros(erros)
+    return total
+
+
+def _agendamento(linha: dict) -> Optional[dict]:
+    numero = limpar_numero(linha["numero"] or "")
+    barbeiro = (linha["barbeiro"] or "").strip()
+    inicio = _data(linha["inicio"])
+    if not numero or not barbeiro or inicio is None:
+        raise ValueError("numero, barbeiro e inicio são obrigatórios")
+
+    return {
+        "numero": numero,
+        "contato": limpar_numero(linha.get("contato") or "") or numero,
+        "horario": formatar_horario(inicio),
+        "inicio": inicio,
+        "duracao_minutos": int(linha.get("duracao_minutos") or DURACAO_PADRAO_MINUTOS),
+        "barbeiro": barbeiro,
+        "criado_em": _data(linha.get("criado_em")) or datetime.utcnow(),
+    }
+
+
+def _ids_clientes(conn, numeros: List[str]) -> Dict[str, int]:
+    """Resolve os ids dos números do bloco, criando os clientes que faltam"""
+    consulta = select(Cliente.numero, Cliente.id).where(Cliente.numero.in_(numeros))
+    ids = dict(conn.execute(consulta).all())
+
+    faltando = [n for n in numeros if n not in ids]
+    if faltando:
+        conn.execute(
+            insert(Cliente.__table__).on_conflict_do_nothing(index_elements=["numero"]),
+            [{"numero": n, "nome": NOME_PADRAO} for n in faltando]
+        )
+        ids.update(conn.execute(consulta.where(Cliente.numero.in_(faltando))).all())
+    return ids
+
+
+def importar_agendamentos(arquivo) -> int:
+    """Importa agendamentos do CSV; retorna quantos foram inseridos"""
+    comando = insert(Agendamento.__table__).on_conflict_do_nothing(index_elements=["barbeiro", "inicio"])
+
+    erros: List[str] = []
+    lidos = inseridos = 0
+    for bloco in _em_blocos(_linhas_validas(csv.DictReader(arquivo), _agendamento, erros)):
+        with engine.begin() as conn:
+            ids = _ids_clientes(conn, list({a["numero"] for a in bloco}))
+            for agendamento in bloco:
+                agendamento["cliente_id"] = ids[agendamento.pop("numero")]
+            inseridos += conn.execute(comando, bloco).rowcount
+            # Muda a versão (ETag de GET /cliente/{numero}) dos clientes do bloco
+            conn.execute(
+                update(Cliente).where(Cliente.id.in_(set(ids.values()))).values(versao=Cliente.versao + 1)
+            )
+        lidos += len(bloco)
+        print(f"   {lidos} agendamento(s) lido(s)...", file=sys.stderr)
+
+    if lidos > inseridos:
+        print(f"⚠️ {lidos - inseridos} agendamento(s) ignorado(s): horário já ocupado", file=sys.stderr)
+    _relatar_erros(erros)
+    return inseridos
+
+
+def _relatar_erros(erros: List[str]):
+    if not erros:
+        return
+    print(f"⚠️ {len(erros)} linha(s) inválida(s) ignorada(s):", file=sys.stderr)
+    for erro in erros[:20]:
+        print(f"   {erro}", file=sys.stderr)
+    if len(erros) > 20:
+        print(f"   ... e mais {len(erros) - 20}", file=sys.stderr)
+
+
+def _valor(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def exportar(consulta, colunas: List[str], saida) -> int:
+    """Escreve o resultado da consulta em CSV, lendo o banco em blocos; retorna as linhas escritas"""
+    escritor = csv.writer(saida)
+    escritor.writerow(colunas)
+
+    db = SessionLocal()
+    try:
+        total = 0
+        for linha in db.execute(consulta).yield_per(BLOCO):
+            escritor.writerow([_valor(v) for v in linha])
+            total += 1
+        return total
+    finally:
+        db.close()
+
+
+def exportar_clientes(saida) -> int:
+    consulta = select(Cliente.numero, Cliente.nome, Cliente.criado_em).order_by(Cliente.id)
+    return exportar(consulta, COLUNAS_CLIENTES, saida)
+
+
+def exportar_agendamentos(saida) -> int:
+    consulta = (
+        select(
+            Cliente.numero, Agendamento.barbeiro, Agendamento.inicio, Agendamento.duracao_minutos,
+            Agendamento.contato, Agendamento.criado_em
+        )
+        .join(Cliente, Cliente.id == Agendamento.cliente_id)
+        .where(Agendamento.inicio.is_not(None))
+        .order_by(Agendamento.id)
+    )
+    return exportar(consulta, COLUNAS_AGENDAMENTOS, saida)
+
+
+def main(argv=None):
+    """Função principal (linha de comando)"""
+    parser = argparse.ArgumentParser(description="Importação e exportação de clientes e agendamentos em CSV")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    importar = subparsers.add_parser("importar", help="Importa um CSV para o banco")
+    importar.add_argument("tabela", choices=("clientes", "agendamentos"))
+    importar.add_argument("arquivo", help="Arquivo CSV (com cabeçalho)")
+
+    exportar_ = subparsers.add_parser("exportar", help="Exporta uma tabela para CSV")
+    exportar_.add_argument("tabela", choices=("clientes", "agendamentos"))
+    exportar_.add_argument("arquivo", nargs="?", help="Arquivo CSV de saída (padrão: saída padrão)")
+
+    args = parser.parse_args(argv)
+
+    inicio = datetime.now()
+    if args.comando == "importar":
+        aplicar_migracoes(engine)
+        importar_tabela = importar_clientes if args.tabela == "clientes" else importar_agendamentos
+        with open(args.arquivo, newline="", encoding="utf-8") as arquivo:
+            total = importar_tabela(arquivo)
+        descricao = "gravado(s)" if args.tabela == "clientes" else "inserido(s)"
+    else:
+        exportar_tabela = exportar_clientes if args.tabela == "clientes" else exportar_agendamentos
+        if args.arquivo:
+            with open(args.arquivo, "w", newline="", encoding="utf-8") as arquivo:
+                total = exportar_tabela(arquivo)
+        else:
+            total = exportar_tabela(sys.stdout)
+        descricao = "exportado(s)"
+
+    segundos = (datetime.now() - inicio).total_seconds()
+    print(f"✅ {total} registro(s) de {args.tabela} {descricao} em {segundos:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
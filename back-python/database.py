@@ -1,18 +1,118 @@
-from sqlalchemy import create_engine #Importa a função para criar a conexao com o banco
+import time # Mede a duração das consultas
+from contextlib import asynccontextmanager # Sessões fora das rotas (tarefas em segundo plano)
+
+from sqlalchemy import create_engine, event #Importa a função para criar a conexao com o banco
 from sqlalchemy.ext.declarative import declarative_base # base para os modelos(tabelas)
 from sqlalchemy.orm import sessionmaker, Session # sessionmaker cria sessões, Session serve para tipagem
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool # Pools de conexões reutilizáveis
+from starlette.concurrency import run_in_threadpool # Executa funções bloqueantes fora do event loop
+
+from config import DATABASE_URL, ASYNC_DB, ASYNC_DATABASE_URL, get_perfil_db # Caminho do banco, modo e perfil
+from metricas import registrar_consulta # Contagem de consultas e tempo de banco por requisição
+
+
+def _em_memoria(url: str) -> bool: #Bancos em memória não usam arquivo (sem WAL nem pool de conexões)
+    return url.rstrip("/").endswith(":memory:") or url.rstrip("/").endswith("sqlite:") or "mode=memory" in url
+
+def _pragmas(perfil: dict, url: str): #Lista de PRAGMAs aplicados a cada nova conexão
+    pragmas = [("busy_timeout", perfil["busy_timeout_ms"])]
+    if perfil["journal_mode"] and not _em_memoria(url):
+        pragmas.append(("journal_mode", perfil["journal_mode"]))
+    if perfil["synchronous"]:
+        pragmas.append(("synchronous", perfil["synchronous"]))
+    if perfil["mmap_size"] is not None:
+        pragmas.append(("mmap_size", perfil["mmap_size"]))
+    if perfil["cache_size_kib"]:
+        pragmas.append(("cache_size", -int(perfil["cache_size_kib"]))) # negativo = KiB
+    return pragmas
+
+def configurar_conexoes(engine_sync, perfil: dict, url: str): #Aplica os PRAGMAs do perfil ao abrir cada conexão
+    pragmas = _pragmas(perfil, url)
+
+    @event.listens_for(engine_sync, "connect")
+    def _ao_conectar(dbapi_conn, registro):
+        cursor = dbapi_conn.cursor()
+        for nome, valor in pragmas:
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
+
+def controlar_transacoes(engine_sync, modo: str = ""): #Transações explícitas (receita do SQLAlchemy para o pysqlite)
+    # O pysqlite só abre transação antes de INSERT/UPDATE/DELETE e nunca antes de um
+    # SAVEPOINT: o begin_nested externo abriria e o RELEASE confirmaria uma transação
+    # própria. Sem o controle do driver, o SQLAlchemy emite BEGIN ao iniciar cada uma.
+    @event.listens_for(engine_sync, "connect")
+    def _sem_transacao_implicita(dbapi_conn, registro):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine_sync, "begin")
+    def _iniciar_transacao(conn):
+        conn.exec_driver_sql(f"BEGIN {modo}".strip())
+
+def iniciar_transacao_escrita(db: Session): #Abre a transação de escrita antes dos savepoints (lotes na sessão da requisição)
+    # IMMEDIATE: reserva a escrita já no início, sem o risco de SQLITE_BUSY ao promover uma leitura
+    db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+def _opcoes_engine(perfil: dict, url: str, poolclass) -> dict: #Opções do engine/pool conforme o perfil
+    opcoes = {"connect_args": {"check_same_thread": False, "timeout": perfil["busy_timeout_ms"] / 1000}}
+    if not _em_memoria(url):
+        opcoes.update(
+            poolclass=poolclass,
+            pool_size=perfil["pool_size"],
+            max_overflow=perfil["max_overflow"],
+            pool_timeout=perfil["pool_timeout"],
+        )
+    return opcoes
+
+def criar_engine(url: str = DATABASE_URL, perfil: str = None, transacao: str = None, **ajustes): #Cria o engine síncrono com o perfil configurado (ajustes sobrescrevem chaves do perfil)
+    # transacao: None mantém o controle do pysqlite; "" / "IMMEDIATE" emitem BEGIN [IMMEDIATE] explícito
+    dados_perfil = get_perfil_db(perfil)
+    dados_perfil.update(ajustes)
+    novo_engine = create_engine(url, **_opcoes_engine(dados_perfil, url, QueuePool))
+    configurar_conexoes(novo_engine, dados_perfil, url)
+    if transacao is not None:
+        controlar_transacoes(novo_engine, transacao)
+    return novo_engine
 
+def criar_engine_async(url: str = ASYNC_DATABASE_URL, perfil: str = None): #Cria o engine aiosqlite com o mesmo perfil
+    from sqlalchemy.ext.asyncio import create_async_engine
 
-DATABASE_URL = "sqlite:///./barbearia.db" #Caminho do banco de dados
+    dados_perfil = get_perfil_db(perfil)
+    novo_engine = create_async_engine(url, **_opcoes_engine(dados_perfil, url, AsyncAdaptedQueuePool))
+    configurar_conexoes(novo_engine.sync_engine, dados_perfil, url)
+    return novo_engine
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-#Cria o motor de conexao com o banco "check_samethread=false"
+
+engine = criar_engine()
+#Cria o motor de conexao com o banco (perfil em config.DB_PERFIL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 #Cria uma fabrica de sessoes ligadas ao engine
 
 Base = declarative_base() #Classe base usada pelos modelos
 
+# Engine e fábrica de sessões assíncronas (aiosqlite), criados só no modo assíncrono
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = criar_engine_async()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False)
+
+def instrumentar(engine_sync): #Conta as consultas e acumula o tempo de banco da requisição atual
+    @event.listens_for(engine_sync, "before_cursor_execute")
+    def _antes_consulta(conn, cursor, statement, parameters, context, executemany):
+        conn.info["inicio_consulta"] = time.perf_counter()
+
+    @event.listens_for(engine_sync, "after_cursor_execute")
+    def _depois_consulta(conn, cursor, statement, parameters, context, executemany):
+        registrar_consulta(time.perf_counter() - conn.info.pop("inicio_consulta", time.perf_counter()))
+
+instrumentar(engine)
+if async_engine is not None:
+    instrumentar(async_engine.sync_engine)
+
 def get_db(): #Função que fornece a sessao do banco para ser usada em rotas
     db: Session = SessionLocal() #Cria uma sessao
 
@@ -20,4 +120,33 @@ def get_db(): #Função que fornece a sessao do banco para ser usada em rotas
         yield db # Entrega a sessao para o uso ( com 'yield')
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(): #Fornece uma sessao assincrona (modo ASYNC_DB)
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependência usada pelas rotas, conforme o modo configurado
+obter_sessao = get_async_db if ASYNC_DB else get_db
+
+@asynccontextmanager
+async def abrir_sessao(): #Sessão para tarefas em segundo plano (fora das rotas), no mesmo modo das rotas
+    if ASYNC_DB:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def executar(db, funcao, *args, **kwargs):
+    """Executa funcao(sessao, *args) sem bloquear o event loop
+
+    Com AsyncSession o código ORM roda sobre a conexão aiosqlite (run_sync);
+    com Session síncrona a chamada vai para o threadpool.
+    """
+    if ASYNC_DB and not isinstance(db, Session):
+        return await db.run_sync(funcao, *args, **kwargs)
+    return await run_in_threadpool(funcao, db, *args, **kwargs)
@@ -0,0 +1,167 @@
+"""
+Deduplicação de mensagens reenviadas
+
+Os provedores de mensagens reenviam o webhook quando não recebem a resposta a
+tempo. Se a mensagem trouxer um mensagem_id, a resposta dada a ela fica
+guardada por cliente (RespostasProcessadas); um reenvio recebe a mesma
+resposta sem passar de novo pelos handlers (sem avançar a conversa duas vezes
+nem criar outro agendamento) e sem tocar no banco.
+
+- As respostas ficam em um LRUCache limitado (DEDUPLICACAO["max_itens"]) que
+  expira após DEDUPLICACAO["ttl_segundos"].
+- Com DEDUPLICACAO["persistir"], também são gravadas em um arquivo SQLite:
+  sobrevivem a reinícios e são vistas por todos os workers. A gravação é
+  feita depois do commit da mensagem, então uma queda entre os dois ainda
+  pode reprocessar o reenvio. Nos endpoints async use os métodos *_async:
+  o acesso ao arquivo vai para o threadpool, fora do event loop.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from cache import LRUCache
+from metricas import registro
+from config import DEDUPLICACAO
+
+mensagens_duplicadas = registro.contador(
+    "chatbot_mensagens_duplicadas_total", "Mensagens reenviadas respondidas com a resposta já dada")
+
+
+class RespostasProcessadas:
+    """Respostas já dadas, por (número do cliente, mensagem_id)"""
+
+    # Remove respostas expiradas do arquivo a cada N gravações
+    LIMPEZA_A_CADA = 1000
+    # Chaves por SELECT ... IN (...) (abaixo do limite de parâmetros do SQLite)
+    CHAVES_POR_CONSULTA = 500
+
+    def __init__(self, max_itens: int, ttl_segundos: float, caminho: Optional[str] = None):
+        self.ttl_segundos = ttl_segundos
+        self.caminho = caminho
+        self._cache = LRUCache(max_itens, ttl_segundos)
+        self._local = threading.local()
+        self._gravacoes = 0
+
+        if caminho:
+            with self._conexao() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS respostas_processadas ("
+                    " chave TEXT PRIMARY KEY,"
+                    " resposta TEXT NOT NULL,"
+                    " criado_em REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_respostas_processadas_criado_em"
+                    " ON respostas_processadas (criado_em)"
+                )
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread, reaberta depois de um fork (gunicorn --preload)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _chave(numero: str, mensagem_id: str) -> str:
+        return f"{numero}:{mensagem_id}"
+
+    def get(self, numero: str, mensagem_id: str) -> Optional[str]:
+        """Resposta já dada à mensagem, ou None se ela ainda não foi processada"""
+        return self.get_varias([(numero, mensagem_id)])[0]
+
+    def get_varias(self, chaves: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Respostas já dadas a cada (numero, mensagem_id), None para as não processadas"""
+        chaves = [self._chave(numero, mensagem_id) for numero, mensagem_id in chaves]
+        respostas = [self._cache.get(chave) for chave in chaves]
+        faltando = list({chave for chave, resposta in zip(chaves, respostas) if resposta is None})
+        if not faltando or not self.caminho:
+            return respostas
+
+        encontradas = {}
+        conn = self._conexao()
+        for inicio in range(0, len(faltando), self.CHAVES_POR_CONSULTA):
+            bloco = faltando[inicio:inicio + self.CHAVES_POR_CONSULTA]
+            encontradas.update(conn.execute(
+                f"SELECT chave, resposta FROM respostas_processadas"
+                f" WHERE chave IN ({','.join('?' * len(bloco))}) AND criado_em >= ?",
+                (*bloco, time.time() - self.ttl_segundos)
+            ).fetchall())
+
+        for chave, resposta in encontradas.items():
+            self._cache.set(chave, resposta)
+        return [resposta if resposta is not None else encontradas.get(chave)
+                for chave, resposta in zip(chaves, respostas)]
+
+    def set(self, numero: str, mensagem_id: str, resposta: str) -> None:
+        """Guarda a resposta dada à mensagem"""
+        self.set_varias([(numero, mensagem_id, resposta)])
+
+    def set_varias(self, itens: Iterable[Tuple[str, str, str]]) -> None:
+        """Guarda as respostas (numero, mensagem_id, resposta) em uma única transação"""
+        linhas = [(self._chave(numero, mensagem_id), resposta, time.time())
+                  for numero, mensagem_id, resposta in itens]
+        for chave, resposta, _ in linhas:
+            self._cache.set(chave, resposta)
+        if not self.caminho or not linhas:
+            return
+
+        with self._conexao() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO respostas_processadas (chave, resposta, criado_em) VALUES (?, ?, ?)",
+                linhas
+            )
+
+        gravacoes_antes = self._gravacoes
+        self._gravacoes += len(linhas)
+        if self._gravacoes // self.LIMPEZA_A_CADA != gravacoes_antes // self.LIMPEZA_A_CADA:
+            self.limpar_expiradas()
+
+    async def get_async(self, numero: str, mensagem_id: str) -> Optional[str]:
+        """get sem bloquear o event loop"""
+        return (await self.get_varias_async([(numero, mensagem_id)]))[0]
+
+    async def get_varias_async(self, chaves: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """get_varias sem bloquear o event loop (só a consulta ao arquivo vai para o threadpool)"""
+        respostas = [self._cache.get(self._chave(*chave)) for chave in chaves]
+        if not self.caminho or all(resposta is not None for resposta in respostas):
+            return respostas
+        return await run_in_threadpool(self.get_varias, chaves)
+
+    async def set_async(self, numero: str, mensagem_id: str, resposta: str) -> None:
+        """set sem bloquear o event loop"""
+        await self.set_varias_async([(numero, mensagem_id, resposta)])
+
+    async def set_varias_async(self, itens: List[Tuple[str, str, str]]) -> None:
+        """set_varias sem bloquear o event loop (a gravação no arquivo vai para o threadpool)"""
+        if not self.caminho:
+            self.set_varias(itens)
+        elif itens:
+            await run_in_threadpool(self.set_varias, itens)
+
+    def limpar_expiradas(self) -> int:
+        """Remove do arquivo as respostas mais antigas que o TTL; retorna quantas foram removidas"""
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "DELETE FROM respostas_processadas WHERE criado_em < ?", (time.time() - self.ttl_segundos,)
+            )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+respostas_processadas = RespostasProcessadas(
+    DEDUPLICACAO["max_itens"],
+    DEDUPLICACAO["ttl_segundos"],
+    os.path.abspath(DEDUPLICACAO["sqlite_caminho"]) if DEDUPLICACAO["persistir"] else None
+)
@@ -0,0 +1,200 @@
+"""
+Cálculo de horários livres dos barbeiros
+
+GradeDisponibilidade carrega os agendamentos de todos os barbeiros para toda
+a janela de dias em uma única consulta por intervalo (índice barbeiro +
+inicio), subtrai os horários ocupados da grade de horários e mantém o
+resultado em memória (por processo), para o chatbot e GET /disponibilidade
+não consultarem o banco a cada pedido.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Agendamento
+from config import get_horarios_disponiveis, get_barbeiros, VALIDACAO, DISPONIBILIDADE
+
+
+def agora() -> datetime:
+    """Momento atual (os horários de hoje anteriores a ele não são oferecidos)"""
+    return datetime.now()
+
+
+def horas_futuras(dia: date, horas: List[time], momento: datetime) -> List[time]:
+    """Horas (ordenadas) do dia que ainda não passaram em 'momento'"""
+    if dia < momento.date():
+        return []
+    if dia > momento.date():
+        return horas
+    return horas[bisect_right(horas, momento.time()):]
+
+
+def formatar_horario(inicio: datetime) -> str:
+    """Formata o início do agendamento como exibido ao cliente ("dd/mm HH:MM")"""
+    return inicio.strftime('%d/%m %H:%M')
+
+
+def grade_horarios() -> List[time]:
+    """Retorna a grade de horários de funcionamento como objetos time"""
+    return [time.fromisoformat(hora) for hora in get_horarios_disponiveis()]
+
+
+def dias_da_janela(inicio: datetime, dias_futuros: int) -> List[datetime]:
+    """Retorna os dias (à meia-noite) da janela de agendamento a partir de 'inicio'"""
+    primeiro = datetime.combine(inicio.date(), time())
+    return [primeiro + timedelta(days=i) for i in range(dias_futuros)]
+
+
+class GradeDisponibilidade:
+    """Horários livres por barbeiro e dia da janela de agendamento, em memória
+
+    É montada com uma única consulta (todos os barbeiros, janela inteira) e
+    atualizada na hora pelas reservas e cancelamentos deste processo. É
+    remontada na virada do dia, após ttl_segundos (para refletir escritas de
+    outros workers) ou quando invalidada.
+    """
+
+    def __init__(self, barbeiros: List[str], dias_futuros: int, ttl_segundos: Optional[float] = None):
+        self.barbeiros = list(barbeiros)
+        self.dias_futuros = dias_futuros
+        self.ttl_segundos = ttl_segundos
+        self._livres: Dict[str, Dict[date, List[time]]] = {}
+        self._hoje: Optional[date] = None
+        self._expira_em = 0.0
+        self._lock = threading.Lock()
+        # Alterações feitas enquanto cada remontagem consulta o banco (reaplicadas ao final dela)
+        self._montagens: List[list] = []
+
+    def _montar(self, db: Session, hoje: date):
+        """Recalcula a grade inteira (a consulta roda fora do lock)"""
+        alteracoes: list = []
+        with self._lock:
+            self._montagens.append(alteracoes)
+
+        dias = dias_da_janela(datetime.combine(hoje, time()), self.dias_futuros)
+        linhas = db.query(Agendamento.barbeiro, Agendamento.inicio).filter(
+            Agendamento.inicio >= dias[0],
+            Agendamento.inicio < dias[-1] + timedelta(days=1)
+        ).all()
+
+        ocupados: Dict[tuple, Set[time]] = {}
+        for barbeiro, inicio in linhas:
+            ocupados.setdefault((barbeiro, inicio.date()), set()).add(inicio.time())
+
+        grade = grade_horarios()
+        livres = {
+            barbeiro: {
+                dia.date(): [hora for hora in grade if hora not in ocupados.get((barbeiro, dia.date()), ())]
+                for dia in dias
+            }
+            for barbeiro in self.barbeiros
+        }
+
+        with self._lock:
+            self._livres = livres
+            for alterar, barbeiro, inicio in alteracoes:
+                alterar(barbeiro, inicio)
+            self._montagens = [m for m in self._montagens if m is not alteracoes]
+            self._hoje = hoje
+            self._expira_em = monotonic() + self.ttl_segundos if self.ttl_segundos else float("inf")
+
+    def _atualizada(self, db: Session) -> Dict[str, Dict[date, List[time]]]:
+        hoje = date.today()
+        if self._hoje != hoje or monotonic() >= self._expira_em:
+            self._montar(db, hoje)
+        return self._livres
+
+    def livres(self, db: Session, barbeiro: str, de: Optional[date] = None,
+               ate: Optional[date] = None) -> Dict[date, List[time]]:
+        """Horários livres do barbeiro por dia, entre as datas de e ate (inclusivas)
+
+        Hoje só entram os horários que ainda não passaram. Só consulta o banco
+        (db) se a grade precisar ser remontada.
+        """
+        dias = self._atualizada(db).get(barbeiro, {})
+        momento = agora()
+        with self._lock:
+            return {
+                dia: list(horas_futuras(dia, horas, momento)) for dia, horas in dias.items()
+                if (de is None or dia >= de) and (ate is None or dia <= ate)
+            }
+
+    def proximos(self, db: Session, barbeiro: str, limite: Optional[int] = None) -> List[datetime]:
+        """Primeiros horários livres do barbeiro a partir do momento atual"""
+        if limite is None:
+            limite = VALIDACAO["max_horarios_exibidos"]
+
+        dias = self._atualizada(db).get(barbeiro, {})
+        momento = agora()
+        resultado = []
+        with self._lock:
+            for dia in sorted(dias):
+                for hora in horas_futuras(dia, dias[dia], momento):
+                    resultado.append(datetime.combine(dia, hora))
+                    if len(resultado) >= limite:
+                        return resultado
+        return resultado
+
+    def proximos_qualquer(self, db: Session, limite: Optional[int] = None) -> List[Tuple[datetime, str]]:
+        """Primeiros horários livres entre todos os barbeiros, como (inicio, barbeiro)
+
+        Uma única passada: heapq.merge sobre as listas (já ordenadas) de cada
+        barbeiro; no mesmo horário vale a ordem de config.BARBEIROS.
+        """
+        if limite is None:
+            limite = VALIDACAO["max_horarios_exibidos"]
+
+        livres = self._atualizada(db)
+        momento = agora()
+
+        def horarios(indice: int, barbeiro: str):
+            dias = livres.get(barbeiro, {})
+            for dia in sorted(dias):
+                for hora in horas_futuras(dia, dias[dia], momento):
+                    yield datetime.combine(dia, hora), indice, barbeiro
+
+        with self._lock:
+            fluxos = [horarios(indice, barbeiro) for indice, barbeiro in enumerate(self.barbeiros)]
+            return [(inicio, barbeiro) for inicio, _, barbeiro in islice(heapq.merge(*fluxos), limite)]
+
+    def _ocupar(self, barbeiro: str, inicio: datetime):
+        horas = self._livres.get(barbeiro, {}).get(inicio.date())
+        if horas is not None:
+            posicao = bisect_left(horas, inicio.time())
+            if posicao < len(horas) and horas[posicao] == inicio.time():
+                del horas[posicao]
+
+    def _liberar(self, barbeiro: str, inicio: datetime):
+        horas = self._livres.get(barbeiro, {}).get(inicio.date())
+        if horas is not None and inicio.time() in grade_horarios() and inicio.time() not in horas:
+            insort(horas, inicio.time())
+
+    def _alterar(self, alterar, barbeiro: str, inicio: datetime):
+        with self._lock:
+            alterar(barbeiro, inicio)
+            for alteracoes in self._montagens:
+                alteracoes.append((alterar, barbeiro, inicio))
+
+    def ocupar(self, barbeiro: str, inicio: datetime):
+        """Marca o horário como reservado (após um agendamento)"""
+        self._alterar(self._ocupar, barbeiro, inicio)
+
+    def liberar(self, barbeiro: str, inicio: datetime):
+        """Devolve o horário à grade (após um cancelamento)"""
+        self._alterar(self._liberar, barbeiro, inicio)
+
+    def invalidar(self):
+        """Força a remontagem no próximo uso"""
+        with self._lock:
+            self._expira_em = 0.0
+
+
+# Grade do processo, usada pelo chatbot e por GET /disponibilidade
+grade = GradeDisponibilidade(get_barbeiros(), VALIDACAO["dias_futuros"], DISPONIBILIDADE["ttl_segundos"])
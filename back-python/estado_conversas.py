@@ -0,0 +1,245 @@
+"""
+Armazenamento do estado das conversas do chatbot
+
+O estado de cada conversa é um dicionário {'estado', 'dados', 'cliente_id'}.
+Os backends implementam a interface ConversationStore:
+
+- MemoryConversationStore: em memória, com limite de conversas (LRU) e TTL;
+  atende um único processo.
+- SQLiteConversationStore: tabela em um arquivo SQLite compartilhado, para
+  rodar vários workers do uvicorn sem perder conversas.
+
+No modo ASYNC_DB os handlers rodam no event loop (AsyncSession.run_sync). Com
+um backend bloqueante, o chatbot lê as conversas antes (carregar) e grava
+depois (atualizar), no threadpool, e os handlers usam uma ConversasCarregadas.
+Nos lotes, as alterações passam por uma ConversasPendentes e só chegam ao
+backend depois do commit da transação que as produziu.
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from cache import LRUCache
+from config import CONVERSAS
+
+
+class ConversationStore:
+    """Interface dos armazenamentos de estado das conversas"""
+
+    # True se os métodos fazem I/O bloqueante (não podem rodar no event loop)
+    bloqueante = False
+
+    def get(self, numero: str) -> Optional[dict]:
+        """Retorna o estado da conversa do número, ou None se não houver conversa ativa"""
+        raise NotImplementedError
+
+    def set(self, numero: str, conversa: dict) -> None:
+        """Grava o estado da conversa do número"""
+        raise NotImplementedError
+
+    def delete(self, numero: str) -> None:
+        """Encerra a conversa do número"""
+        raise NotImplementedError
+
+    def carregar(self, numeros: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Estado das conversas de vários números"""
+        return {numero: self.get(numero) for numero in set(numeros)}
+
+    def atualizar(self, conversas: Dict[str, Optional[dict]]) -> None:
+        """Grava as conversas alteradas (None encerra a conversa)"""
+        for numero, conversa in conversas.items():
+            if conversa is None:
+                self.delete(numero)
+            else:
+                self.set(numero, conversa)
+
+    def __contains__(self, numero: str) -> bool:
+        return self.get(numero) is not None
+
+
+class ConversasCarregadas(ConversationStore):
+    """Conversas de alguns números já carregadas; as alterações ficam em alteradas"""
+
+    def __init__(self, conversas: Dict[str, Optional[dict]]):
+        self._conversas = conversas
+        self.alteradas: Dict[str, Optional[dict]] = {}
+
+    def get(self, numero: str) -> Optional[dict]:
+        return self._conversas.get(numero)
+
+    def set(self, numero: str, conversa: dict) -> None:
+        self._conversas[numero] = self.alteradas[numero] = conversa
+
+    def delete(self, numero: str) -> None:
+        self._conversas[numero] = self.alteradas[numero] = None
+
+
+class ConversasPendentes(ConversationStore):
+    """Alterações de conversas guardadas até o commit da transação (lê do store por baixo)"""
+
+    def __init__(self, store: ConversationStore):
+        self.store = store
+        self.alteradas: Dict[str, Optional[dict]] = {}
+
+    def get(self, numero: str) -> Optional[dict]:
+        conversa = self.alteradas[numero] if numero in self.alteradas else self.store.get(numero)
+        # Cópia: os handlers alteram a conversa no lugar e um rollback não pode atingir o store
+        return copy.deepcopy(conversa)
+
+    def set(self, numero: str, conversa: dict) -> None:
+        self.alteradas[numero] = copy.deepcopy(conversa)
+
+    def delete(self, numero: str) -> None:
+        self.alteradas[numero] = None
+
+    def confirmar(self) -> None:
+        """Grava no store as alterações da transação confirmada"""
+        if self.alteradas:
+            self.store.atualizar(self.alteradas)
+        self.alteradas = {}
+
+    def descartar(self) -> None:
+        """Esquece as alterações da transação desfeita"""
+        self.alteradas = {}
+
+
+class MemoryConversationStore(ConversationStore):
+    """Estado das conversas em memória, com despejo LRU e expiração por inatividade"""
+
+    def __init__(self, max_conversas: int, ttl_segundos: Optional[float] = None):
+        self._cache = LRUCache(max_conversas, ttl_segundos)
+
+    def get(self, numero: str) -> Optional[dict]:
+        item = self._cache.get(numero)
+        if item is None:
+            return None
+
+        estado, dados, cliente_id = item
+        return {'estado': estado, 'dados': dict(dados) if dados else {}, 'cliente_id': cliente_id}
+
+    def set(self, numero: str, conversa: dict) -> None:
+        # Representação compacta: tupla com o estado internado e sem dicionário vazio
+        self._cache.set(numero, (
+            sys.intern(conversa['estado']),
+            dict(conversa['dados']) if conversa.get('dados') else None,
+            conversa.get('cliente_id')
+        ))
+
+    def delete(self, numero: str) -> None:
+        self._cache.pop(numero)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Estado das conversas em uma tabela SQLite compartilhada entre processos"""
+
+    bloqueante = True
+
+    # Remove conversas expiradas a cada N gravações
+    LIMPEZA_A_CADA = 500
+
+    def __init__(self, caminho: str, ttl_segundos: Optional[float] = None):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos
+        self._local = threading.local()
+        self._gravacoes = 0
+
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversas ("
+                " numero TEXT PRIMARY KEY,"
+                " estado TEXT NOT NULL,"
+                " dados TEXT,"
+                " cliente_id INTEGER,"
+                " atualizado_em REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_conversas_atualizado_em ON conversas (atualizado_em)"
+            )
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)
+
+        Também não reaproveita conexões abertas antes de um fork (gunicorn --preload).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _limite_validade(self) -> float:
+        return time.time() - self.ttl_segundos if self.ttl_segundos else 0.0
+
+    def get(self, numero: str) -> Optional[dict]:
+        linha = self._conexao().execute(
+            "SELECT estado, dados, cliente_id FROM conversas WHERE numero = ? AND atualizado_em >= ?",
+            (numero, self._limite_validade())
+        ).fetchone()
+        if linha is None:
+            return None
+
+        estado, dados, cliente_id = linha
+        return {'estado': estado, 'dados': json.loads(dados) if dados else {}, 'cliente_id': cliente_id}
+
+    def set(self, numero: str, conversa: dict) -> None:
+        self.atualizar({numero: conversa})
+
+    def delete(self, numero: str) -> None:
+        self.atualizar({numero: None})
+
+    def atualizar(self, conversas: Dict[str, Optional[dict]]) -> None:
+        """Grava as conversas alteradas em uma única transação"""
+        agora = time.time()
+        gravar = [
+            (numero, conversa['estado'], json.dumps(conversa['dados']) if conversa.get('dados') else None,
+             conversa.get('cliente_id'), agora)
+            for numero, conversa in conversas.items() if conversa is not None
+        ]
+        remover = [(numero,) for numero, conversa in conversas.items() if conversa is None]
+
+        with self._conexao() as conn:
+            if gravar:
+                conn.executemany(
+                    "INSERT INTO conversas (numero, estado, dados, cliente_id, atualizado_em)"
+                    " VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(numero) DO UPDATE SET estado = excluded.estado, dados = excluded.dados,"
+                    " cliente_id = excluded.cliente_id, atualizado_em = excluded.atualizado_em",
+                    gravar
+                )
+            if remover:
+                conn.executemany("DELETE FROM conversas WHERE numero = ?", remover)
+
+        gravacoes_antes = self._gravacoes
+        self._gravacoes += len(gravar)
+        if self.ttl_segundos and self._gravacoes // self.LIMPEZA_A_CADA != gravacoes_antes // self.LIMPEZA_A_CADA:
+            self.limpar_expiradas()
+
+    def limpar_expiradas(self) -> int:
+        """Remove as conversas inativas há mais que o TTL; retorna quantas foram removidas"""
+        with self._conexao() as conn:
+            cursor = conn.execute("DELETE FROM conversas WHERE atualizado_em < ?", (self._limite_validade(),))
+        return cursor.rowcount
+
+
+def criar_conversation_store(backend: Optional[str] = None) -> ConversationStore:
+    """Cria o armazenamento de conversas configurado em config.CONVERSAS"""
+    backend = backend or CONVERSAS["backend"]
+
+    if backend == "memoria":
+        return MemoryConversationStore(CONVERSAS["max_conversas"], CONVERSAS["ttl_segundos"])
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.path.abspath(CONVERSAS["sqlite_caminho"]), CONVERSAS["ttl_segundos"])
+
+    raise ValueError(f"Backend de conversas desconhecido: {backend}")
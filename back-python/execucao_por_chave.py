@@ -0,0 +1,72 @@
+"""
+Execução ordenada por chave
+
+ExecutorPorChave serializa as tarefas de uma mesma chave (ex.: o número do
+cliente) na ordem de chegada e deixa as de chaves diferentes rodarem em
+paralelo. Cada chave tem um asyncio.Lock (FIFO) criado sob demanda e removido
+assim que não há mais tarefas dela, então o número de travas acompanha só as
+chaves em andamento.
+
+As travas são do event loop do processo: com vários workers, a ordem por
+cliente só é garantida se as mensagens de um mesmo cliente chegarem ao mesmo
+worker.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Trava:
+    __slots__ = ("lock", "usuarios")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.usuarios = 0  # tarefas esperando ou segurando a trava
+
+
+class ExecutorPorChave:
+    """Serializa as tarefas de cada chave; chaves diferentes rodam em paralelo"""
+
+    def __init__(self):
+        self._travas: Dict[Hashable, _Trava] = {}
+
+    @asynccontextmanager
+    async def reservar(self, *chaves: Hashable):
+        """Segura as travas das chaves enquanto o bloco roda
+
+        Várias chaves são adquiridas em ordem (sem deadlock entre lotes).
+        """
+        travas: List[Tuple[Hashable, _Trava]] = []
+        for chave in sorted(set(chaves)):
+            trava = self._travas.get(chave)
+            if trava is None:
+                trava = self._travas[chave] = _Trava()
+            trava.usuarios += 1
+            travas.append((chave, trava))
+
+        adquiridas = []
+        try:
+            for _, trava in travas:
+                await trava.lock.acquire()
+                adquiridas.append(trava)
+            yield
+        finally:
+            for trava in adquiridas:
+                trava.lock.release()
+            for chave, trava in travas:
+                trava.usuarios -= 1
+                # Remove a trava ociosa (ninguém esperando nem segurando)
+                if trava.usuarios == 0 and self._travas.get(chave) is trava:
+                    del self._travas[chave]
+
+    async def executar(self, chave: Hashable, funcao: Callable[..., Awaitable[T]], *args) -> T:
+        """Executa await funcao(*args) depois das tarefas anteriores da mesma chave"""
+        async with self.reservar(chave):
+            return await funcao(*args)
+
+    def __len__(self) -> int:
+        """Quantidade de chaves com tarefas em andamento ou na fila"""
+        return len(self._travas)
@@ -0,0 +1,170 @@
+"""
+Fila de escrita com group commit
+
+Com config.GRUPO_COMMIT["ativo"], as escritas do chatbot (novo cliente, nome,
+agendamento, cancelamento) não fazem commit na sessão da requisição: vão para
+uma fila atendida por uma thread escritora, que executa as escritas pendentes
+de várias requisições em uma única transação (a cada intervalo_ms ou
+max_itens escritas) e só então libera cada requisição com o seu resultado.
+Um commit (e um fsync) passa a valer por várias mensagens.
+
+Cada escrita roda em um savepoint: se falhar (ex.: IntegrityError), só ela é
+desfeita e a exceção é repassada a quem a enviou. As funções enviadas devem
+retornar valores simples (ids, contagens), não objetos ORM.
+
+A fila é por processo; com vários workers cada um tem a sua thread escritora.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import await_only
+
+from config import GRUPO_COMMIT
+from database import criar_engine, instrumentar
+from metricas import registro, BUCKETS_CONSULTAS
+
+# PRAGMA synchronous da conexão escritora para cada nível de durabilidade
+SYNCHRONOUS = {"perfil": None, "total": "FULL", "normal": "NORMAL", "desligada": "OFF"}
+
+itens_por_commit = registro.histograma(
+    "chatbot_grupo_commit_itens", "Escritas confirmadas por commit da fila de escrita", BUCKETS_CONSULTAS)
+
+
+class FilaEscrita:
+    """Thread escritora que agrupa as escritas enfileiradas em poucas transações"""
+
+    def __init__(self, intervalo_ms: float = 5, max_itens: int = 64, durabilidade: str = "perfil"):
+        if durabilidade not in SYNCHRONOUS:
+            raise ValueError(f"Durabilidade desconhecida: {durabilidade}")
+
+        self.intervalo = intervalo_ms / 1000
+        self.max_itens = max_itens
+
+        # Engine próprio com uma única conexão: o PRAGMA de durabilidade não vaza para o pool das requisições.
+        # BEGIN IMMEDIATE explícito: sem ele o pysqlite não abre transação antes dos savepoints
+        # e o RELEASE de cada escrita já faria o commit dela (não haveria grupo)
+        ajustes = {"pool_size": 1, "max_overflow": 0}
+        if SYNCHRONOUS[durabilidade]:
+            ajustes["synchronous"] = SYNCHRONOUS[durabilidade]
+        self._engine = criar_engine(transacao="IMMEDIATE", **ajustes)
+        instrumentar(self._engine)
+        self._sessoes = sessionmaker(bind=self._engine, autocommit=False, autoflush=False)
+
+        self._fila: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._parando = False
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="fila-escrita", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: Optional[float] = None):
+        """Confirma as escritas já enfileiradas e encerra a thread escritora"""
+        self._parando = True
+        self._fila.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._engine.dispose()
+
+    def enviar(self, funcao: Callable, *args) -> Future:
+        """Enfileira funcao(sessao, *args); o Future recebe o retorno após o commit"""
+        if self._parando:
+            raise RuntimeError("Fila de escrita encerrada")
+
+        futuro: Future = Future()
+        self._fila.put((futuro, funcao, args))
+        return futuro
+
+    def _proximo_grupo(self) -> Optional[list]:
+        """Espera a primeira escrita e junta as que chegarem até o fim do intervalo"""
+        item = self._fila.get()
+        if item is None:
+            return None
+
+        grupo = [item]
+        prazo = time.monotonic() + self.intervalo
+        while len(grupo) < self.max_itens:
+            restante = prazo - time.monotonic()
+            try:
+                item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Recoloca o sinal de parada para encerrar depois deste grupo
+                self._fila.put(None)
+                break
+            grupo.append(item)
+        return grupo
+
+    def _executar(self):
+        while True:
+            grupo = self._proximo_grupo()
+            if grupo is None:
+                return
+            try:
+                self._confirmar_grupo(grupo)
+            except Exception as e:
+                print(f"Erro na fila de escrita: {str(e)}")
+                for futuro, _, _ in grupo:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    def _confirmar_grupo(self, grupo: list):
+        concluidas = []
+
+        with self._sessoes() as db:
+            for futuro, funcao, args in grupo:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # Savepoint: uma escrita com erro não desfaz as outras do grupo
+                    with db.begin_nested():
+                        resultado = funcao(db, *args)
+                except Exception as e:
+                    futuro.set_exception(e)
+                else:
+                    concluidas.append((futuro, resultado))
+
+            db.commit()
+
+        itens_por_commit.observe(len(concluidas))
+        for futuro, resultado in concluidas:
+            futuro.set_result(resultado)
+
+
+def aguardar(futuro: Future):
+    """Espera o resultado de uma escrita enfileirada
+
+    No threadpool (modo síncrono) bloqueia a thread; dentro de run_sync do
+    modo ASYNC_DB cede o event loop enquanto espera.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return futuro.result()
+    return await_only(asyncio.wrap_future(futuro))
+
+
+# Fila do processo (None quando o group commit está desligado)
+fila: Optional[FilaEscrita] = None
+
+def iniciar_fila_escrita() -> Optional[FilaEscrita]:
+    """Cria e inicia a fila conforme config.GRUPO_COMMIT (chamado no startup da API)"""
+    global fila
+    if GRUPO_COMMIT["ativo"] and fila is None:
+        fila = FilaEscrita(GRUPO_COMMIT["intervalo_ms"], GRUPO_COMMIT["max_itens"], GRUPO_COMMIT["durabilidade"])
+        fila.iniciar()
+    return fila
+
+def parar_fila_escrita():
+    """Confirma as escritas pendentes e encerra a fila (chamado no shutdown da API)"""
+    global fila
+    if fila is not None:
+        fila.parar()
+        fila = None
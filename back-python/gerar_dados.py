@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Gerador de dados sintéticos para testes de capacidade
+
+Uso:
+    python gerar_dados.py [--clientes 1000000] [--agendamentos 5000000] [--barbeiros 400]
+                          [--dias 730] [--ate AAAA-MM-DD] [--semente 42]
+                          [--banco sqlite:///./capacidade.db]
+
+Gera clientes e agendamentos realistas em um banco vazio, sempre iguais para
+a mesma semente:
+- clientes com nome e número únicos (DDDs variados);
+- agendamentos distribuídos pelos dias da janela que termina em --ate (padrão:
+  30 dias à frente de hoje), pela grade de horários e pelos barbeiros, sem
+  repetir (barbeiro, horário). Os horários são sorteados por amostragem
+  sequencial (seleção de Knuth, algoritmo S), em ordem cronológica e sem
+  montar a lista de todos os horários possíveis.
+
+Os registros são gravados com INSERTs em lote de BLOCO linhas e
+PRAGMA synchronous=OFF (um banco de teste pode ser gerado de novo).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Iterator, List
+
+from sqlalchemy import func, select
+
+# Linhas por INSERT em lote (e por commit)
+BLOCO = 10000
+
+NOMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João",
+    "Juliana", "Lucas", "Mariana", "Matheus", "Natália", "Pedro", "Rafael", "Sofia", "Thiago", "Vitória"
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa"
+]
+DDDS = ["11", "21", "31", "41", "51", "61", "71", "81", "85", "92"]
+
+
+def _em_blocos(itens: Iterator, tamanho: int = BLOCO) -> Iterator[list]:
+    while bloco := list(islice(itens, tamanho)):
+        yield bloco
+
+
+def nomes_barbeiros(quantidade: int, base: List[str]) -> List[str]:
+    """Barbeiros da configuração, completados com nomes numerados"""
+    return (base + [f"Barbeiro {i}" for i in range(len(base) + 1, quantidade + 1)])[:quantidade]
+
+
+def gerar_clientes(rng: random.Random, quantidade: int, criado_desde: datetime, segundos: int) -> Iterator[dict]:
+    for i in range(quantidade):
+        yield {
+            "nome": f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}",
+            # O índice garante números únicos; o DDD varia a distribuição dos prefixos
+            "numero": f"55{DDDS[i % len(DDDS)]}9{i:08d}",
+            "criado_em": criado_desde + timedelta(seconds=rng.randrange(segundos)),
+        }
+
+
+def sortear_horarios(rng: random.Random, quantidade: int, dias: List[date], grade, barbeiros: List[str]):
+    """Sorteia 'quantidade' horários distintos (dia, hora, barbeiro), em ordem cronológica
+
+    Amostragem sequencial (algoritmo S): cada horário possível é escolhido com
+    probabilidade faltam / restantes, o que dá exatamente 'quantidade' horários
+    uniformes sem guardar a lista de possibilidades.
+    """
+    restantes = len(dias) * len(grade) * len(barbeiros)
+    faltam = quantidade
+    for dia in dias:
+        for hora in grade:
+            inicio = datetime.combine(dia, hora)
+            for barbeiro in barbeiros:
+                if faltam == 0:
+                    return
+                if rng.random() * restantes < faltam:
+                    yield inicio, barbeiro
+                    faltam -= 1
+                restantes -= 1
+
+
+def gerar_agendamentos(rng: random.Random, horarios, primeiro_cliente: int, clientes: int) -> Iterator[dict]:
+    from disponibilidade import formatar_horario
+    from config import DURACAO_PADRAO_MINUTOS
+
+    for inicio, barbeiro in horarios:
+        cliente = rng.randrange(clientes)
+        yield {
+            "cliente_id": primeiro_cliente + cliente,
+            "contato": f"55{DDDS[cliente % len(DDDS)]}9{cliente:08d}",
+            "horario": formatar_horario(inicio),
+            "inicio": inicio,
+            "duracao_minutos": DURACAO_PADRAO_MINUTOS,
+            "barbeiro": barbeiro,
+            # Agendado entre 0 e 30 dias antes do atendimento
+            "criado_em": inicio - timedelta(minutes=rng.randrange(30 * 24 * 60)),
+        }
+
+
+def gravar(engine, tabela, linhas: Iterator[dict], descricao: str, total: int) -> int:
+    gravadas = 0
+    for bloco in _em_blocos(linhas):
+        with engine.begin() as conn:
+            conn.execute(tabela.insert(), bloco)
+        gravadas += len(bloco)
+        print(f"   {gravadas}/{total} {descricao}...", end="\r", file=sys.stderr)
+    print(file=sys.stderr)
+    return gravadas
+
+
+def main(argv=None):
+    """Função principal (linha de comando)"""
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos para testes de capacidade")
+    parser.add_argument("--clientes", type=int, default=100000)
+    parser.add_argument("--agendamentos", type=int, default=500000)
+    parser.add_argument("--barbeiros", type=int, default=40)
+    parser.add_argument("--dias", type=int, default=730, help="Dias cobertos pelos agendamentos")
+    parser.add_argument("--ate", type=date.fromisoformat, default=None,
+                        help="Último dia com agendamentos (padrão: hoje + 30 dias)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--banco", help="URL do banco (padrão: DATABASE_URL)")
+    args = parser.parse_args(argv)
+
+    # A URL precisa estar no ambiente antes de importar os módulos do app
+    if args.banco:
+        os.environ["DATABASE_URL"] = args.banco
+
+    from config import get_barbeiros
+    from database import criar_engine
+    from disponibilidade import grade_horarios
+    from migracoes import aplicar_migracoes
+    from models import Agendamento, Cliente
+
+    ate = args.ate or date.today() + timedelta(days=30)
+    dias = [ate - timedelta(days=i) for i in range(args.dias - 1, -1, -1)]
+    grade = grade_horarios()
+    barbeiros = nomes_barbeiros(args.barbeiros, get_barbeiros())
+
+    possiveis = len(dias) * len(grade) * len(barbeiros)
+    if args.agendamentos > possiveis:
+        parser.error(f"{args.agendamentos} agendamentos não cabem em {len(barbeiros)} barbeiro(s) x "
+                     f"{len(dias)} dia(s) x {len(grade)} horário(s) = {possiveis}; aumente --barbeiros ou --dias")
+    if args.agendamentos and not args.clientes:
+        parser.error("agendamentos precisam de pelo menos um cliente")
+
+    engine = criar_engine(synchronous="OFF")
+    aplicar_migracoes(engine)
+
+    with engine.connect() as conn:
+        existentes = conn.execute(select(func.count()).select_from(Cliente)).scalar()
+        primeiro_cliente = (conn.execute(select(func.max(Cliente.id))).scalar() or 0) + 1
+    if existentes:
+        print(f"❌ O banco já tem {existentes} cliente(s); use um banco vazio (--banco).", file=sys.stderr)
+        return 1
+
+    print(f"🧪 Gerando {args.clientes} cliente(s) e {args.agendamentos} agendamento(s) "
+          f"({len(barbeiros)} barbeiros, {dias[0]} a {dias[-1]}, semente {args.semente})", file=sys.stderr)
+    rng = random.Random(args.semente)
+    inicio = time.perf_counter()
+
+    criado_desde = datetime.combine(dias[0], datetime.min.time()) - timedelta(days=365)
+    segundos = int((datetime.combine(dias[-1], datetime.min.time()) - criado_desde).total_seconds())
+    gravar(engine, Cliente.__table__, gerar_clientes(rng, args.clientes, criado_desde, segundos),
+           "clientes", args.clientes)
+
+    horarios = sortear_horarios(rng, args.agendamentos, dias, grade, barbeiros)
+    gravar(engine, Agendamento.__table__, gerar_agendamentos(rng, horarios, primeiro_cliente, args.clientes),
+           "agendamentos", args.agendamentos)
+
+    print(f"✅ Dados gerados em {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
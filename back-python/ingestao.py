@@ -0,0 +1,394 @@
+"""
+Ingestão assíncrona de mensagens (webhook)
+
+POST /webhook/mensagem só valida a mensagem, coloca na fila e responde 202:
+o webhook do provedor não espera pelo banco. Uma tarefa asyncio do próprio
+processo consome a fila, processa cada mensagem em uma tarefa própria e entrega
+a resposta ao enviador configurado.
+
+- Fila: as mensagens passam pelo mesmo ExecutorPorChave de /mensagem
+  (chatbot.executor_clientes): as de um cliente são processadas na ordem de
+  chegada e as de clientes diferentes em paralelo, sem que um cliente lento
+  atrase os outros. INGESTAO["workers"] limita quantas mensagens ficam em
+  processamento ao mesmo tempo, independentemente da latência do webhook. A
+  vaga de worker só é pedida depois da vez do cliente: as mensagens de um
+  cliente que esperam a anterior dele não ocupam vagas dos outros clientes.
+- Armazenamento: "memoria" (perde as mensagens pendentes se o processo cair)
+  ou "sqlite" (cada mensagem é gravada em um arquivo antes do 202 e removida
+  depois de processada). No SQLite cada processo marca as suas mensagens com
+  um token aleatório e renova o prazo delas (INGESTAO["lease_segundos"])
+  enquanto roda; as de prazo vencido são de um processo que caiu e são
+  retomadas por outro worker, ou pelo mesmo depois de reiniciar. O acesso ao
+  arquivo roda no threadpool, fora do event loop.
+- Enviador: "local" (EnviadorLocal, guarda as respostas em memória; útil em
+  testes) ou "modulo:Classe" com um EnviadorRespostas próprio, por exemplo o
+  cliente da API do provedor de mensagens.
+"""
+
+import asyncio
+import importlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, NamedTuple, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from chatbot import executor_clientes, processar_mensagem_reservada, limpar_numero
+from deduplicacao import respostas_processadas, mensagens_duplicadas
+from database import abrir_sessao
+from metricas import registro
+from config import INGESTAO
+
+# Tempo na fila até o processamento
+espera_fila = registro.histograma(
+    "chatbot_ingestao_espera_segundos", "Tempo entre o recebimento no webhook e o início do processamento")
+mensagens_total = registro.contador(
+    "chatbot_ingestao_mensagens_total",
+    "Mensagens do webhook, por status (recebida, recusada, duplicada, processada, erro)")
+
+
+class MensagemPendente(NamedTuple):
+    id: Optional[int]  # id no armazenamento (None na memória)
+    user_id: str
+    mensagem: str
+    recebida_em: float  # time.time()
+    mensagem_id: Optional[str] = None
+
+
+# ---------------------------------------------------------------------------
+# Armazenamento das mensagens pendentes
+# ---------------------------------------------------------------------------
+
+class ArmazenamentoFila:
+    """Interface dos armazenamentos de mensagens pendentes"""
+
+    # True se os métodos fazem I/O bloqueante (chamados pelo threadpool)
+    bloqueante = False
+    # Prazo das mensagens assumidas pelo processo (None: sem prazo a renovar)
+    lease_segundos: Optional[float] = None
+
+    def gravar(self, user_id: str, mensagem: str, recebida_em: float, mensagem_id: Optional[str]) -> Optional[int]:
+        """Grava a mensagem antes do 202; retorna o id dela no armazenamento"""
+        raise NotImplementedError
+
+    def concluir(self, id: Optional[int]) -> None:
+        """Remove a mensagem já processada"""
+        raise NotImplementedError
+
+    def recuperar(self) -> List[MensagemPendente]:
+        """Assume as mensagens pendentes com prazo vencido (de processos que caíram)"""
+        raise NotImplementedError
+
+    def renovar(self) -> None:
+        """Renova o prazo das mensagens deste processo"""
+
+
+class FilaMemoria(ArmazenamentoFila):
+    """Sem persistência: as mensagens vivem só nas filas dos workers"""
+
+    def gravar(self, user_id: str, mensagem: str, recebida_em: float, mensagem_id: Optional[str]) -> Optional[int]:
+        return None
+
+    def concluir(self, id: Optional[int]) -> None:
+        pass
+
+    def recuperar(self) -> List[MensagemPendente]:
+        return []
+
+
+class FilaSQLite(ArmazenamentoFila):
+    """Mensagens pendentes em um arquivo SQLite, retomadas se o processo cair
+
+    O dono de cada mensagem é identificado por um token aleatório do processo,
+    não pelo pid: um worker reiniciado no contêiner costuma ganhar o mesmo pid
+    do que caiu, e o pid de um processo morto pode ser reaproveitado por outro.
+    """
+
+    bloqueante = True
+
+    def __init__(self, caminho: str, lease_segundos: float = 30.0):
+        self.caminho = caminho
+        self.lease_segundos = lease_segundos
+        self._local = threading.local()
+        self._lock_token = threading.Lock()
+        self._token_pid: Optional[int] = None
+        self._token_processo: Optional[str] = None
+
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS mensagens_pendentes ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " mensagem TEXT NOT NULL,"
+                " recebida_em REAL NOT NULL,"
+                " dono INTEGER NOT NULL,"  # pid do processo responsável (só informativo)
+                " mensagem_id TEXT,"
+                " token TEXT,"  # token do processo responsável
+                " lease_ate REAL NOT NULL DEFAULT 0)"  # prazo do processo responsável (time.time())
+            )
+            colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(mensagens_pendentes)")}
+            if "mensagem_id" not in colunas:
+                conn.execute("ALTER TABLE mensagens_pendentes ADD COLUMN mensagem_id TEXT")
+            # Arquivos antigos: as mensagens sem token ficam com o prazo vencido e são retomadas
+            if "token" not in colunas:
+                conn.execute("ALTER TABLE mensagens_pendentes ADD COLUMN token TEXT")
+            if "lease_ate" not in colunas:
+                conn.execute("ALTER TABLE mensagens_pendentes ADD COLUMN lease_ate REAL NOT NULL DEFAULT 0")
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread, reaberta depois de um fork (gunicorn --preload)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _token(self) -> str:
+        """Token aleatório do processo (outro depois de um fork)"""
+        with self._lock_token:
+            if self._token_pid != os.getpid():
+                self._token_processo = uuid.uuid4().hex
+                self._token_pid = os.getpid()
+            return self._token_processo
+
+    def gravar(self, user_id: str, mensagem: str, recebida_em: float, mensagem_id: Optional[str]) -> Optional[int]:
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "INSERT INTO mensagens_pendentes (user_id, mensagem, recebida_em, dono, mensagem_id, token, lease_ate)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, mensagem, recebida_em, os.getpid(), mensagem_id, self._token(),
+                 time.time() + self.lease_segundos)
+            )
+        return cursor.lastrowid
+
+    def concluir(self, id: Optional[int]) -> None:
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM mensagens_pendentes WHERE id = ?", (id,))
+
+    def recuperar(self) -> List[MensagemPendente]:
+        token = self._token()
+        agora = time.time()
+        # Um único UPDATE: dois workers retomando ao mesmo tempo não assumem a mesma mensagem
+        with self._conexao() as conn:
+            linhas = conn.execute(
+                "UPDATE mensagens_pendentes SET token = ?, dono = ?, lease_ate = ?"
+                " WHERE lease_ate < ? AND (token IS NULL OR token != ?)"
+                " RETURNING id, user_id, mensagem, recebida_em, mensagem_id",
+                (token, os.getpid(), agora + self.lease_segundos, agora, token)
+            ).fetchall()
+        # Na ordem de chegada
+        return [MensagemPendente(*linha) for linha in sorted(linhas)]
+
+    def renovar(self) -> None:
+        with self._conexao() as conn:
+            conn.execute(
+                "UPDATE mensagens_pendentes SET lease_ate = ? WHERE token = ?",
+                (time.time() + self.lease_segundos, self._token())
+            )
+
+
+def criar_armazenamento_fila(backend: Optional[str] = None) -> ArmazenamentoFila:
+    """Cria o armazenamento configurado em config.INGESTAO"""
+    backend = backend or INGESTAO["backend"]
+
+    if backend == "memoria":
+        return FilaMemoria()
+    if backend == "sqlite":
+        return FilaSQLite(os.path.abspath(INGESTAO["sqlite_caminho"]), INGESTAO["lease_segundos"])
+
+    raise ValueError(f"Backend da fila de mensagens desconhecido: {backend}")
+
+
+# ---------------------------------------------------------------------------
+# Envio das respostas
+# ---------------------------------------------------------------------------
+
+class EnviadorRespostas:
+    """Interface de entrega das respostas ao cliente (ex.: API do provedor de mensagens)"""
+
+    async def enviar(self, user_id: str, resposta: str) -> None:
+        raise NotImplementedError
+
+
+class EnviadorLocal(EnviadorRespostas):
+    """Não envia nada: guarda as últimas respostas em memória (testes e desenvolvimento)"""
+
+    def __init__(self, max_respostas: int = 1000):
+        self.enviadas = deque(maxlen=max_respostas)  # (user_id, resposta)
+
+    async def enviar(self, user_id: str, resposta: str) -> None:
+        self.enviadas.append((user_id, resposta))
+
+
+def criar_enviador(nome: Optional[str] = None) -> EnviadorRespostas:
+    """Cria o enviador configurado: "local" ou "modulo:Classe" (instanciada sem argumentos)"""
+    nome = nome or INGESTAO["enviador"]
+
+    if nome == "local":
+        return EnviadorLocal()
+    if ":" in nome:
+        modulo, classe = nome.split(":", 1)
+        return getattr(importlib.import_module(modulo), classe)()
+
+    raise ValueError(f"Enviador de respostas desconhecido: {nome}")
+
+
+# ---------------------------------------------------------------------------
+# Fila e workers
+# ---------------------------------------------------------------------------
+
+class IngestaoMensagens:
+    """Fila de mensagens do webhook processadas em paralelo, na ordem de cada cliente"""
+
+    def __init__(self, armazenamento: ArmazenamentoFila, enviador: EnviadorRespostas,
+                 workers: int, max_pendentes: int):
+        self.armazenamento = armazenamento
+        self.enviador = enviador
+        self.workers = max(1, workers)
+        self.max_pendentes = max_pendentes
+        self.pendentes = 0
+        self._fila: Optional[asyncio.Queue] = None
+        self._vagas: Optional[asyncio.Semaphore] = None
+        self._despachante: Optional[asyncio.Task] = None
+        self._renovacao: Optional[asyncio.Task] = None
+        self._encerrando = False
+        self._em_processamento: Set[asyncio.Task] = set()
+
+    @property
+    def ativa(self) -> bool:
+        return self._despachante is not None
+
+    async def _armazenamento(self, metodo, *args):
+        """Chama o armazenamento sem bloquear o event loop"""
+        if self.armazenamento.bloqueante:
+            return await run_in_threadpool(metodo, *args)
+        return metodo(*args)
+
+    async def duplicada(self, user_id: str, mensagem_id: Optional[str]) -> bool:
+        """True se a mensagem é um reenvio de outra já respondida (não deve entrar na fila)"""
+        if mensagem_id and await respostas_processadas.get_async(limpar_numero(user_id), mensagem_id) is not None:
+            mensagens_duplicadas.inc()
+            mensagens_total.inc(status="duplicada")
+            return True
+        return False
+
+    async def publicar(self, mensagem: str, user_id: str, mensagem_id: Optional[str] = None) -> bool:
+        """Grava e enfileira a mensagem; False se a fila estiver cheia
+
+        Reenvios de mensagem já respondida devem ser filtrados antes com duplicada().
+        """
+        if self.max_pendentes and self.pendentes >= self.max_pendentes:
+            mensagens_total.inc(status="recusada")
+            return False
+
+        # Reserva a vaga antes de gravar: outras requisições rodam enquanto o arquivo é gravado
+        self.pendentes += 1
+        recebida_em = time.time()
+        try:
+            id = await self._armazenamento(self.armazenamento.gravar, user_id, mensagem, recebida_em, mensagem_id)
+        except Exception:
+            self.pendentes -= 1
+            raise
+        self._fila.put_nowait(MensagemPendente(id, user_id, mensagem, recebida_em, mensagem_id))
+        mensagens_total.inc(status="recebida")
+        return True
+
+    def _retomar(self, recuperadas: List[MensagemPendente]):
+        for item in recuperadas:
+            self.pendentes += 1
+            self._fila.put_nowait(item)
+        if recuperadas:
+            print(f"📥 {len(recuperadas)} mensagem(ns) pendente(s) retomada(s) da fila")
+
+    async def iniciar(self):
+        """Cria a fila e retoma as mensagens pendentes de processos que caíram"""
+        if self.ativa:
+            return
+
+        self._fila = asyncio.Queue()
+        self._vagas = asyncio.Semaphore(self.workers)
+        self._encerrando = False
+        self._retomar(await self._armazenamento(self.armazenamento.recuperar))
+
+        self._despachante = asyncio.create_task(self._despachar())
+        if self.armazenamento.lease_segundos:
+            self._renovacao = asyncio.create_task(self._manter_lease())
+
+    async def parar(self):
+        """Processa o que já está na fila e encerra"""
+        if not self.ativa:
+            return
+
+        self._encerrando = True
+        self._fila.put_nowait(None)
+        await self._despachante
+        await asyncio.gather(*self._em_processamento)
+        if self._renovacao is not None:
+            self._renovacao.cancel()
+            self._renovacao = None
+        self._despachante = None
+
+    async def _manter_lease(self):
+        """Renova o prazo das mensagens deste processo e retoma as de processos que caíram
+
+        Um worker reiniciado retoma as mensagens do anterior assim que o prazo delas vence.
+        """
+        while True:
+            await asyncio.sleep(self.armazenamento.lease_segundos / 3)
+            try:
+                await self._armazenamento(self.armazenamento.renovar)
+                # Encerrando, a fila não aceita mais mensagens: as órfãs ficam para outro worker
+                if not self._encerrando:
+                    self._retomar(await self._armazenamento(self.armazenamento.recuperar))
+            except Exception as e:
+                print(f"Erro ao renovar as mensagens pendentes da fila: {str(e)}")
+
+    async def _despachar(self):
+        """Tira as mensagens da fila, na ordem, e cria uma tarefa para cada uma"""
+        while (item := await self._fila.get()) is not None:
+            tarefa = asyncio.create_task(self._processar(item))
+            self._em_processamento.add(tarefa)
+            tarefa.add_done_callback(self._em_processamento.discard)
+
+    async def _processar(self, item: MensagemPendente):
+        try:
+            # Reserva o cliente antes de qualquer await: as tarefas de um mesmo
+            # cliente entram no executor na ordem em que saíram da fila. A vaga
+            # de worker vem depois, quando já é a vez do cliente.
+            async with executor_clientes.reservar(limpar_numero(item.user_id)), self._vagas:
+                espera_fila.observe(time.time() - item.recebida_em)
+                # Reenvio que chegou antes de a primeira cópia ser processada: a resposta já foi enviada
+                if await self.duplicada(item.user_id, item.mensagem_id):
+                    return
+                async with abrir_sessao() as db:
+                    resposta = await processar_mensagem_reservada(item.mensagem, db, item.user_id, item.mensagem_id)
+                await self.enviador.enviar(item.user_id, resposta)
+            mensagens_total.inc(status="processada")
+        except Exception as e:
+            # Como no endpoint síncrono, a mensagem com erro não é reprocessada
+            print(f"Erro ao processar mensagem do webhook: {str(e)}")
+            mensagens_total.inc(status="erro")
+        finally:
+            try:
+                await self._armazenamento(self.armazenamento.concluir, item.id)
+            finally:
+                self.pendentes -= 1
+
+
+ingestao = IngestaoMensagens(
+    criar_armazenamento_fila(),
+    criar_enviador(),
+    INGESTAO["workers"],
+    INGESTAO["max_pendentes"]
+)
+
+registro.gauge(
+    "chatbot_ingestao_pendentes", "Mensagens do webhook na fila ou em processamento",
+    lambda: ingestao.pendentes)
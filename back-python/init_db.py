@@ -4,14 +4,14 @@ Script para inicializar o banco de dados e testar a estrutura
 """
 
 from database import engine, SessionLocal
-from models import Base, Cliente, Agendamento
-from datetime import datetime
+from models import Cliente, Agendamento
+from migracoes import aplicar_migracoes, interpretar_horario
 
 def criar_tabelas():
     """Cria as tabelas no banco de dados"""
     try:
         print("🗄️ Criando tabelas no banco de dados...")
-        Base.metadata.create_all(bind=engine)
+        aplicar_migracoes(engine)
         print("✅ Tabelas criadas com sucesso!")
     except Exception as e:
         print(f"❌ Erro ao criar tabelas: {e}")
@@ -59,12 +59,14 @@ def inserir_dados_teste():
                 cliente_id=clientes[0].id,
                 contato=clientes[0].numero,
                 horario="15/12 14:00",
+                inicio=interpretar_horario("15/12 14:00"),
                 barbeiro="João"
             ),
             Agendamento(
                 cliente_id=clientes[1].id,
                 contato=clientes[1].numero,
                 horario="16/12 10:30",
+                inicio=interpretar_horario("16/12 10:30"),
                 barbeiro="Carlos"
             )
         ]
@@ -0,0 +1,244 @@
+"""
+Métricas da API no formato texto do Prometheus
+
+- Contagem de consultas SQL e tempo de banco por requisição (alimentados
+  pelos eventos do engine em database.py).
+- Histogramas de latência por endpoint e estado da conversa, registrados
+  pelo MiddlewareMetricas.
+- Exposição em GET /metrics (ver app.py).
+
+As métricas são por processo: com vários workers, cada um expõe as suas.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Limites (em segundos) dos buckets de latência
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Limites dos buckets de consultas SQL por requisição
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 200)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in labels) + "}"
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico com labels"""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1, **labels):
+        chave = tuple(sorted(labels.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **labels) -> float:
+        return self._valores.get(tuple(sorted(labels.items())), 0)
+
+    def amostras(self) -> Iterable[str]:
+        with self._lock:
+            itens = list(self._valores.items())
+        for labels, valor in itens:
+            yield f"{self.nome}{_formatar_labels(labels)} {_formatar_numero(valor)}"
+
+
+class Histograma:
+    """Histograma cumulativo com labels (buckets fixos)"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float, **labels):
+        chave = tuple(sorted(labels.items()))
+        with self._lock:
+            # [contagem por bucket..., soma, total]
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * len(self.buckets) + [0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def amostras(self) -> Iterable[str]:
+        with self._lock:
+            itens = [(labels, list(serie)) for labels, serie in self._series.items()]
+        for labels, serie in itens:
+            for limite, contagem in zip(self.buckets, serie):
+                yield f"{self.nome}_bucket{_formatar_labels(labels + (('le', _formatar_numero(limite)),))} {contagem}"
+            yield f"{self.nome}_bucket{_formatar_labels(labels + (('le', '+Inf'),))} {serie[-1]}"
+            yield f"{self.nome}_sum{_formatar_labels(labels)} {_formatar_numero(serie[-2])}"
+            yield f"{self.nome}_count{_formatar_labels(labels)} {serie[-1]}"
+
+
+class Gauge:
+    """Valor instantâneo lido de uma função no momento da coleta"""
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, funcao: Callable[[], float]):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+
+    def amostras(self) -> Iterable[str]:
+        yield f"{self.nome} {_formatar_numero(self.funcao())}"
+
+
+class Registro:
+    """Conjunto das métricas expostas em /metrics"""
+
+    def __init__(self):
+        self._metricas: Dict[str, object] = {}
+
+    def registrar(self, metrica):
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome: str, ajuda: str) -> Contador:
+        return self._metricas.get(nome) or self.registrar(Contador(nome, ajuda))
+
+    def histograma(self, nome: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS_LATENCIA) -> Histograma:
+        return self._metricas.get(nome) or self.registrar(Histograma(nome, ajuda, buckets))
+
+    def gauge(self, nome: str, ajuda: str, funcao: Callable[[], float]) -> Gauge:
+        return self.registrar(Gauge(nome, ajuda, funcao))
+
+    def exportar(self) -> str:
+        """Gera o texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        linhas = []
+        for metrica in self._metricas.values():
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.amostras())
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro()
+
+requisicoes_total = registro.contador(
+    "chatbot_requisicoes_total", "Requisições HTTP atendidas, por endpoint, método e status")
+duracao_requisicao = registro.histograma(
+    "chatbot_requisicao_duracao_segundos", "Latência das requisições HTTP, por endpoint e estado da conversa")
+consultas_requisicao = registro.histograma(
+    "chatbot_consultas_sql_por_requisicao", "Consultas SQL executadas por requisição", BUCKETS_CONSULTAS)
+duracao_db_requisicao = registro.histograma(
+    "chatbot_db_duracao_segundos", "Tempo gasto no banco de dados por requisição")
+consultas_total = registro.contador(
+    "chatbot_consultas_sql_total", "Consultas SQL executadas (inclusive fora de requisições)")
+
+
+# ---------------------------------------------------------------------------
+# Medição por requisição
+# ---------------------------------------------------------------------------
+
+class MedicaoRequisicao:
+    """Acumulador da requisição atual (compartilhado com threads/greenlets da requisição)"""
+
+    __slots__ = ("consultas", "tempo_db", "estado")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.estado = "-"
+
+
+_medicao_atual: ContextVar[Optional[MedicaoRequisicao]] = ContextVar("medicao_atual", default=None)
+
+
+@contextmanager
+def medir() -> Iterator[MedicaoRequisicao]:
+    """Acumula em uma MedicaoRequisicao as consultas e o estado do código executado no bloco"""
+    medicao = MedicaoRequisicao()
+    token = _medicao_atual.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _medicao_atual.reset(token)
+
+
+def registrar_consulta(segundos: float):
+    """Chamado pelo evento after_cursor_execute do engine"""
+    consultas_total.inc()
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.consultas += 1
+        medicao.tempo_db += segundos
+
+
+def registrar_estado(estado: str):
+    """Marca o estado da conversa tratado pela requisição atual (label das métricas)"""
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.estado = estado
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mede latência, consultas e tempo de banco de cada requisição"""
+
+    def __init__(self, app, ignorar: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.ignorar = ignorar
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.ignorar:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        inicio = time.perf_counter()
+
+        async def send_com_status(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            with medir() as medicao:
+                # Quem chama o app em processo (ex.: benchmark.py) lê a medição no state do escopo
+                if "state" in scope:
+                    scope["state"]["medicao_requisicao"] = medicao
+                await self.app(scope, receive, send_com_status)
+        finally:
+            duracao = time.perf_counter() - inicio
+
+            # Usa o caminho declarado da rota (ex.: /cliente/{numero}) para limitar a cardinalidade
+            rota = scope.get("route")
+            endpoint = getattr(rota, "path", None) or "nao_encontrado"
+            metodo = scope["method"]
+
+            requisicoes_total.inc(endpoint=endpoint, metodo=metodo, status=str(status))
+            duracao_requisicao.observe(duracao, endpoint=endpoint, metodo=metodo, estado=medicao.estado)
+            consultas_requisicao.observe(medicao.consultas, endpoint=endpoint, estado=medicao.estado)
+            duracao_db_requisicao.observe(medicao.tempo_db, endpoint=endpoint, estado=medicao.estado)
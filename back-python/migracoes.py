@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Migrações do banco de dados do Chatbot Barbearia
+
+O create_all do SQLAlchemy só cria tabelas novas; as alterações em tabelas
+já existentes (ex.: o barbearia.db de produção) são aplicadas aqui. Todas as
+etapas são idempotentes e podem ser executadas a cada inicialização.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import inspect, text, select, update
+from sqlalchemy.engine import Engine
+
+from database import engine as engine_padrao
+from models import Base, Agendamento, AgendamentoArquivado
+from config import DURACAO_PADRAO_MINUTOS
+
+# Quantos ids de agendamentos sem 'inicio' aparecem no aviso das migrações
+MAX_IDS_AVISO = 20
+
+
+def interpretar_horario(horario: str, referencia: Optional[datetime] = None) -> Optional[datetime]:
+    """Converte o horário legado ("dd/mm HH:MM" ou "HH:MM") em datetime
+
+    O ano não era gravado: usa o ano da data de referência (criação do
+    registro), avançando para o ano seguinte quando a data ficaria mais de
+    seis meses antes da referência (ex.: agendado em dezembro para janeiro).
+    """
+    referencia = referencia or datetime.now()
+    try:
+        if ' ' in horario.strip():
+            data_str, hora_str = horario.strip().split(' ', 1)
+            dia, mes = (int(p) for p in data_str.split('/'))
+            hora, minuto = (int(p) for p in hora_str.split(':'))
+            inicio = datetime(referencia.year, mes, dia, hora, minuto)
+            if inicio < referencia - timedelta(days=180):
+                inicio = inicio.replace(year=referencia.year + 1)
+            return inicio
+
+        # Registros antigos sem data: assume o dia em que foram criados
+        hora, minuto = (int(p) for p in horario.strip().split(':'))
+        return referencia.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    except ValueError:
+        return None
+
+
+def _adicionar_colunas(engine: Engine) -> None:
+    """Adiciona as colunas novas das tabelas agendamentos e clientes, se faltarem"""
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("agendamentos")}
+    colunas_clientes = {coluna["name"] for coluna in inspect(engine).get_columns("clientes")}
+
+    with engine.begin() as conn:
+        if "inicio" not in colunas:
+            conn.execute(text("ALTER TABLE agendamentos ADD COLUMN inicio DATETIME"))
+            print("🛠️ Coluna 'inicio' adicionada em agendamentos")
+        if "duracao_minutos" not in colunas:
+            conn.execute(text(
+                "ALTER TABLE agendamentos ADD COLUMN duracao_minutos INTEGER NOT NULL "
+                f"DEFAULT {DURACAO_PADRAO_MINUTOS}"
+            ))
+            print("🛠️ Coluna 'duracao_minutos' adicionada em agendamentos")
+        if "versao" not in colunas_clientes:
+            conn.execute(text("ALTER TABLE clientes ADD COLUMN versao INTEGER NOT NULL DEFAULT 1"))
+            print("🛠️ Coluna 'versao' adicionada em clientes")
+
+
+def _recriar_arquivo(engine: Engine) -> None:
+    """Dá ao arquivo um ID próprio (agendamento_id guarda o ID da tabela principal)
+
+    O arquivo usava o ID do agendamento como chave primária, mas o SQLite
+    reutiliza IDs da tabela principal e um novo arquivamento colidiria.
+    """
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("agendamentos_arquivados")}
+    if "agendamento_id" in colunas:
+        return
+
+    arquivo = AgendamentoArquivado.__table__
+    copiadas = ", ".join(c.name for c in arquivo.columns if c.name not in ("id", "agendamento_id"))
+    with engine.begin() as conn:
+        # O pysqlite não abre transação antes de DDL: abre explicitamente para a troca ser atômica
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        for indice in arquivo.indexes:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {indice.name}")
+        conn.exec_driver_sql("ALTER TABLE agendamentos_arquivados RENAME TO agendamentos_arquivados_antigo")
+        arquivo.create(bind=conn)
+        conn.exec_driver_sql(
+            f"INSERT INTO agendamentos_arquivados (agendamento_id, {copiadas})"
+            f" SELECT id, {copiadas} FROM agendamentos_arquivados_antigo ORDER BY id"
+        )
+        conn.exec_driver_sql("DROP TABLE agendamentos_arquivados_antigo")
+    print("🛠️ Tabela 'agendamentos_arquivados' recriada com ID próprio (coluna 'agendamento_id')")
+
+
+def _preencher_inicio(engine: Engine) -> int:
+    """Preenche 'inicio' a partir do texto de 'horario' nos registros antigos
+
+    Retorna quantos agendamentos continuam sem 'inicio'.
+    """
+    tabela = Agendamento.__table__
+
+    with engine.begin() as conn:
+        pendentes = conn.execute(
+            select(tabela.c.id, tabela.c.horario, tabela.c.barbeiro, tabela.c.criado_em)
+            .where(tabela.c.inicio.is_(None))
+            .order_by(tabela.c.id)
+        ).all()
+        if not pendentes:
+            return 0
+
+        ocupados = set(conn.execute(
+            select(tabela.c.barbeiro, tabela.c.inicio).where(tabela.c.inicio.is_not(None))
+        ).all())
+
+        preenchidos, ignorados = 0, []
+        for id_, horario, barbeiro, criado_em in pendentes:
+            inicio = interpretar_horario(horario, criado_em)
+            # Horários ilegíveis ou duplicados ficam sem 'inicio' (o índice único aceita NULL)
+            if inicio is None or (barbeiro, inicio) in ocupados:
+                ignorados.append(id_)
+                continue
+            ocupados.add((barbeiro, inicio))
+            conn.execute(update(tabela).where(tabela.c.id == id_).values(inicio=inicio))
+            preenchidos += 1
+
+    if preenchidos:
+        print(f"🛠️ {preenchidos} agendamento(s) com 'inicio' preenchido")
+    if ignorados:
+        # Sem 'inicio' eles não entram nas listagens por data: avisa a cada execução até serem corrigidos
+        exemplos = ", ".join(str(id_) for id_ in ignorados[:MAX_IDS_AVISO])
+        if len(ignorados) > MAX_IDS_AVISO:
+            exemplos += ", ..."
+        print(f"⚠️ {len(ignorados)} agendamento(s) sem 'inicio' (horário inválido ou duplicado; ids {exemplos}). "
+              "Eles não aparecem nas listagens por data nem no histórico: veja-os em "
+              "GET /agendamentos?sem_inicio=true e corrija o horário (ou arquive-os com arquivamento.py).")
+    return len(ignorados)
+
+
+def _criar_indices(engine: Engine) -> None:
+    """Cria os índices declarados nos modelos que ainda não existem"""
+    for tabela in (Agendamento.__table__, AgendamentoArquivado.__table__):
+        for indice in tabela.indexes:
+            indice.create(bind=engine, checkfirst=True)
+
+
+def aplicar_migracoes(engine: Engine = engine_padrao) -> int:
+    """Cria as tabelas que faltam e atualiza o esquema das existentes
+
+    Retorna quantos agendamentos ficaram sem 'inicio' (não aparecem nas listagens por data).
+    """
+    Base.metadata.create_all(bind=engine)
+    _adicionar_colunas(engine)
+    _recriar_arquivo(engine)
+    sem_inicio = _preencher_inicio(engine)
+    _criar_indices(engine)
+    return sem_inicio
+
+
+if __name__ == "__main__":
+    print("🚀 Aplicando migrações do banco de dados\n")
+    aplicar_migracoes()
+    print("✅ Migrações concluídas!")
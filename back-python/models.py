@@ -1,20 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime # Tipos de dados das colunas
+from sqlalchemy import Column, Integer, String, DateTime, Index # Tipos de dados das colunas
 from database import Base #Importa a Base do arquivo database.py
 from datetime import datetime # Usado para pegar a data/hora atual
 from sqlalchemy.orm import relationship # Usado para criar relacionamento entre tabelas
 from sqlalchemy import ForeignKey #Usado para criar chave estrangeira
+from config import DURACAO_PADRAO_MINUTOS # Duração padrão de um atendimento
 
 
 class Agendamento(Base): #Modelo da tabela "agendamentos"
 
     __tablename__= "agendamentos" 
     id = Column(Integer, primary_key=True, index=True) #ID Unico, chave primaria com indice
-    cliente_id = Column(Integer,ForeignKey("clientes.id")) #Chave estrangeira
+    cliente_id = Column(Integer,ForeignKey("clientes.id"), index=True) #Chave estrangeira
     contato = Column(String) #Contato dos clientes
-    horario = Column(String, nullable=False) # Horario agendado(Obrigatorio)
+    horario = Column(String, nullable=False) # Horario agendado para exibição ("dd/mm HH:MM")
+    inicio = Column(DateTime) # Data/hora de início do atendimento (com ano)
+    duracao_minutos = Column(Integer, nullable=False, default=DURACAO_PADRAO_MINUTOS) # Duração do atendimento
     barbeiro = Column(String, nullable = False) # Nome do barbeiro (obrigatorio)
     criado_em = Column(DateTime, default=datetime.utcnow) #Data de criacão do registro
 
+    __table_args__ = (
+        # Um barbeiro só pode ter um agendamento por horário; também serve as buscas por intervalo
+        Index("ix_agendamentos_barbeiro_inicio", "barbeiro", "inicio", unique=True),
+        # Próximos agendamentos de um cliente (inicio >= hoje)
+        Index("ix_agendamentos_cliente_inicio", "cliente_id", "inicio"),
+    )
+
     cliente_rel = relationship("Cliente", back_populates="agendamentos")
     #Relacionamento com o cliente (lado do agendamento)
 
@@ -27,6 +37,29 @@ class Cliente(Base): #Modelo da tabela "clientes"
     nome = Column(String, default="Nome não informado" )# Nome do cliente, com valor padrão
     numero = Column(String, unique=True, nullable=False) # Número de contato, único e obrigatório
     criado_em = Column(DateTime, default=datetime.utcnow) # Data de criação do registro
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
+    # Incrementada a cada mudança de nome, agendamento ou cancelamento (ETag de GET /cliente/{numero})
 
     agendamentos = relationship("Agendamento", back_populates="cliente_rel")
-    # Lista de agendamentos feitos por esse cliente (relacionamento reverso)
\ No newline at end of file
+    # Lista de agendamentos feitos por esse cliente (relacionamento reverso)
+
+
+class AgendamentoArquivado(Base): #Modelo da tabela "agendamentos_arquivados" (histórico, ver arquivamento.py)
+
+    __tablename__ = "agendamentos_arquivados"
+
+    id = Column(Integer, primary_key=True) # ID próprio do arquivo (o SQLite pode reutilizar IDs da tabela principal)
+    agendamento_id = Column(Integer, nullable=False) # ID que o agendamento tinha na tabela principal
+    cliente_id = Column(Integer, ForeignKey("clientes.id"))
+    contato = Column(String)
+    horario = Column(String, nullable=False)
+    inicio = Column(DateTime)
+    duracao_minutos = Column(Integer, nullable=False, default=DURACAO_PADRAO_MINUTOS)
+    barbeiro = Column(String, nullable=False)
+    criado_em = Column(DateTime)
+    arquivado_em = Column(DateTime, default=datetime.utcnow) # Quando saiu da tabela principal
+
+    __table_args__ = (
+        # Histórico de um cliente, do mais recente para o mais antigo
+        Index("ix_agendamentos_arquivados_cliente_inicio", "cliente_id", "inicio"),
+    )
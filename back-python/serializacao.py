@@ -0,0 +1,38 @@
+"""
+Serialização JSON das respostas da API
+
+Usa o orjson quando ele está instalado (pip install orjson) e o json da
+biblioteca padrão caso contrário; a saída é a mesma, o orjson só é mais rápido.
+
+- RespostaJSON: classe de resposta do FastAPI. Os endpoints administrativos
+  que devolvem listas grandes montam os dicionários a partir de linhas
+  (tuplas) do banco e retornam RespostaJSON diretamente, sem passar pelo
+  jsonable_encoder nem pela validação do response_model.
+- linhas_ndjson: junta um bloco de registros em um único pedaço de NDJSON.
+"""
+
+import json
+from typing import Iterable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as RespostaJSON
+
+    def _json(registro) -> bytes:
+        return orjson.dumps(registro)
+else:
+    RespostaJSON = JSONResponse
+
+    def _json(registro) -> bytes:
+        return json.dumps(registro, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def linhas_ndjson(registros: Iterable[dict]) -> bytes:
+    """Um registro JSON por linha, em um único bloco de bytes"""
+    return b"".join(_json(registro) + b"\n" for registro in registros)
@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 """
 Script para iniciar o servidor do Chatbot Barbearia
+
+Uso:
+    python start.py                                   # desenvolvimento (reload, 1 processo)
+    python start.py --producao [--workers N] [--servidor uvicorn|gunicorn]
+                               [--host 0.0.0.0] [--port 8000]
+
+No modo produção as migrações rodam uma única vez, antes de subir os
+workers (um por CPU por padrão), e o encerramento espera as requisições em
+andamento por até TIMEOUT_GRACEFUL_SEGUNDOS.
 """
 
+import argparse
 import os
+import shutil
 import sys
 import subprocess
+import time
 import uvicorn
 
+import config
+from config import API_HOST, API_PORT, WORKERS, TIMEOUT_GRACEFUL_SEGUNDOS, CONVERSAS, LOG_LEVEL
+
 def verificar_dependencias():
     """Verifica se as dependências estão instaladas"""
     try:
@@ -60,14 +75,82 @@ def iniciar_servidor():
     except Exception as e:
         print(f"❌ Erro ao iniciar servidor: {e}")
 
-def main():
+def iniciar_producao(workers: int, servidor: str, host: str, port: int):
+    """Inicia o servidor de produção: migração única, N workers e encerramento gracioso"""
+    inicio = time.perf_counter()
+    
+    # Os workers medem o cold start a partir deste instante e não repetem as migrações
+    os.environ["CHATBOT_INICIO_LANCAMENTO"] = str(time.time())
+    os.environ["MIGRAR_NO_STARTUP"] = "False"
+    config.MIGRAR_NO_STARTUP = False  # este processo já importou o config (1 worker roda aqui)
+    
+    print("🗄️ Aplicando migrações...")
+    from migracoes import aplicar_migracoes
+    aplicar_migracoes()
+    print(f"⏱️ Migrações aplicadas em {time.perf_counter() - inicio:.2f}s")
+    
+    if workers > 1 and CONVERSAS["backend"] == "memoria":
+        print("⚠️ CONVERSAS_BACKEND=memoria com vários workers: cada worker terá o seu estado "
+              "de conversas. Use CONVERSAS_BACKEND=sqlite.")
+    
+    if servidor == "gunicorn" and shutil.which("gunicorn") is None:
+        print("⚠️ gunicorn não encontrado (pip install gunicorn); usando uvicorn.")
+        servidor = "uvicorn"
+    
+    print(f"🚀 Iniciando {workers} worker(s) com {servidor} em http://{host}:{port}")
+    print("-" * 60)
+    
+    if servidor == "gunicorn":
+        # --preload: o app é importado uma vez no processo mestre e herdado pelos workers
+        comando = [
+            "gunicorn", "app:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(workers),
+            "--bind", f"{host}:{port}",
+            "--preload",
+            "--graceful-timeout", str(TIMEOUT_GRACEFUL_SEGUNDOS),
+            "--log-level", LOG_LEVEL,
+        ]
+        try:
+            subprocess.run(comando, check=False)
+        except KeyboardInterrupt:
+            pass
+    else:
+        # Sem pré-carregamento: cada worker do uvicorn importa "app:app" por conta própria
+        # (uvicorn só aceita a string de importação com vários workers). Para importar o app
+        # uma única vez no processo mestre, use --servidor gunicorn (--preload).
+        uvicorn.run(
+            "app:app",
+            host=host,
+            port=port,
+            workers=workers,
+            timeout_graceful_shutdown=TIMEOUT_GRACEFUL_SEGUNDOS,
+            log_level=LOG_LEVEL
+        )
+    
+    print("\n👋 Servidor encerrado.")
+
+def main(argv=None):
     """Função principal"""
+    parser = argparse.ArgumentParser(description="Inicia o servidor do Chatbot Barbearia")
+    parser.add_argument("--producao", action="store_true", help="Modo produção (vários workers, sem reload)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Quantidade de workers (padrão: CPUs)")
+    parser.add_argument("--servidor", choices=("uvicorn", "gunicorn"), default="uvicorn",
+                        help="Gerenciador de processos no modo produção")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+    
     print("🏪 Chatbot Barbearia - Sistema de Agendamentos\n")
     
     # Verifica dependências
     if not verificar_dependencias():
         return
     
+    if args.producao:
+        iniciar_producao(max(1, args.workers), args.servidor, args.host, args.port)
+        return
+    
     # Verifica banco de dados
     if not verificar_banco():
         return
@@ -0,0 +1,52 @@
+"""
+Configuração dos testes
+
+Os módulos do app leem o config.py ao serem importados, então o banco de
+teste (um arquivo temporário) precisa estar no ambiente antes do primeiro
+import. Os limites de admissão e o group commit ficam desligados; os testes
+que precisam deles criam as próprias instâncias. Da mesma forma, o modo
+ASYNC_DB é ligado só pelos testes de tests/test_fluxo.py, com um engine
+aiosqlite para o mesmo banco.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PASTA_TESTES = tempfile.mkdtemp(prefix="barbearia-testes-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(PASTA_TESTES, 'barbearia.db')}"
+os.environ["ASYNC_DB"] = "False"
+os.environ["DB_PERFIL"] = "producao"
+os.environ["GRUPO_COMMIT"] = "False"
+os.environ["ADMISSAO_MENSAGENS_POR_SEGUNDO"] = "0"
+os.environ["ADMISSAO_MAX_EM_ANDAMENTO"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def banco():
+    """Banco temporário com todas as migrações aplicadas"""
+    from database import engine
+    from migracoes import aplicar_migracoes
+
+    aplicar_migracoes(engine)
+    yield engine
+    engine.dispose()
+    shutil.rmtree(PASTA_TESTES, ignore_errors=True)
+
+
+@pytest.fixture
+def db(banco):
+    """Sessão da requisição, fechada ao fim do teste"""
+    from database import SessionLocal
+
+    sessao = SessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.close()
@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import admissao
+from admissao import ControleAdmissao, LimitadorPorUsuario, RequisicaoRecusada
+
+
+def test_limite_de_requisicoes_em_andamento():
+    controle = ControleAdmissao(1, 3, 0, 1, 100)
+
+    with controle.admitir("5511"):
+        with pytest.raises(RequisicaoRecusada) as recusa:
+            with controle.admitir("5522"):
+                pass
+
+    assert (recusa.value.status, recusa.value.retry_after) == (503, 3)
+    assert controle.em_andamento == 0
+    with controle.admitir("5522"):
+        assert controle.em_andamento == 1
+
+
+def test_balde_de_tokens_por_usuario():
+    controle = ControleAdmissao(0, 3, 0.5, 2, 100)
+
+    for _ in range(2):
+        with controle.admitir("5511"):
+            pass
+    with pytest.raises(RequisicaoRecusada) as recusa:
+        with controle.admitir("5511"):
+            pass
+
+    assert recusa.value.status == 429
+    assert recusa.value.retry_after == 2  # um token a cada 2 segundos
+    # O limite é por cliente: os outros continuam sendo atendidos
+    with controle.admitir("5522"):
+        pass
+
+
+def test_limitador_descarta_o_balde_menos_recente():
+    limitador = LimitadorPorUsuario(0.001, 1, 2)
+
+    assert limitador.consumir("a") == 0
+    assert limitador.consumir("b") == 0
+    assert limitador.consumir("a") > 0
+    assert limitador.consumir("c") == 0
+
+    assert len(limitador) == 2
+    assert limitador.consumir("b") == 0  # balde descartado volta cheio
+
+
+def test_recusas_da_api_com_retry_after(monkeypatch):
+    from app import app
+
+    monkeypatch.setattr(admissao.admissao, "limitador", LimitadorPorUsuario(0.001, 1, 100))
+
+    with TestClient(app) as cliente:
+        assert cliente.post("/mensagem", json={"mensagem": "oi", "user_id": "5511960000001"}).status_code == 200
+        limitada = cliente.post("/mensagem", json={"mensagem": "oi", "user_id": "5511960000001"})
+
+        monkeypatch.setattr(admissao.admissao, "max_em_andamento", 1)
+        monkeypatch.setattr(admissao.admissao, "em_andamento", 1)
+        saturada = cliente.post("/mensagem", json={"mensagem": "oi", "user_id": "5511960000002"})
+
+    assert limitada.status_code == 429
+    assert int(limitada.headers["Retry-After"]) >= 1
+    assert saturada.status_code == 503
+    assert saturada.headers["Retry-After"] == str(admissao.admissao.retry_after_segundos)
+
+
+def test_varias_chaves_tudo_ou_nada():
+    limitador = LimitadorPorUsuario(0.5, 2, 100)
+    assert limitador.consumir("5522") == 0
+    assert limitador.consumir("5522") == 0
+
+    assert limitador.consumir_varios({"5511": 2, "5522": 1}) == pytest.approx(2, abs=0.01)  # 5522 sem tokens
+    # Nada foi gasto de 5511
+    assert limitador.consumir_varios({"5511": 2}) == 0
+
+
+def test_lote_gasta_um_token_por_mensagem(monkeypatch):
+    from app import app
+
+    monkeypatch.setattr(admissao.admissao, "limitador", LimitadorPorUsuario(0.001, 2, 100))
+    limitado, outro = "5511960000003", "5511960000004"
+
+    def lote(*numeros):
+        return [{"mensagem": "oi", "user_id": numero} for numero in numeros]
+
+    with TestClient(app) as cliente:
+        acima_da_rajada = cliente.post("/mensagens/lote", json=lote(limitado, limitado, limitado))
+        dentro = cliente.post("/mensagens/lote", json=lote(limitado, limitado))
+        avulsa = cliente.post("/mensagem", json={"mensagem": "oi", "user_id": limitado})
+        misto = cliente.post("/mensagens/lote", json=lote(outro, limitado))
+        # O lote recusado não gastou os tokens do outro cliente
+        outro_depois = [cliente.post("/mensagem", json={"mensagem": "oi", "user_id": outro}).status_code
+                        for _ in range(2)]
+
+    assert acima_da_rajada.status_code == 429 and acima_da_rajada.headers["Retry-After"]
+    assert dentro.status_code == 200
+    assert avulsa.status_code == 429  # o lote gastou os tokens de /mensagem
+    assert misto.status_code == 429
+    assert outro_depois == [200, 200]
@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from app import app, ClienteResposta, PaginaAgendamentos
+
+
+def test_respostas_administrativas_seguem_os_modelos_documentados():
+    with TestClient(app) as cliente:
+        for mensagem in ("oi", "Cliente Admin", "1", "1"):
+            cliente.post("/mensagem", json={"mensagem": mensagem, "user_id": "5511950000001"})
+
+        dados_cliente = cliente.get("/cliente/5511950000001")
+        pagina = cliente.get("/agendamentos")
+        esquema = cliente.get("/openapi.json").json()["paths"]
+
+    # Os endpoints retornam RespostaJSON direto: os modelos não são aplicados pelo FastAPI
+    assert dados_cliente.status_code == 200 and dados_cliente.headers["etag"]
+    resposta = ClienteResposta.model_validate(dados_cliente.json())
+    assert resposta.cliente.nome == "Cliente Admin" and len(resposta.agendamentos) == 1
+    assert PaginaAgendamentos.model_validate(pagina.json()).agendamentos
+
+    for caminho, modelo in (("/cliente/{numero}", "ClienteResposta"), ("/agendamentos", "PaginaAgendamentos")):
+        conteudo = esquema[caminho]["get"]["responses"]["200"]["content"]["application/json"]
+        assert conteudo["schema"]["$ref"].endswith(modelo)
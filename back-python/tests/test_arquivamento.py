@@ -0,0 +1,146 @@
+import itertools
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from arquivamento import arquivar, buscar_historico, data_do_item, inicio_de_hoje
+from database import criar_engine
+from migracoes import aplicar_migracoes
+from models import Agendamento, AgendamentoArquivado, Cliente
+
+
+_numeros = itertools.count(1)
+
+
+@pytest.fixture
+def cliente_id(db):
+    cliente = Cliente(numero=f"55119400{next(_numeros):05d}", nome="Histórico")
+    db.add(cliente)
+    db.commit()
+    return cliente.id
+
+
+def _agendar(db, cliente_id, inicio, barbeiro="João", **extras):
+    agendamento = Agendamento(cliente_id=cliente_id, horario=inicio.strftime("%d/%m %H:%M") if inicio else "ilegível",
+                              inicio=inicio, barbeiro=barbeiro, **extras)
+    db.add(agendamento)
+    db.commit()
+    return agendamento.id
+
+
+def test_id_reutilizado_nao_colide_no_arquivo(db, banco, cliente_id):
+    inicio = inicio_de_hoje() - timedelta(days=40, hours=-10)
+    id_ = _agendar(db, cliente_id, inicio)
+    arquivar(inicio_de_hoje(), engine=banco)
+
+    # O SQLite pode devolver o mesmo ID a um novo agendamento
+    _agendar(db, cliente_id, inicio + timedelta(hours=1), id=id_)
+    arquivar(inicio_de_hoje(), engine=banco)
+
+    arquivados = db.query(AgendamentoArquivado).filter_by(agendamento_id=id_).all()
+    assert len(arquivados) == 2
+
+
+def test_registro_sem_inicio_e_arquivado_pela_criacao(db, banco, cliente_id):
+    id_ = _agendar(db, cliente_id, None, criado_em=datetime.now() - timedelta(days=90))
+
+    arquivar(inicio_de_hoje() - timedelta(days=30), engine=banco)
+
+    assert db.get(Agendamento, id_) is None
+    assert db.query(AgendamentoArquivado).filter_by(agendamento_id=id_, inicio=None).count() == 1
+
+
+def test_historico_pagina_sem_pular_inicios_iguais(db, banco, cliente_id):
+    inicio = inicio_de_hoje() - timedelta(days=3, hours=-9)
+    for barbeiro in ("João", "Carlos", "Marcos"):
+        _agendar(db, cliente_id, inicio, barbeiro)
+    _agendar(db, cliente_id, inicio - timedelta(days=60), "João")
+    arquivar(inicio_de_hoje() - timedelta(days=30), engine=banco)  # o mais antigo vai para o arquivo
+
+    vistos, antes_de, antes_de_id = [], None, None
+    while True:
+        pagina = buscar_historico(db, cliente_id, 2, antes_de, antes_de_id)
+        vistos += pagina
+        if len(pagina) < 2:
+            break
+        antes_de, antes_de_id = datetime.fromisoformat(pagina[-1]["inicio"]), pagina[-1]["id"]
+
+    assert len(vistos) == 4
+    assert len({item["id"] for item in vistos}) == 4
+    assert [item["arquivado"] for item in vistos] == [False, False, False, True]
+
+
+def test_registro_sem_inicio_arquivado_aparece_no_historico(db, banco, cliente_id):
+    recente = _agendar(db, cliente_id, inicio_de_hoje() - timedelta(days=10, hours=-9))
+    sem_inicio = _agendar(db, cliente_id, None, criado_em=datetime.now() - timedelta(days=50))
+    antigo = _agendar(db, cliente_id, inicio_de_hoje() - timedelta(days=100, hours=-9))
+    arquivar(inicio_de_hoje() - timedelta(days=5), engine=banco)
+
+    vistos, antes_de, antes_de_id = [], None, None
+    while pagina := buscar_historico(db, cliente_id, 1, antes_de, antes_de_id):
+        vistos += pagina
+        antes_de, antes_de_id = datetime.fromisoformat(data_do_item(pagina[-1])), pagina[-1]["id"]
+
+    # O registro sem inicio entra pela data de criação, entre os datados; todos vêm do arquivo
+    assert [item["id"] for item in vistos] == [recente, sem_inicio, antigo]
+    assert all(item["arquivado"] for item in vistos)
+    assert vistos[1]["inicio"] is None
+
+
+def test_migracao_recria_arquivo_com_id_proprio(tmp_path):
+    caminho = tmp_path / "antigo.db"
+    conn = sqlite3.connect(caminho)
+    conn.execute(
+        "CREATE TABLE agendamentos_arquivados (id INTEGER PRIMARY KEY, cliente_id INTEGER, contato VARCHAR,"
+        " horario VARCHAR NOT NULL, inicio DATETIME, duracao_minutos INTEGER NOT NULL, barbeiro VARCHAR NOT NULL,"
+        " criado_em DATETIME, arquivado_em DATETIME)"
+    )
+    conn.execute("CREATE INDEX ix_agendamentos_arquivados_cliente_inicio ON agendamentos_arquivados (cliente_id, inicio)")
+    conn.execute("INSERT INTO agendamentos_arquivados (id, cliente_id, horario, inicio, duracao_minutos, barbeiro)"
+                 " VALUES (7, 1, '01/01 09:00', '2024-01-01 09:00:00', 30, 'João')")
+    conn.commit()
+    conn.close()
+
+    engine = criar_engine(f"sqlite:///{caminho}")
+    try:
+        aplicar_migracoes(engine)
+        aplicar_migracoes(engine)  # idempotente
+        with engine.connect() as conexao:
+            linhas = conexao.exec_driver_sql(
+                "SELECT id, agendamento_id, barbeiro FROM agendamentos_arquivados").all()
+            indices = conexao.exec_driver_sql("PRAGMA index_list(agendamentos_arquivados)").all()
+    finally:
+        engine.dispose()
+
+    assert [tuple(linha) for linha in linhas] == [(1, 7, "João")]
+    assert "ix_agendamentos_arquivados_cliente_inicio" in {indice[1] for indice in indices}
+
+
+def test_registros_sem_inicio_sao_contados_e_listados(tmp_path):
+    import app as modulo_app
+    from database import SessionLocal
+
+    caminho = tmp_path / "legado.db"
+    engine = criar_engine(f"sqlite:///{caminho}")
+    try:
+        aplicar_migracoes(engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO agendamentos (id, horario, barbeiro, duracao_minutos, criado_em) VALUES"
+                " (1, '10/03 14:00', 'João', 30, '2024-03-01 10:00:00'),"
+                " (2, '10/03 14:00', 'João', 30, '2024-03-01 11:00:00'),"  # duplicado
+                " (3, 'amanhã cedo', 'Carlos', 30, '2024-03-01 12:00:00')"  # ilegível
+            )
+
+        assert aplicar_migracoes(engine) == 2
+
+        db = SessionLocal(bind=engine)
+        try:
+            pagina = modulo_app.buscar_agendamentos(db, 10, sem_inicio=True)
+        finally:
+            db.close()
+    finally:
+        engine.dispose()
+
+    assert [item["id"] for item in pagina["agendamentos"]] == [2, 3]
@@ -0,0 +1,143 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import chatbot
+from chatbot import get_or_create_cliente, processar_escolha_horario, processar_lote
+from models import Agendamento
+
+
+def _clientes_visiveis(banco, numeros):
+    """Clientes vistos por outra conexão (só enxerga o que já teve commit)"""
+    conn = sqlite3.connect(banco.url.database)
+    try:
+        marcadores = ",".join("?" * len(numeros))
+        return conn.execute(f"SELECT COUNT(*) FROM clientes WHERE numero IN ({marcadores})", numeros).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def observar(banco):
+    """Registra funcao(statement) após cada consulta do engine das requisições"""
+    ouvintes = []
+
+    def _observar(funcao):
+        def _depois(conn, cursor, statement, parameters, context, executemany):
+            funcao(statement)
+        event.listen(banco, "after_cursor_execute", _depois)
+        ouvintes.append(_depois)
+
+    yield _observar
+    for ouvinte in ouvintes:
+        event.remove(banco, "after_cursor_execute", ouvinte)
+
+
+def test_lote_confirma_uma_vez(db, banco, observar):
+    numeros = ["5511910000001", "5511910000002", "5511910000003"]
+    visiveis = []
+    observar(lambda statement: visiveis.append(_clientes_visiveis(banco, numeros)))
+
+    respostas = processar_lote([("oi", numero) for numero in numeros], db)
+
+    assert all(respostas)
+    # Nenhum cliente do lote aparece para outra conexão antes do commit final
+    assert visiveis and max(visiveis) == 0
+    assert _clientes_visiveis(banco, numeros) == 3
+
+
+def test_lote_confirma_a_cada_mensagens_por_transacao(db, banco, observar, monkeypatch):
+    monkeypatch.setitem(chatbot.LOTE, "mensagens_por_transacao", 2)
+    numeros = ["5511910000004", "5511910000005", "5511910000006"]
+    inicios = []
+    observar(lambda statement: inicios.append(statement) if statement.startswith("BEGIN") else None)
+
+    processar_lote([("oi", numero) for numero in numeros], db)
+
+    assert inicios == ["BEGIN IMMEDIATE", "BEGIN IMMEDIATE"]
+    assert _clientes_visiveis(banco, numeros) == 3
+
+
+def test_horario_oferecido_que_ja_passou_nao_e_agendado(db):
+    cliente = get_or_create_cliente(db, "5511910000007")
+    passado = (datetime.now() - timedelta(hours=1)).replace(second=0, microsecond=0)
+    conversa = {"estado": "escolher_horario", "cliente_id": cliente.id,
+                "dados": {"barbeiro": "João", "horarios_disponiveis": [passado.isoformat()]}}
+
+    resposta = processar_escolha_horario("1", cliente, db, conversa)
+
+    assert resposta.startswith("Esse horário já passou")
+    assert conversa["estado"] == "escolher_horario"
+    assert datetime.fromisoformat(conversa["dados"]["horarios_disponiveis"][0]) > datetime.now()
+    assert db.query(Agendamento).filter(Agendamento.cliente_id == cliente.id).count() == 0
+
+
+def test_horario_reservado_por_outro_worker_e_oferecido_de_novo(db):
+    from database import SessionLocal
+
+    cliente = get_or_create_cliente(db, "5511910000008")
+    outro = get_or_create_cliente(db, "5511910000009")
+    inicio = chatbot.grade.proximos(db, "João", limite=1)[0]
+
+    # Reserva feita por outro worker: a grade deste processo ainda vê o horário livre
+    sessao = SessionLocal()
+    try:
+        sessao.add(Agendamento(cliente_id=outro.id, contato=outro.numero, horario="outro worker",
+                               inicio=inicio, barbeiro="João"))
+        sessao.commit()
+    finally:
+        sessao.close()
+    conversa = {"estado": "escolher_horario", "cliente_id": cliente.id,
+                "dados": {"barbeiro": "João", "horarios_disponiveis": [inicio.isoformat()]}}
+
+    resposta = processar_escolha_horario("1", cliente, db, conversa)
+
+    assert resposta.startswith("Esse horário acabou de ser agendado")
+    assert conversa["estado"] == "escolher_horario"
+    assert inicio.isoformat() not in conversa["dados"]["horarios_disponiveis"]
+    assert inicio not in chatbot.grade.proximos(db, "João")
+    reservas = db.query(Agendamento).filter(Agendamento.barbeiro == "João", Agendamento.inicio == inicio).all()
+    assert [reserva.cliente_id for reserva in reservas] == [outro.id]
+
+
+def test_lote_desfeito_nao_grava_o_estado_das_conversas(db, banco, monkeypatch):
+    monkeypatch.setitem(chatbot.LOTE, "mensagens_por_transacao", 1)
+    numeros = ["5511910000010", "5511910000011"]
+    commit = db.commit
+    commits = []
+
+    def commit_que_falha_no_segundo():
+        commits.append(1)
+        if len(commits) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        commit()
+
+    monkeypatch.setattr(db, "commit", commit_que_falha_no_segundo)
+
+    with pytest.raises(sqlite3.OperationalError):
+        processar_lote([("oi", numero) for numero in numeros], db)
+
+    # A primeira transação foi confirmada com a sua conversa; a segunda não deixa rastro
+    assert chatbot.conversas.get(numeros[0])["estado"] == "aguardando_nome"
+    assert chatbot.conversas.get(numeros[1]) is None
+    assert _clientes_visiveis(banco, numeros) == 1
+
+
+def test_lote_desfeito_com_conversas_carregadas(db, monkeypatch):
+    from estado_conversas import ConversasCarregadas
+
+    numeros = ["5511910000012", "5511910000013"]
+    carregadas = ConversasCarregadas({numero: None for numero in numeros})
+
+    def commit_que_falha():
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(db, "commit", commit_que_falha)
+
+    with pytest.raises(sqlite3.OperationalError):
+        processar_lote([("oi", numero) for numero in numeros], db, carregadas)
+
+    # executar_com_conversas grava as alteradas no finally: não pode haver nenhuma
+    assert carregadas.alteradas == {}
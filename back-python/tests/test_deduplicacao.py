@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admissao
+from admissao import LimitadorPorUsuario
+from deduplicacao import RespostasProcessadas, mensagens_duplicadas
+
+
+@pytest.fixture
+def respostas(tmp_path):
+    return RespostasProcessadas(100, 60, str(tmp_path / "respostas.db"))
+
+
+def test_reenvio_recebe_a_resposta_guardada(respostas):
+    assert respostas.get("5511", "m1") is None
+
+    respostas.set("5511", "m1", "resposta 1")
+
+    assert respostas.get("5511", "m1") == "resposta 1"
+    assert respostas.get("5522", "m1") is None  # o id é por cliente
+
+
+def test_resposta_persistida_sobrevive_ao_reinicio(respostas, tmp_path):
+    respostas.set_varias([("5511", "m1", "resposta 1"), ("5511", "m2", "resposta 2")])
+
+    # Outro processo (cache vazio) lê do arquivo
+    reiniciado = RespostasProcessadas(100, 60, str(tmp_path / "respostas.db"))
+
+    assert reiniciado.get_varias([("5511", "m2"), ("5511", "m3"), ("5511", "m1")]) == [
+        "resposta 2", None, "resposta 1"]
+
+
+def test_resposta_expirada_nao_e_reaproveitada(tmp_path):
+    respostas = RespostasProcessadas(100, 0, str(tmp_path / "respostas.db"))
+    respostas.set("5511", "m1", "resposta 1")
+
+    assert RespostasProcessadas(100, 0, str(tmp_path / "respostas.db")).get("5511", "m1") is None
+    assert respostas.limpar_expiradas() == 1
+
+
+def test_versoes_async(respostas):
+    async def cenario():
+        await respostas.set_async("5511", "m1", "resposta 1")
+        return await respostas.get_async("5511", "m1"), await respostas.get_varias_async([("5511", "m2")])
+
+    assert asyncio.run(cenario()) == ("resposta 1", [None])
+
+
+def test_reenvio_nao_passa_pelo_limite_por_usuario(monkeypatch):
+    from app import app
+
+    # Um token por cliente e reposição lenta: a segunda mensagem nova seria recusada
+    monkeypatch.setattr(admissao.admissao, "limitador", LimitadorPorUsuario(0.001, 1, 100))
+    mensagem = {"mensagem": "oi", "user_id": "5511920000001", "mensagem_id": "reenvio-1"}
+
+    with TestClient(app) as cliente:
+        primeira = cliente.post("/mensagem", json=mensagem)
+        reenvio = cliente.post("/mensagem", json=mensagem)
+        nova = cliente.post("/mensagem", json={**mensagem, "mensagem_id": "reenvio-2"})
+
+    assert primeira.status_code == 200
+    assert reenvio.status_code == 200
+    assert reenvio.json()["resposta"] == primeira.json()["resposta"]
+    assert nova.status_code == 429
+
+
+def test_reenvio_nao_passa_pelos_handlers(monkeypatch):
+    import chatbot
+    from app import app
+
+    handlers = []
+    processar_nome = chatbot.processar_nome_cliente
+    monkeypatch.setattr(chatbot, "processar_nome_cliente",
+                        lambda *args: handlers.append(args[0]) or processar_nome(*args))
+    mensagem = {"mensagem": "Maria", "user_id": "5511920000002", "mensagem_id": "nome-1"}
+
+    with TestClient(app) as cliente:
+        cliente.post("/mensagem", json={"mensagem": "oi", "user_id": "5511920000002", "mensagem_id": "oi-1"})
+        primeira = cliente.post("/mensagem", json=mensagem)
+        duplicadas = mensagens_duplicadas.valor()
+        reenvio = cliente.post("/mensagem", json=mensagem)
+
+    assert reenvio.json()["resposta"] == primeira.json()["resposta"]
+    assert handlers == ["Maria"]  # a conversa avançou uma vez só
+    assert mensagens_duplicadas.valor() == duplicadas + 1
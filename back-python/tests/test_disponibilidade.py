@@ -0,0 +1,43 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import disponibilidade
+from disponibilidade import GradeDisponibilidade
+
+
+@pytest.fixture
+def meio_dia(monkeypatch):
+    """Congela o relógio da grade às 12:10 de hoje"""
+    momento = datetime.combine(date.today(), time(12, 10))
+    monkeypatch.setattr(disponibilidade, "agora", lambda: momento)
+    return momento
+
+
+def test_hoje_nao_oferece_horarios_que_ja_passaram(db, meio_dia):
+    grade = GradeDisponibilidade(["Barbeiro Teste"], 2)
+
+    livres = grade.livres(db, "Barbeiro Teste")
+    hoje, amanha = meio_dia.date(), meio_dia.date() + timedelta(days=1)
+
+    assert livres[hoje] and min(livres[hoje]) == time(12, 30)
+    assert min(livres[amanha]) == time(9, 0)
+    assert grade.proximos(db, "Barbeiro Teste", limite=1) == [datetime.combine(hoje, time(12, 30))]
+    assert grade.proximos_qualquer(db, limite=1) == [(datetime.combine(hoje, time(12, 30)), "Barbeiro Teste")]
+
+
+def test_dia_inteiro_passado_fica_vazio(db, monkeypatch):
+    fim_do_dia = datetime.combine(date.today(), time(23, 59))
+    monkeypatch.setattr(disponibilidade, "agora", lambda: fim_do_dia)
+    grade = GradeDisponibilidade(["Barbeiro Teste"], 2)
+
+    assert grade.livres(db, "Barbeiro Teste", ate=date.today()) == {date.today(): []}
+    assert grade.proximos(db, "Barbeiro Teste", limite=1)[0].date() == date.today() + timedelta(days=1)
+
+
+def test_proximos_partem_do_momento_atual(db, meio_dia):
+    grade = GradeDisponibilidade(["Barbeiro Teste"], 1)
+
+    livres = grade.proximos(db, "Barbeiro Teste", limite=3)
+
+    assert livres == [datetime.combine(meio_dia.date(), hora) for hora in (time(12, 30), time(13, 30), time(14, 0))]
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import chatbot
+from estado_conversas import ConversasCarregadas, SQLiteConversationStore
+
+
+def test_sqlite_atualizar_grava_e_encerra(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversas.db"), 60)
+    store.set("5511", {"estado": "menu_principal", "dados": {}, "cliente_id": 1})
+
+    store.atualizar({
+        "5511": None,
+        "5522": {"estado": "escolher_horario", "dados": {"barbeiro": "João"}, "cliente_id": 2},
+    })
+
+    assert store.carregar(["5511", "5522"]) == {
+        "5511": None,
+        "5522": {"estado": "escolher_horario", "dados": {"barbeiro": "João"}, "cliente_id": 2},
+    }
+
+
+def test_conversas_carregadas_registram_as_alteracoes():
+    carregadas = ConversasCarregadas({"5511": None, "5522": {"estado": "menu_principal", "dados": {}}})
+
+    carregadas.set("5511", {"estado": "aguardando_nome", "dados": {}})
+    carregadas.delete("5522")
+
+    assert carregadas.get("5511") == {"estado": "aguardando_nome", "dados": {}}
+    assert carregadas.alteradas == {"5511": {"estado": "aguardando_nome", "dados": {}}, "5522": None}
+
+
+def test_store_bloqueante_fora_do_event_loop(tmp_path, monkeypatch):
+    threads = []
+
+    class StoreObservado(SQLiteConversationStore):
+        def _conexao(self):
+            threads.append(threading.get_ident())
+            return super()._conexao()
+
+    store = StoreObservado(str(tmp_path / "conversas.db"), 60)
+    monkeypatch.setattr(chatbot, "conversas", store)
+
+    def handler(sessao, estado_conversas):
+        # Os handlers veem a cópia carregada, não o arquivo
+        assert isinstance(estado_conversas, ConversasCarregadas)
+        estado_conversas.set("5511", {"estado": "aguardando_nome", "dados": {}, "cliente_id": 1})
+        return "ok"
+
+    async def cenario():
+        threads.clear()
+        # Uma sessão que não é Session (como a AsyncSession do modo ASYNC_DB)
+        resposta = await chatbot.executar_com_conversas(object(), ["5511"], handler)
+        return resposta, threading.get_ident()
+
+    resposta, thread_loop = asyncio.run(cenario())
+
+    assert resposta == "ok"
+    assert threads and thread_loop not in threads
+    assert store.get("5511")["estado"] == "aguardando_nome"
@@ -0,0 +1,78 @@
+import asyncio
+
+from execucao_por_chave import ExecutorPorChave
+
+
+def test_mesma_chave_em_ordem_e_chaves_diferentes_em_paralelo():
+    async def cenario():
+        executor = ExecutorPorChave()
+        eventos = []
+        liberar = asyncio.Event()
+
+        async def tarefa(nome, esperar=None):
+            eventos.append(f"inicio {nome}")
+            if esperar is not None:
+                await esperar.wait()
+            await asyncio.sleep(0)
+            eventos.append(f"fim {nome}")
+
+        tarefas = [
+            asyncio.create_task(executor.executar("a", tarefa, "a1", liberar)),
+            asyncio.create_task(executor.executar("a", tarefa, "a2")),
+            asyncio.create_task(executor.executar("a", tarefa, "a3")),
+            asyncio.create_task(executor.executar("b", tarefa, "b1")),
+        ]
+        # "b" termina enquanto "a1" segura a chave "a"
+        await tarefas[3]
+        assert len(executor) == 1
+        liberar.set()
+        await asyncio.gather(*tarefas)
+        return eventos, len(executor)
+
+    eventos, chaves = asyncio.run(cenario())
+
+    assert eventos.index("fim b1") < eventos.index("fim a1")
+    eventos_a = [evento for evento in eventos if evento.endswith(("a1", "a2", "a3"))]
+    assert eventos_a == ["inicio a1", "fim a1", "inicio a2", "fim a2", "inicio a3", "fim a3"]
+    assert chaves == 0  # travas ociosas são removidas
+
+
+def test_varias_chaves_em_ordem_sem_deadlock():
+    async def cenario():
+        executor = ExecutorPorChave()
+        dentro = []
+
+        async def lote(*chaves):
+            async with executor.reservar(*chaves):
+                dentro.append(chaves)
+                assert len(dentro) == 1  # as chaves em comum impedem execuções simultâneas
+                await asyncio.sleep(0.01)
+                dentro.pop()
+
+        # Pedidos em ordens opostas adquiridos sem ordenação travariam um ao outro
+        await asyncio.wait_for(asyncio.gather(
+            lote("5511", "5522"), lote("5522", "5511"), lote("5522", "5511", "5511")), timeout=2)
+        return len(executor)
+
+    assert asyncio.run(cenario()) == 0
+
+
+def test_excecao_libera_a_chave():
+    async def cenario():
+        executor = ExecutorPorChave()
+
+        async def falhar():
+            raise ValueError("erro")
+
+        async def responder():
+            return "ok"
+
+        resultado = await asyncio.gather(executor.executar("a", falhar), executor.executar("a", responder),
+                                         return_exceptions=True)
+        return resultado, len(executor)
+
+    (erro, resposta), chaves = asyncio.run(cenario())
+
+    assert isinstance(erro, ValueError)
+    assert resposta == "ok"
+    assert chaves == 0
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from fila_escrita import FilaEscrita
+from models import Cliente
+
+
+def _inserir(db, numero):
+    db.add(Cliente(numero=numero, nome="Teste"))
+    db.flush()
+    return numero
+
+
+def _visiveis_fora(banco, *numeros):
+    """Clientes vistos por outra conexão (só enxerga o que já teve commit)"""
+    conn = sqlite3.connect(banco.url.database)
+    try:
+        marcadores = ",".join("?" * len(numeros))
+        return conn.execute(f"SELECT COUNT(*) FROM clientes WHERE numero IN ({marcadores})", numeros).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def fila():
+    # Intervalo longo: todas as escritas enviadas de uma vez caem no mesmo grupo
+    fila = FilaEscrita(intervalo_ms=200, max_itens=16)
+    fila.iniciar()
+    yield fila
+    fila.parar(timeout=5)
+
+
+def test_grupo_so_fica_visivel_no_commit(fila, banco):
+    futuros = [fila.enviar(_inserir, "5511900000001"), fila.enviar(_inserir, "5511900000002")]
+    visiveis = fila.enviar(lambda db: _visiveis_fora(banco, "5511900000001", "5511900000002"))
+
+    assert [f.result(timeout=5) for f in futuros] == ["5511900000001", "5511900000002"]
+    # Dentro do grupo as escritas anteriores ainda não foram confirmadas
+    assert visiveis.result(timeout=5) == 0
+    assert _visiveis_fora(banco, "5511900000001", "5511900000002") == 2
+
+
+def test_escrita_com_erro_nao_desfaz_o_grupo(fila, banco):
+    futuros = [
+        fila.enviar(_inserir, "5511900000003"),
+        fila.enviar(_inserir, "5511900000003"),  # número duplicado
+        fila.enviar(_inserir, "5511900000004"),
+    ]
+
+    assert futuros[0].result(timeout=5) == "5511900000003"
+    with pytest.raises(IntegrityError):
+        futuros[1].result(timeout=5)
+    assert futuros[2].result(timeout=5) == "5511900000004"
+    assert _visiveis_fora(banco, "5511900000003", "5511900000004") == 2
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import chatbot
+import database
+import fila_escrita
+from estado_conversas import SQLiteConversationStore
+from fila_escrita import FilaEscrita
+from models import Agendamento, Cliente
+
+_numeros = itertools.count(1)
+
+
+@pytest.fixture(params=["sincrono", "async", "async_conversas_sqlite_grupo_commit"])
+def api(request, banco, monkeypatch, tmp_path):
+    """Cliente da API no modo síncrono ou no ASYNC_DB (AsyncSession sobre aiosqlite)"""
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app import app
+
+    usados = []  # caminhos percorridos pelas requisições
+    async_engine = None
+    if request.param.startswith("async"):
+        run_sync = AsyncSession.run_sync
+
+        async def run_sync_observado(self, *args, **kwargs):
+            usados.append("run_sync")
+            return await run_sync(self, *args, **kwargs)
+
+        monkeypatch.setattr(AsyncSession, "run_sync", run_sync_observado)
+        async_engine = database.criar_engine_async(str(banco.url).replace("sqlite://", "sqlite+aiosqlite://", 1))
+        monkeypatch.setattr(database, "ASYNC_DB", True)
+        monkeypatch.setattr(database, "AsyncSessionLocal",
+                            async_sessionmaker(async_engine, autocommit=False, autoflush=False))
+        app.dependency_overrides[database.obter_sessao] = database.get_async_db
+
+    fila = None
+    if request.param == "async_conversas_sqlite_grupo_commit":
+        # Store bloqueante: as conversas são lidas e gravadas no threadpool (ConversasCarregadas)
+        monkeypatch.setattr(chatbot, "conversas", SQLiteConversationStore(str(tmp_path / "conversas.db")))
+        # Escritas pela fila: dentro do run_sync, fila_escrita.aguardar espera com await_only
+        fila = FilaEscrita(intervalo_ms=1, max_itens=16)
+        fila.iniciar()
+        monkeypatch.setattr(fila_escrita, "fila", fila)
+        aguardar = fila_escrita.aguardar
+        monkeypatch.setattr(fila_escrita, "aguardar", lambda futuro: usados.append("fila") or aguardar(futuro))
+
+    try:
+        with TestClient(app) as cliente:
+            cliente.modo, cliente.usados = request.param, usados
+            yield cliente
+        if async_engine is not None:
+            assert "run_sync" in usados  # os handlers rodaram sobre a AsyncSession
+    finally:
+        app.dependency_overrides.pop(database.obter_sessao, None)
+        if fila is not None:
+            fila.parar(timeout=5)
+        if async_engine is not None:
+            asyncio.run(async_engine.dispose())
+
+
+def _novo_numero() -> str:
+    return f"55119700{next(_numeros):05d}"
+
+
+def _conversar(api, numero, *mensagens):
+    respostas = []
+    for mensagem in mensagens:
+        resposta = api.post("/mensagem", json={"mensagem": mensagem, "user_id": numero})
+        assert resposta.status_code == 200
+        respostas.append(resposta.json()["resposta"])
+    return respostas
+
+
+def test_agendar_listar_e_cancelar(api, db):
+    numero = _novo_numero()
+
+    *_, confirmacao = _conversar(api, numero, "oi", "Cliente Fluxo", "1", "1")
+
+    assert confirmacao.startswith("✅ Agendamento confirmado!")
+    agendamento_id = int(re.search(r"ID do agendamento: (\d+)", confirmacao).group(1))
+    agendamento = db.get(Agendamento, agendamento_id)
+    assert agendamento.contato == numero and agendamento.inicio is not None
+    assert db.query(Cliente.nome).filter_by(numero=numero).scalar() == "Cliente Fluxo"
+    if api.modo.endswith("grupo_commit"):
+        assert "fila" in api.usados  # fora de lote as escritas vão pela fila de escrita
+
+    listagem, _, cancelamento = _conversar(api, numero, "2", "3", str(agendamento_id))
+
+    assert agendamento.horario in listagem
+    assert cancelamento.startswith(f"✅ Agendamento ID {agendamento_id} cancelado")
+    db.expire_all()
+    assert db.get(Agendamento, agendamento_id) is None
+
+
+def test_lote_segue_a_ordem_de_cada_cliente(api, db):
+    primeiro, segundo = _novo_numero(), _novo_numero()
+    lote = [{"mensagem": mensagem, "user_id": numero}
+            for mensagem, numero in (("oi", primeiro), ("oi", segundo), ("Ana Lote", primeiro), ("1", segundo))]
+
+    resposta = api.post("/mensagens/lote", json=lote)
+
+    assert resposta.status_code == 200
+    assert [item["status"] for item in resposta.json()["respostas"]] == ["success"] * 4
+    assert db.query(Cliente.nome).filter_by(numero=primeiro).scalar() == "Ana Lote"
+    # "1" não é um nome válido: o segundo cliente continua devendo o nome
+    assert chatbot.conversas.get(segundo)["estado"] == "aguardando_nome"
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import ingestao
+from ingestao import EnviadorLocal, FilaMemoria, FilaSQLite, IngestaoMensagens
+
+
+@pytest.fixture
+def processamento(monkeypatch):
+    """Substitui o chatbot: a resposta repete a mensagem; mensagens "lenta" demoram"""
+    processadas = []
+
+    async def _processar(mensagem, db, user_id, mensagem_id=None):
+        if mensagem.startswith("lenta"):
+            await asyncio.sleep(0.2)
+        processadas.append((user_id, mensagem))
+        return mensagem
+
+    monkeypatch.setattr(ingestao, "processar_mensagem_reservada", _processar)
+    return processadas
+
+
+def test_ordem_por_cliente_sem_bloquear_os_outros(processamento):
+    async def cenario():
+        fila = IngestaoMensagens(FilaMemoria(), EnviadorLocal(), workers=4, max_pendentes=0)
+        await fila.iniciar()
+        await fila.publicar("lenta 1", "5511930000001")
+        await fila.publicar("2", "5511930000001")
+        await fila.publicar("3", "5511930000002")
+        await fila.parar()
+        return list(fila.enviador.enviadas)
+
+    enviadas = asyncio.run(cenario())
+
+    # O cliente 2 não espera a mensagem lenta do cliente 1, que mantém a sua ordem
+    assert enviadas == [("5511930000002", "3"), ("5511930000001", "lenta 1"), ("5511930000001", "2")]
+
+
+def test_rajada_de_um_cliente_nao_ocupa_as_vagas_dos_outros(processamento):
+    async def cenario():
+        fila = IngestaoMensagens(FilaMemoria(), EnviadorLocal(), workers=2, max_pendentes=0)
+        await fila.iniciar()
+        # Mais mensagens pendentes do cliente 1 do que workers
+        for i in range(4):
+            await fila.publicar(f"lenta {i}", "5511930000006")
+        await fila.publicar("rapida", "5511930000007")
+        await asyncio.sleep(0.1)
+        enviadas_antes_da_primeira_lenta = list(fila.enviador.enviadas)
+        await fila.parar()
+        return enviadas_antes_da_primeira_lenta, [m for u, m in fila.enviador.enviadas if u == "5511930000006"]
+
+    antes, cliente_1 = asyncio.run(cenario())
+
+    assert antes == [("5511930000007", "rapida")]
+    assert cliente_1 == ["lenta 0", "lenta 1", "lenta 2", "lenta 3"]
+
+
+def test_fila_cheia_recusa(processamento):
+    async def cenario():
+        fila = IngestaoMensagens(FilaMemoria(), EnviadorLocal(), workers=1, max_pendentes=1)
+        await fila.iniciar()
+        aceitas = [await fila.publicar("lenta", "5511930000003"), await fila.publicar("2", "5511930000004")]
+        await fila.parar()
+        return aceitas, fila.pendentes
+
+    assert asyncio.run(cenario()) == ([True, False], 0)
+
+
+def test_fila_sqlite_grava_fora_do_event_loop(processamento, tmp_path):
+    threads = []
+
+    class FilaObservada(FilaSQLite):
+        def gravar(self, *args):
+            threads.append(threading.get_ident())
+            return super().gravar(*args)
+
+    async def cenario():
+        fila = IngestaoMensagens(FilaObservada(str(tmp_path / "fila.db")), EnviadorLocal(), workers=2, max_pendentes=0)
+        await fila.iniciar()
+        await fila.publicar("1", "5511930000005")
+        await fila.parar()
+        return threading.get_ident(), list(fila.enviador.enviadas), fila.armazenamento
+
+    thread_loop, enviadas, armazenamento = asyncio.run(cenario())
+
+    assert enviadas == [("5511930000005", "1")]
+    assert threads and thread_loop not in threads
+    # Processada: não sobra nada para ser retomado
+    assert armazenamento._conexao().execute("SELECT COUNT(*) FROM mensagens_pendentes").fetchone()[0] == 0
+
+
+def test_fila_sqlite_retoma_mensagens_com_prazo_vencido(tmp_path):
+    caminho = str(tmp_path / "fila.db")
+    anterior = FilaSQLite(caminho, lease_segundos=0.2)
+    anterior.gravar("5511930000008", "1", 1.0, "m1")
+    anterior.gravar("5511930000008", "2", 2.0, "m2")
+
+    # Worker reiniciado no mesmo processo (mesmo pid, outro token)
+    reiniciado = FilaSQLite(caminho, lease_segundos=60)
+    assert reiniciado.recuperar() == []  # o prazo do anterior ainda vale
+    time.sleep(0.3)
+
+    retomadas = reiniciado.recuperar()
+
+    assert [(m.mensagem, m.mensagem_id) for m in retomadas] == [("1", "m1"), ("2", "m2")]
+    # Assumidas com um prazo novo: outro worker não retoma as mesmas mensagens
+    assert FilaSQLite(caminho, lease_segundos=60).recuperar() == []
+
+
+def test_fila_sqlite_renovacao_mantem_as_mensagens(tmp_path):
+    caminho = str(tmp_path / "fila.db")
+    dono = FilaSQLite(caminho, lease_segundos=0.5)
+    dono.gravar("5511930000009", "1", 1.0, None)
+    outro = FilaSQLite(caminho, lease_segundos=60)
+
+    time.sleep(0.3)
+    dono.renovar()
+    time.sleep(0.3)
+
+    assert outro.recuperar() == []
+
+
+def test_fila_sqlite_antiga_tem_as_mensagens_retomadas(tmp_path):
+    caminho = str(tmp_path / "fila.db")
+    conn = sqlite3.connect(caminho)
+    with conn:
+        conn.execute("CREATE TABLE mensagens_pendentes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,"
+                     " mensagem TEXT NOT NULL, recebida_em REAL NOT NULL, dono INTEGER NOT NULL, mensagem_id TEXT)")
+        conn.execute("INSERT INTO mensagens_pendentes (user_id, mensagem, recebida_em, dono) VALUES (?, ?, ?, ?)",
+                     ("5511930000010", "1", 1.0, os.getpid()))
+    conn.close()
+
+    retomadas = FilaSQLite(caminho).recuperar()
+
+    assert [(m.user_id, m.mensagem) for m in retomadas] == [("5511930000010", "1")]
+
+
+def test_worker_retoma_em_segundo_plano_quando_o_prazo_vence(processamento, tmp_path):
+    caminho = str(tmp_path / "fila.db")
+    FilaSQLite(caminho, lease_segundos=0.2).gravar("5511930000011", "1", time.time(), None)
+
+    async def cenario():
+        # Sobe antes de o prazo do worker que caiu vencer
+        fila = IngestaoMensagens(FilaSQLite(caminho, lease_segundos=0.3), EnviadorLocal(), workers=1, max_pendentes=0)
+        await fila.iniciar()
+        retomadas_ao_subir = len(fila.enviador.enviadas) + fila.pendentes
+        await asyncio.sleep(0.5)
+        await fila.parar()
+        return retomadas_ao_subir, list(fila.enviador.enviadas)
+
+    assert asyncio.run(cenario()) == (0, [("5511930000011", "1")])